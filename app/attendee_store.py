@@ -0,0 +1,219 @@
+# app/attendee_store.py
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from .config import settings
+
+CHECKED_IN = 1
+CHECKED_OUT = 2
+
+# Timestamps written by the app are Taipei ISO strings; those are stored as epoch microseconds
+_TAIPEI_OFFSET = timezone(timedelta(hours=8))
+# Columns whose values repeat across many guests and are worth interning
+_INTERNED_COLUMNS = (settings.COL_DEPARTMENT, settings.COL_TABLE_NUMBER)
+
+Timestamp = Union[int, str] # 0 = empty, int = epoch microseconds, str = a value that doesn't round-trip
+
+
+def _encode_time(value: str) -> Timestamp:
+    if not value:
+        return 0
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        return value
+    micros = (parsed - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+    return micros if _decode_time(micros) == value else value
+
+
+def _decode_time(value: Timestamp) -> str:
+    if isinstance(value, str):
+        return value
+    if not value:
+        return ""
+    seconds, micros = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds, _TAIPEI_OFFSET).replace(microsecond=micros).isoformat()
+
+
+class RosterSchema:
+    """Column layout shared by every record of one load."""
+    __slots__ = ("headers", "static_headers", "static_positions", "keys")
+
+    STATUS_HEADERS = (
+        settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+        settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME,
+    )
+
+    def __init__(self, headers: Sequence[str]):
+        self.headers = tuple(headers)
+        self.static_headers = tuple(header for header in self.headers if header not in self.STATUS_HEADERS)
+        self.static_positions = {header: i for i, header in enumerate(self.static_headers)}
+        self.keys = self.headers + tuple(header for header in self.STATUS_HEADERS if header not in self.headers)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RosterSchema) and self.headers == other.headers
+
+    def __hash__(self) -> int:
+        return hash(self.headers)
+
+
+class AttendeeRecord(Mapping):
+    """
+    One attendee as a slotted, immutable record. Static columns are a tuple in schema order,
+    check-in/check-out flags a bitset and timestamps integers. It reads like the row dict the
+    endpoints used before (`record.get(settings.COL_NAME)`, `dict(record)`).
+    """
+    __slots__ = ("schema", "values", "flags", "check_in_time", "check_out_time", "row_index")
+
+    def __init__(self, schema: RosterSchema, values: tuple, flags: int, check_in_time: Timestamp, check_out_time: Timestamp, row_index: int):
+        self.schema = schema
+        self.values = values
+        self.flags = flags
+        self.check_in_time = check_in_time
+        self.check_out_time = check_out_time
+        self.row_index = row_index
+
+    @classmethod
+    def from_row(cls, schema: RosterSchema, row: Sequence[str], row_index: int) -> "AttendeeRecord":
+        cells = dict(zip(schema.headers, row))
+        values = tuple(
+            sys.intern(cells.get(header, "")) if header in _INTERNED_COLUMNS else cells.get(header, "")
+            for header in schema.static_headers
+        )
+        flags = (
+            (CHECKED_IN if str(cells.get(settings.COL_CHECK_IN_STATUS, "")).upper() == "TRUE" else 0)
+            | (CHECKED_OUT if str(cells.get(settings.COL_CHECK_OUT_STATUS, "")).upper() == "TRUE" else 0)
+        )
+        return cls(
+            schema, values, flags,
+            _encode_time(cells.get(settings.COL_CHECK_IN_TIME, "")),
+            _encode_time(cells.get(settings.COL_CHECK_OUT_TIME, "")),
+            row_index,
+        )
+
+    @property
+    def checked_in(self) -> bool:
+        return bool(self.flags & CHECKED_IN)
+
+    @property
+    def checked_out(self) -> bool:
+        return bool(self.flags & CHECKED_OUT)
+
+    def replace(self, changes: Dict[str, Any]) -> "AttendeeRecord":
+        """Returns a copy with the given columns changed."""
+        flags, check_in_time, check_out_time = self.flags, self.check_in_time, self.check_out_time
+        values = None
+        for column, value in changes.items():
+            if column == settings.COL_CHECK_IN_STATUS:
+                flags = flags | CHECKED_IN if str(value).upper() == "TRUE" else flags & ~CHECKED_IN
+            elif column == settings.COL_CHECK_OUT_STATUS:
+                flags = flags | CHECKED_OUT if str(value).upper() == "TRUE" else flags & ~CHECKED_OUT
+            elif column == settings.COL_CHECK_IN_TIME:
+                check_in_time = _encode_time(value)
+            elif column == settings.COL_CHECK_OUT_TIME:
+                check_out_time = _encode_time(value)
+            elif column in self.schema.static_positions:
+                values = list(self.values if values is None else values)
+                values[self.schema.static_positions[column]] = value
+        return AttendeeRecord(
+            self.schema, self.values if values is None else tuple(values),
+            flags, check_in_time, check_out_time, self.row_index,
+        )
+
+    def row_values(self) -> List[str]:
+        """The record as a sheet row in header order."""
+        return [self[header] for header in self.schema.headers]
+
+    def __getitem__(self, column: str) -> str:
+        if column == settings.COL_CHECK_IN_STATUS:
+            return "TRUE" if self.flags & CHECKED_IN else "FALSE"
+        if column == settings.COL_CHECK_OUT_STATUS:
+            return "TRUE" if self.flags & CHECKED_OUT else "FALSE"
+        if column == settings.COL_CHECK_IN_TIME:
+            return _decode_time(self.check_in_time)
+        if column == settings.COL_CHECK_OUT_TIME:
+            return _decode_time(self.check_out_time)
+        return self.values[self.schema.static_positions[column]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.schema.keys)
+
+    def __len__(self) -> int:
+        return len(self.schema.keys)
+
+    def __repr__(self) -> str:
+        return f"AttendeeRecord({dict(self)!r}, row_index={self.row_index})"
+
+
+class RowIndexView(Mapping):
+    """Read-only UniqueID -> sheet row mapping over the records' inline row numbers."""
+    __slots__ = ("_records",)
+
+    def __init__(self, records: Dict[str, AttendeeRecord]):
+        self._records = records
+
+    def __getitem__(self, employee_id: str) -> int:
+        return self._records[employee_id].row_index
+
+    def get(self, employee_id: str, default: Optional[int] = None) -> Optional[int]:
+        record = self._records.get(employee_id)
+        return default if record is None else record.row_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class AttendanceBreakdown:
+    """
+    Attendance counters per department and per table, plus each table's guests, kept up to date
+    record by record so the breakdown endpoints never walk the whole roster. Built once per load;
+    update() is O(1). Callers serialize changes and reads (CacheManager's write lock).
+    """
+    __slots__ = ("departments", "tables", "table_guests")
+
+    def __init__(self, records: Iterable[AttendeeRecord] = ()):
+        # Group name -> [total, checked in, checked out]
+        self.departments: Dict[str, List[int]] = {}
+        self.tables: Dict[str, List[int]] = {}
+        # Table -> {UniqueID: record}
+        self.table_guests: Dict[str, Dict[str, AttendeeRecord]] = {}
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def _count(groups: Dict[str, List[int]], key: str, record: AttendeeRecord, sign: int):
+        counts = groups.get(key)
+        if counts is None:
+            counts = groups[key] = [0, 0, 0]
+        counts[0] += sign
+        counts[1] += sign * record.checked_in
+        counts[2] += sign * record.checked_out
+        if not counts[0]:
+            del groups[key]
+
+    def add(self, record: AttendeeRecord):
+        table = str(record.get(settings.COL_TABLE_NUMBER, ""))
+        self._count(self.departments, str(record.get(settings.COL_DEPARTMENT, "")), record, 1)
+        self._count(self.tables, table, record, 1)
+        self.table_guests.setdefault(table, {})[str(record.get(settings.COL_UNIQUE_ID, ""))] = record
+
+    def remove(self, record: AttendeeRecord):
+        table = str(record.get(settings.COL_TABLE_NUMBER, ""))
+        self._count(self.departments, str(record.get(settings.COL_DEPARTMENT, "")), record, -1)
+        self._count(self.tables, table, record, -1)
+        guests = self.table_guests.get(table, {})
+        guests.pop(str(record.get(settings.COL_UNIQUE_ID, "")), None)
+        if not guests:
+            self.table_guests.pop(table, None)
+
+    def update(self, old: AttendeeRecord, new: AttendeeRecord):
+        self.remove(old)
+        self.add(new)
+
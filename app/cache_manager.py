@@ -1,37 +1,114 @@
 # app/cache_manager.py
+import os
 import threading
 import time
 import gspread
 import pytz
 from typing import Dict, List, Any, Optional, Tuple
-from collections import deque
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
 from datetime import datetime
 
-from .gsheet_client import GSheetClient
+from . import metrics
+from .quota import READ, WRITE, Priority
+from .storage import StorageBackend, create_backend
 from .config import settings
+from .write_planner import STATUS_COLUMNS, UpdateTask, coalesce_tasks, plan_range_updates
+from .write_journal import WriteJournal
+from .roster_snapshot import load_snapshot, save_snapshot
+from .attendee_store import AttendanceBreakdown, AttendeeRecord, RosterSchema, RowIndexView
+from .search_index import SearchIndex
+from .shared_state import SharedState
+from .status_stream import StatusBroadcaster
 
-UpdateTask = Tuple[str, str, str] # (employee_id, "check-in" | "check-out", timestamp_str)
 TAIPEI_TZ = pytz.timezone("Asia/Taipei")
-# Each task generates 2 cells, so 50 tasks = 100 cells
-TASK_BATCH_SIZE = 50
+
+# (scan ID, employee ID, "check-in" or "check-out", scan time on the device or None)
+Scan = Tuple[str, str, str, Optional[datetime]]
+
+def _is_true(value: Any) -> bool:
+    return str(value).upper() == "TRUE"
+
+def _column_letter(col: int) -> str:
+    return gspread.utils.rowcol_to_a1(1, col)[:-1]
 
 class CacheManager:
     _instance = None
     _lock = threading.Lock()
 
     def __init__(self):
-        self.attendees_cache: Dict[str, Dict[str, Any]] = {}
-        self.employee_id_to_row_index: Dict[str, int] = {}
+        # Readers never lock: reloads publish new dicts by reference swap and updates replace a
+        # record with an updated copy, so a reader always sees a whole record. The write lock only
+        # serializes state changes (records, counters, queue) and is never held while walking the roster.
+        self._write_lock = metrics.TimedLock(metrics.WRITE_LOCK_WAIT)
+        # Compact slotted records (see attendee_store) that read like the sheet's row dicts
+        self.attendees_cache: Dict[str, AttendeeRecord] = {}
         self.update_queue: deque[UpdateTask] = deque()
         self.last_updated: Optional[float] = None
         self.is_initialized = False
+        self.headers: List[str] = []
+        self.schema: Optional[RosterSchema] = None
+        # "sheet" once loaded from Google Sheets, "snapshot" while serving a warm-start snapshot
+        self.data_source: Optional[str] = None
+
+        # Status counters, kept in sync with attendees_cache so /api/status is O(1)
+        self.total_count = 0
+        self.checked_in_count = 0
+        self.checked_out_count = 0
+        # The same counters per department and table, kept in step by _set_fields
+        self.breakdown = AttendanceBreakdown()
+        # Help-desk search over names, EmployeeIDs and emails; rebuilt with each load
+        self.search_index = SearchIndex(())
+        # Wakes the /api/status/stream subscribers whenever the counters change
+        self.status_changes = StatusBroadcaster()
+
+        # Tasks popped by the writer but not yet confirmed, and when each (employee, type) was last flushed.
+        # Reloads treat both as pending so a sheet read taken before the write can't undo a local check-in.
+        self.in_flight_tasks: Dict[int, List[UpdateTask]] = {}
+        self._flushed_at: Dict[Tuple[str, str], float] = {}
+        self._reload_count = 0
         self.shutdown_event = threading.Event()
 
+        # Flush scheduling: the writer sleeps until the queue is big enough, the oldest write is
+        # old enough, or it's woken up by a finished batch, but never flushes faster than the quota allows.
+        self.write_wakeup = threading.Event()
+        self.queue_oldest_at: Optional[float] = None
+        self.last_flush_at = 0.0
+        self._batch_ids = count(1)
+
+        # Local journal of unconfirmed writes, opened and replayed in start()
+        self.journal: Optional[WriteJournal] = None
+
+        # Multi-worker mode: events shared through SQLite; only the leader writes to and reloads from Sheets
+        self.shared: Optional[SharedState] = None
+        self.is_leader = True
+        self._shared_seen_id = 0
+        self._shared_synced_at = 0.0
+        # Results of recent bulk-sync scans by scan ID (the idempotency keys), oldest first
+        self._scan_results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._snapshot_mtime: Optional[float] = None
+        # Sheets quota left per bucket, refreshed by the writer thread for /metrics and health checks
+        self.quota_remaining: Optional[Dict[str, int]] = None
+
+        # Where the roster lives (Google Sheets by default), created on first use
+        self._storage: Optional[StorageBackend] = None
+
         # Threads
         self.cache_reload_thread = threading.Thread(target=self._background_cache_reload, daemon=True)
         self.writer_thread = threading.Thread(target=self._background_writer, daemon=True)
 
 
+    @property
+    def storage(self) -> StorageBackend:
+        if self._storage is None:
+            self._storage = create_backend()
+        return self._storage
+
+    @property
+    def employee_id_to_row_index(self) -> RowIndexView:
+        return RowIndexView(self.attendees_cache)
+
     @classmethod
     def get_instance(cls):
         with cls._lock:
@@ -41,24 +118,188 @@ class CacheManager:
 
     def start(self):
         print("Starting CacheManager...")
-        self.load_initial_data()
+        self._register_metrics()
+        if settings.SHARED_STATE_PATH:
+            self.shared = SharedState(settings.SHARED_STATE_PATH)
+            self.is_leader = self.shared.try_become_leader()
+            print(f"Shared state mode: this worker is the {'leader' if self.is_leader else 'follower'}.")
+            # Events logged before this start are re-applied by the load below if the source lacks them,
+            # and the leader queues the unconfirmed ones once; only later events arrive through syncs
+            self._shared_seen_id = self.shared.last_event_id()
+            if self.is_leader:
+                self._take_over_writes()
+        if not (settings.CACHE_SNAPSHOT_PATH and self.load_from_snapshot()):
+            self.load_initial_data()
+        # In shared state mode the SQLite event log is already durable, so the local journal isn't needed
+        if not self.shared and settings.WRITE_JOURNAL_PATH:
+            self.journal = WriteJournal(settings.WRITE_JOURNAL_PATH, settings.WRITE_JOURNAL_COMMIT_INTERVAL_SECONDS)
+            self._replay_journal(self.journal.open())
         self.cache_reload_thread.start()
         self.writer_thread.start()
         print("CacheManager started with background writer.")
 
+    def _register_metrics(self):
+        """Points the scrape-time gauges at this instance."""
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.update_queue))
+        metrics.QUEUE_OLDEST_AGE.set_function(
+            lambda: time.time() - self.queue_oldest_at if self.update_queue and self.queue_oldest_at else 0
+        )
+        metrics.IN_FLIGHT_WRITES.set_function(lambda: sum(len(tasks) for tasks in list(self.in_flight_tasks.values())))
+        metrics.CACHE_ATTENDEES.set_function(lambda: {
+            ("total",): self.total_count,
+            ("checked_in",): self.checked_in_count,
+            ("checked_out",): self.checked_out_count,
+        })
+        metrics.CACHE_AGE.set_function(lambda: time.time() - self.last_updated if self.last_updated else None)
+        metrics.SHEETS_QUOTA_REMAINING.set_function(
+            lambda: {(kind,): tokens for kind, tokens in (self.quota_remaining or {}).items()}
+        )
+
     def stop(self):
         print("Stopping CacheManager...")
         self.shutdown_event.set()
+        self.write_wakeup.set()
         self.writer_thread.join()
+        if self.journal:
+            self.journal.close()
+        if self.shared:
+            self.shared.close()
         print("CacheManager stopped.")
 
+    def _take_over_writes(self):
+        """
+        Makes this worker the leader and queues every shared event no leader has confirmed yet:
+        the ones it has already seen here, then newer ones through a sync, so none is queued twice.
+        """
+        with self._write_lock:
+            # Read under the lock, so a concurrent sync can't move the seen mark past events missing here
+            events = self.shared.unflushed()
+            self.is_leader = True
+            seen = [task for event_id, task in events if event_id <= self._shared_seen_id]
+            for task in seen:
+                self._enqueue(task, journal=False)
+            self._sync_shared_locked()
+        print(f"Leader is taking over {len(seen)} unflushed writes.")
+
+    def _apply_event(self, task: UpdateTask):
+        """Caller holds the write lock."""
+        employee_id, update_type, timestamp_str = task
+        status_column, time_column = STATUS_COLUMNS[update_type]
+        self._set_fields(employee_id, {status_column: "TRUE", time_column: timestamp_str})
+
+    def _sync_shared_locked(self, conn=None):
+        """Applies events other workers recorded since the last sync. Caller holds the write lock."""
+        for event_id, task in self.shared.events_since(self._shared_seen_id, conn):
+            self._apply_event(task)
+            if self.is_leader:
+                self._enqueue(task, journal=False)
+            self._shared_seen_id = event_id
+        self._shared_synced_at = time.time()
+
+    def _sync_shared(self):
+        if self.shared and time.time() - self._shared_synced_at >= settings.SHARED_SYNC_INTERVAL_SECONDS:
+            with self._write_lock:
+                self._sync_shared_locked()
+
+    def _follow_snapshot(self):
+        """Followers pick up the leader's reloads through the snapshot file instead of calling Sheets."""
+        try:
+            mtime = os.path.getmtime(settings.CACHE_SNAPSHOT_PATH)
+        except OSError:
+            return
+        if mtime != self._snapshot_mtime:
+            self.load_from_snapshot()
+
+    def _replay_journal(self, tasks: List[UpdateTask]):
+        """Re-applies and re-queues writes that were journaled but never confirmed by the sheet."""
+        if not tasks:
+            return
+        print(f"Replaying {len(tasks)} unconfirmed writes from the journal...")
+        with self._write_lock:
+            for task in tasks:
+                self._apply_event(task)
+                self._enqueue(task, journal=False)
+
+
+    def _pending_keys(self, since: float) -> set:
+        """(employee_id, update_type) pairs whose local state wins over a sheet read started at `since`. Caller holds the write lock."""
+        pending = {(employee_id, update_type) for tasks in self.in_flight_tasks.values() for employee_id, update_type, _ in tasks}
+        pending.update((employee_id, update_type) for employee_id, update_type, _ in self.update_queue)
+        for key, flushed_at in list(self._flushed_at.items()):
+            if flushed_at >= since:
+                pending.add(key)
+            else:
+                del self._flushed_at[key]
+        return pending
+
+    def _set_fields(self, employee_id: str, values: Dict[str, Any]) -> Optional[AttendeeRecord]:
+        """Publishes an updated copy of a cached record and keeps the status counters in step. Caller holds the write lock."""
+        record = self.attendees_cache.get(employee_id)
+        if record is None:
+            return None
+        updated = record.replace(values)
+        self.checked_in_count += updated.checked_in - record.checked_in
+        self.checked_out_count += updated.checked_out - record.checked_out
+        self.attendees_cache[employee_id] = updated
+        self.breakdown.update(record, updated)
+        if updated.flags != record.flags:
+            self.status_changes.notify()
+        return updated
+
+    def _install_rows(self, headers: List[str], rows: List[List[str]], row_indexes: List[int], fetch_started: float, source: str,
+                      event_id: Optional[int] = None) -> int:
+        """
+        Replaces the cache with the given rows, keeping local changes the source doesn't have yet.
+        `event_id` is the last shared event a snapshot's rows include; a sheet holds every flushed event.
+        """
+        schema = RosterSchema(headers)
+        records = [AttendeeRecord.from_row(schema, row, row_index) for row, row_index in zip(rows, row_indexes)]
+
+        attendees_cache = {str(record[settings.COL_UNIQUE_ID]): record for record in records}
+        checked_in_count = sum(record.checked_in for record in attendees_cache.values())
+        checked_out_count = sum(record.checked_out for record in attendees_cache.values())
+        breakdown = AttendanceBreakdown(attendees_cache.values())
+        search_index = SearchIndex(records)
+        # The sheet or snapshot may not have every worker's check-ins yet
+        if not self.shared:
+            missing_events = []
+        elif event_id is not None:
+            missing_events = self.shared.events_since(event_id)
+        else:
+            missing_events = self.shared.unflushed()
+
+        with self._write_lock:
+            # Carry over local changes the sheet doesn't have yet
+            previous_cache = self.attendees_cache
+            self.attendees_cache = attendees_cache
+            self.headers = list(headers)
+            self.schema = schema
+            self.total_count = len(attendees_cache)
+            self.checked_in_count = checked_in_count
+            self.checked_out_count = checked_out_count
+            self.breakdown = breakdown
+            self.search_index = search_index
+            for employee_id, update_type in self._pending_keys(fetch_started):
+                local_record = previous_cache.get(employee_id)
+                if local_record:
+                    self._set_fields(employee_id, {column: local_record.get(column, "") for column in STATUS_COLUMNS[update_type]})
+            if self.shared:
+                # Events already seen are re-applied only; newer ones go through a sync, which also queues them on the leader
+                for missing_id, task in missing_events:
+                    if missing_id <= self._shared_seen_id:
+                        self._apply_event(task)
+                self._sync_shared_locked()
+            self.last_updated = fetch_started
+            self.data_source = source
+            self.is_initialized = True
+        self.status_changes.notify()
+        return len(records)
 
     def load_initial_data(self):
         print("Loading initial data into cache...")
         try:
-            gsheet_client = GSheetClient.from_settings()
-            worksheet = gsheet_client.get_worksheet(settings.WORKSHEET_NAME)
-            all_values = worksheet.get_all_values()
+            fetch_started = time.time()
+            all_values = self.storage.get_all_values()
 
             if not all_values:
                 print("Warning: Google Sheet is empty.")
@@ -66,136 +307,526 @@ class CacheManager:
                 return
 
             headers = all_values[0]
-            records = [dict(zip(headers, row)) for row in all_values[1:]]
-
-            with self._lock:
-                self.attendees_cache = {str(record[settings.COL_UNIQUE_ID]): record for record in records}
-                self.employee_id_to_row_index = {
-                    str(record[settings.COL_UNIQUE_ID]): index + 2
-                    for index, record in enumerate(records)
-                }
-                self.last_updated = time.time()
-                self.is_initialized = True
-
-            print(f"Successfully loaded {len(records)} records into cache.")
+            rows = all_values[1:]
+            loaded = self._install_rows(headers, rows, range(2, len(rows) + 2), fetch_started, "sheet")
+            metrics.RELOAD_DURATION.observe(time.time() - fetch_started, mode="full")
+            metrics.RELOAD_ROWS.set(len(rows), mode="full")
+
+            print(f"Successfully loaded {loaded} records into cache.")
+            self.save_snapshot()
         except Exception as e:
             import traceback
+            metrics.RELOAD_FAILURES.inc(mode="full")
             print(f"FATAL: Error loading initial data: {e}")
             traceback.print_exc()
-            self.is_initialized = False
+            self.storage.handle_error(e)
+            # Keep serving what we have (e.g. a warm-start snapshot) rather than going unavailable
+            if not self.attendees_cache:
+                self.is_initialized = False
+
+    def load_from_snapshot(self) -> bool:
+        """Serves the last saved roster right away; the reload thread refreshes it from the sheet."""
+        started = time.time()
+        try:
+            self._snapshot_mtime = os.path.getmtime(settings.CACHE_SNAPSHOT_PATH)
+        except OSError:
+            pass
+        snapshot = load_snapshot(settings.CACHE_SNAPSHOT_PATH)
+        if snapshot is None:
+            return False
+        loaded = self._install_rows(snapshot.headers, snapshot.rows, snapshot.row_indexes, snapshot.saved_at, "snapshot", snapshot.event_id)
+        metrics.RELOAD_DURATION.observe(time.time() - started, mode="snapshot")
+        metrics.RELOAD_ROWS.set(loaded, mode="snapshot")
+        print(f"Loaded {loaded} records from snapshot in {(time.time() - started) * 1000:.0f} ms "
+              f"(saved {time.time() - snapshot.saved_at:.0f}s ago).")
+        return True
+
+    def save_snapshot(self):
+        if not settings.CACHE_SNAPSHOT_PATH or not self.headers or not self.is_leader:
+            return
+        try:
+            # The records and the last event they include, read together
+            with self._write_lock:
+                records = list(self.attendees_cache.values())
+                event_id = self._shared_seen_id
+            rows = [record.row_values() for record in records]
+            row_indexes = [record.row_index for record in records]
+            save_snapshot(settings.CACHE_SNAPSHOT_PATH, self.headers, rows, row_indexes, event_id)
+        except Exception as e:
+            print(f"Warning: Could not save roster snapshot: {e}")
+
+    def get_health(self) -> Dict[str, Any]:
+        with self._write_lock:
+            return {
+                "ready": self.is_initialized,
+                "source": self.data_source,
+                "cache_age_seconds": round(time.time() - self.last_updated, 1) if self.last_updated else None,
+                "pending_writes": len(self.update_queue) + sum(len(tasks) for tasks in self.in_flight_tasks.values()),
+                "quota_remaining": self.quota_remaining,
+            }
+
+    def load_delta(self) -> bool:
+        """
+        Refreshes only the status/time columns and appends rows added since the last load,
+        in a single ranged batch read. Local pending writes win over the sheet values.
+        Returns False when the sheet layout changed and a full reload is needed instead.
+        """
+        headers = self.storage.get_headers()
+        header_map = {header: i + 1 for i, header in enumerate(headers)}
+        status_fields = [column for columns in STATUS_COLUMNS.values() for column in columns]
+        if any(column not in header_map for column in status_fields + [settings.COL_UNIQUE_ID]):
+            return False
+
+        attendees_cache = self.attendees_cache
+        row_index = self.employee_id_to_row_index
+        known_rows = max(row_index.values(), default=1) - 1
+
+        def column_range(column: str) -> str:
+            letter = _column_letter(header_map[column])
+            return f"{letter}2:{letter}"
+
+        ranges = ["1:1", column_range(settings.COL_UNIQUE_ID)] + [column_range(column) for column in status_fields]
+        ranges.append(f"A{known_rows + 2}:{_column_letter(len(headers))}")
+
+        fetch_started = time.time()
+        header_values, uid_values, *status_values, new_rows = self.storage.batch_get(ranges)
+
+        if (header_values[0] if header_values else []) != headers:
+            return False
+        uid_column = [str(row[0]) if row else "" for row in uid_values]
+        if len(uid_column) < known_rows:
+            return False
+        for i, employee_id in enumerate(uid_column[:known_rows]):
+            if employee_id and row_index.get(employee_id) != i + 2:
+                return False
+
+        columns = {
+            column: [row[0] if row else "" for row in values]
+            for column, values in zip(status_fields, status_values)
+        }
+        # Records report status flags as "TRUE"/"FALSE"; compare like with like
+        for status_column, _ in STATUS_COLUMNS.values():
+            columns[status_column] = ["TRUE" if _is_true(value) else "FALSE" for value in columns[status_column]]
+        changes = []
+        for i, employee_id in enumerate(uid_column[:known_rows]):
+            record = attendees_cache.get(employee_id)
+            if record is None:
+                continue
+            values = {column: columns[column][i] if i < len(columns[column]) else "" for column in status_fields}
+            for status_column, _ in STATUS_COLUMNS.values():
+                values[status_column] = values[status_column] or "FALSE"
+            if any(record[column] != value for column, value in values.items()):
+                changes.append((employee_id, values))
+
+        schema = self.schema or RosterSchema(headers)
+        added_records = [AttendeeRecord.from_row(schema, row, known_rows + 2 + offset) for offset, row in enumerate(new_rows)]
+
+        with self._write_lock:
+            pending = self._pending_keys(fetch_started)
+            for employee_id, values in changes:
+                for update_type, update_columns in STATUS_COLUMNS.items():
+                    if (employee_id, update_type) not in pending:
+                        self._set_fields(employee_id, {column: values[column] for column in update_columns})
+
+            # New rows change the dict size, so publish a copy instead of inserting into the live dict
+            new_cache = None
+            for record in added_records:
+                employee_id = str(record[settings.COL_UNIQUE_ID])
+                if not employee_id or employee_id in self.attendees_cache:
+                    continue
+                if new_cache is None:
+                    new_cache = dict(self.attendees_cache)
+                new_cache[employee_id] = record
+                self.total_count += 1
+                self.checked_in_count += record.checked_in
+                self.checked_out_count += record.checked_out
+                self.breakdown.add(record)
+            if new_cache is not None:
+                self.attendees_cache = new_cache
+                self.status_changes.notify()
+            self.last_updated = fetch_started
+
+        if new_cache is not None:
+            self.search_index = SearchIndex(new_cache.values())
+
+        metrics.RELOAD_DURATION.observe(time.time() - fetch_started, mode="delta")
+        metrics.RELOAD_ROWS.set(len(uid_column) + len(new_rows), mode="delta")
+        print(f"Delta reload applied {len(changes)} changed and {len(added_records)} new rows.")
+        self.save_snapshot()
+        return True
+
+    def reload_cache(self):
+        """Runs a delta reload when configured, with a periodic or fallback full reload."""
+        self._reload_count += 1
+        full_every = settings.CACHE_FULL_RELOAD_EVERY
+        periodic_full = full_every > 0 and self._reload_count % full_every == 0
+        if settings.CACHE_RELOAD_MODE == "delta" and self.data_source == "sheet" and not periodic_full:
+            try:
+                if self.load_delta():
+                    return
+                print("Sheet layout changed since the last load. Falling back to a full reload.")
+            except Exception as e:
+                metrics.RELOAD_FAILURES.inc(mode="delta")
+                print(f"Error during delta reload: {e}. Falling back to a full reload.")
+                self.storage.handle_error(e)
+        self.load_initial_data()
 
     def _background_cache_reload(self):
+        if self.is_leader and self.data_source != "sheet":
+            print("Refreshing warm-start cache from Google Sheets...")
+            self.load_initial_data()
         while not self.shutdown_event.is_set():
+            if not self.is_leader:
+                self.shutdown_event.wait(settings.SHARED_LEADER_CHECK_SECONDS)
+                if self.shared.try_become_leader():
+                    print("This worker is now the leader.")
+                    self._take_over_writes()
+                    self.load_initial_data()
+                else:
+                    self._follow_snapshot()
+                continue
+
             self.shutdown_event.wait(settings.CACHE_UPDATE_INTERVAL_SECONDS)
+            # When the read budget is low, wait for it rather than racing scripts into a 429
+            quota_wait = self.storage.quota_wait(READ, Priority.RELOAD)
+            if quota_wait > 0:
+                print(f"Sheets read quota is low. Deferring cache reload by {quota_wait:.1f} seconds...")
+                self.shutdown_event.wait(quota_wait)
             if not self.shutdown_event.is_set():
                 print("Running background cache reload...")
-                self.load_initial_data()
+                self.reload_cache()
+
+    def _enqueue(self, task: UpdateTask, journal: bool = True):
+        """Queues a write and wakes the writer when it may need to flush. Caller holds the write lock."""
+        if journal and self.journal:
+            self.journal.append(task)
+        if not self.update_queue:
+            self.queue_oldest_at = time.time()
+            self.write_wakeup.set()
+        self.update_queue.append(task)
+        if len(self.update_queue) >= settings.WRITE_FLUSH_THRESHOLD:
+            self.write_wakeup.set()
+
+    def _requeue(self, tasks: List[UpdateTask], oldest_at: float):
+        """Puts failed tasks back at the head of the queue. Caller holds the write lock."""
+        for item in reversed(tasks):
+            self.update_queue.appendleft(item)
+        if tasks:
+            self.queue_oldest_at = min(self.queue_oldest_at or oldest_at, oldest_at)
+
+    def _next_flush_delay(self) -> float:
+        """Seconds until the next flush is due; the idle wait when the queue is empty."""
+        with self._write_lock:
+            # Rows can't be resolved until the sheet has loaded (a warm-start snapshot's row numbers
+            # may be out of date); journaled writes and new check-ins wait until then
+            if not self.update_queue or self.data_source != "sheet":
+                return settings.WRITE_MAX_DELAY_SECONDS
+            now = time.time()
+            if len(self.update_queue) >= settings.WRITE_FLUSH_THRESHOLD:
+                due_at = now
+            else:
+                due_at = self.queue_oldest_at + settings.WRITE_MAX_DELAY_SECONDS
+            delay = max(due_at, self.last_flush_at + settings.WRITE_MIN_INTERVAL_SECONDS) - now
+        # Out of write budget: hold the batch so later check-ins merge into it. Asked without the
+        # write lock, since a shared quota state file means cross-process file locking and I/O.
+        return max(delay, self.storage.quota_wait(WRITE, Priority.CHECK_IN))
+
+    def _refresh_quota_remaining(self):
+        """
+        Called from the writer thread. With SHEETS_QUOTA_STATE_PATH set, reading the quota locks and
+        reads a file shared with other processes, so the async endpoints only see this copy.
+        """
+        self.quota_remaining = self.storage.quota.remaining() if self.storage.quota else None
+
+    def _take_batch(self) -> Optional[Tuple[int, List[UpdateTask], float]]:
+        with self._write_lock:
+            if not self.update_queue:
+                return None
+            tasks = []
+            while self.update_queue and len(tasks) < settings.WRITE_MAX_BATCH_TASKS:
+                tasks.append(self.update_queue.popleft())
+            oldest_at = self.queue_oldest_at or time.time()
+            self.queue_oldest_at = time.time() if self.update_queue else None
+            batch_id = next(self._batch_ids)
+            self.in_flight_tasks[batch_id] = tasks
+            self.last_flush_at = time.time()
+            return batch_id, tasks, oldest_at
+
+    def _flush_batch(self, batch_id: int, updates_to_process: List[UpdateTask], oldest_at: float):
+        print(f"Processing {len(updates_to_process)} updates from queue...")
+        metrics.FLUSH_BATCH_TASKS.observe(len(updates_to_process))
+        tasks_to_write = coalesce_tasks(updates_to_process)
+
+        try:
+            header_map = self.storage.get_header_map()
+
+            data, tasks_to_write = plan_range_updates(tasks_to_write, self.employee_id_to_row_index, header_map)
+            if data:
+                print(f"Writing {len(tasks_to_write)} tasks as {len(data)} ranges in one batch update...")
+                metrics.FLUSH_BATCH_RANGES.observe(len(data))
+                write_started = time.time()
+                try:
+                    self.storage.write_ranges(data)
+                except Exception:
+                    metrics.FLUSH_DURATION.observe(time.time() - write_started, result="error")
+                    raise
+                flushed_at = time.time()
+                metrics.FLUSH_DURATION.observe(flushed_at - write_started, result="ok")
+                metrics.WRITE_LAG.observe(flushed_at - oldest_at)
+                with self._write_lock:
+                    for employee_id, update_type, _ in tasks_to_write:
+                        self._flushed_at[(employee_id, update_type)] = flushed_at
+
+            self._confirm_written(updates_to_process)
+            print(f"Finished processing batch {batch_id}.")
+
+        except Exception as e:
+            import traceback
+            print("="*80)
+            metrics.FLUSH_FAILURES.inc()
+            print(f"ERROR: Failed to write {len(tasks_to_write)} tasks. They will be re-queued.")
+            traceback.print_exc()
+            print("="*80)
+            self.storage.handle_error(e)
+            with self._write_lock:
+                self._requeue(tasks_to_write, oldest_at)
+            # Superseded duplicates will never be written on their own
+            requeued = set(tasks_to_write)
+            self._confirm_written([task for task in updates_to_process if task not in requeued])
+        finally:
+            with self._write_lock:
+                self.in_flight_tasks.pop(batch_id, None)
+
+    def _confirm_written(self, tasks: List[UpdateTask]):
+        if self.journal:
+            self.journal.confirm(tasks)
+        if self.shared:
+            self.shared.confirm(tasks)
 
     def _background_writer(self):
+        executor = ThreadPoolExecutor(max_workers=settings.WRITE_MAX_IN_FLIGHT, thread_name_prefix="sheets-writer")
+        slots = threading.BoundedSemaphore(settings.WRITE_MAX_IN_FLIGHT)
+
+        def release_slot(_):
+            slots.release()
+            self.write_wakeup.set()
+
         while not self.shutdown_event.is_set():
-            self.shutdown_event.wait(10)
-            if not self.update_queue:
+            if self.shared and self.is_leader:
+                # Picks up other workers' writes even when no request arrives here to sync
+                self._sync_shared()
+            self._refresh_quota_remaining()
+            delay = self._next_flush_delay()
+            if delay > 0:
+                self.write_wakeup.wait(delay)
+                self.write_wakeup.clear()
                 continue
 
-            updates_to_process = []
-            with self._lock:
-                while self.update_queue:
-                    updates_to_process.append(self.update_queue.popleft())
-
-            if not updates_to_process:
+            # All batch slots busy: wait for one to finish before taking more work
+            if not slots.acquire(timeout=settings.WRITE_MAX_DELAY_SECONDS):
                 continue
+            batch = self._take_batch()
+            if batch is None:
+                slots.release()
+                continue
+            executor.submit(self._flush_batch, *batch).add_done_callback(release_slot)
 
-            print(f"Processing {len(updates_to_process)} updates from queue...")
+        executor.shutdown(wait=True)
 
-            try:
-                gsheet_client = GSheetClient.from_settings()
-                worksheet = gsheet_client.get_worksheet(settings.WORKSHEET_NAME)
-                headers = worksheet.row_values(1)
-                header_map = {header: i + 1 for i, header in enumerate(headers)}
-
-                # Chunk tasks into smaller batches before generating cells
-                for i in range(0, len(updates_to_process), TASK_BATCH_SIZE):
-                    task_batch = updates_to_process[i:i + TASK_BATCH_SIZE]
-                    cells_to_update = []
-
-                    for employee_id, update_type, timestamp_str in task_batch:
-                        row_index = self.employee_id_to_row_index.get(employee_id)
-                        if not row_index:
-                            print(f"Warning: Could not find row for employee {employee_id}. Skipping.")
-                            continue
-
-                        if update_type == "check-in":
-                            status_col = header_map[settings.COL_CHECK_IN_STATUS]
-                            time_col = header_map[settings.COL_CHECK_IN_TIME]
-                            cells_to_update.append(gspread.Cell(row_index, status_col, "TRUE"))
-                            cells_to_update.append(gspread.Cell(row_index, time_col, timestamp_str))
-                        elif update_type == "check-out":
-                            status_col = header_map[settings.COL_CHECK_OUT_STATUS]
-                            time_col = header_map[settings.COL_CHECK_OUT_TIME]
-                            cells_to_update.append(gspread.Cell(row_index, status_col, "TRUE"))
-                            cells_to_update.append(gspread.Cell(row_index, time_col, timestamp_str))
-
-                    if not cells_to_update:
-                        continue
-
-                    try:
-                        print(f"Updating a batch of {len(cells_to_update)} cells for {len(task_batch)} tasks...")
-                        gsheet_client.batch_update_cells(worksheet, cells_to_update)
-                    except Exception as e:
-                        print("="*80)
-                        print(f"ERROR: Failed to update a batch of {len(task_batch)} tasks. This batch will be re-queued.")
-                        print(f"Error Details: {e}")
-                        print("="*80)
-                        with self._lock:
-                            for item in reversed(task_batch):
-                                self.update_queue.appendleft(item)
-
-                print(f"Finished processing for this cycle.")
-
-            except Exception as e:
-                import traceback
-                print("="*80)
-                print(f"FATAL: An unexpected error occurred before batch processing. All tasks for this cycle will be re-queued.")
-                traceback.print_exc()
-                print("="*80)
-                with self._lock:
-                    for item in reversed(updates_to_process):
-                        self.update_queue.appendleft(item)
+    # The methods below are called directly from async endpoints and must never block on network I/O.
+    # In shared state mode the reads also run a short query against the local SQLite file; the updates
+    # claim its write lock, which can wait on other workers, so the endpoints run them in a thread.
 
     def get_attendee(self, employee_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            return self.attendees_cache.get(employee_id)
+        self._sync_shared()
+        return self.attendees_cache.get(employee_id)
 
     def get_all_attendees(self) -> List[Dict[str, Any]]:
-        with self._lock:
-            return list(self.attendees_cache.values())
-
-    def update_check_in_status(self, employee_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            attendee = self.attendees_cache.get(employee_id)
-            if not attendee:
+        self._sync_shared()
+        return list(self.attendees_cache.values())
+
+    def get_status_counts(self) -> Dict[str, int]:
+        self._sync_shared()
+        return {
+            "total_attendees": self.total_count,
+            "checked_in_count": self.checked_in_count,
+            "checked_out_count": self.checked_out_count,
+        }
+
+    def get_breakdown(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Attendance per department and per table, from the incrementally kept counters."""
+        self._sync_shared()
+        with self._write_lock:
+            groups = {
+                "departments": [(name, tuple(counts)) for name, counts in self.breakdown.departments.items()],
+                "tables": [(name, tuple(counts)) for name, counts in self.breakdown.tables.items()],
+            }
+        return {
+            kind: [
+                {"name": name, "total_attendees": total, "checked_in_count": checked_in, "checked_out_count": checked_out}
+                for name, (total, checked_in, checked_out) in sorted(items)
+            ]
+            for kind, items in groups.items()
+        }
+
+    def search_attendees(self, query: str, limit: int = 20) -> List[AttendeeRecord]:
+        """Best matches for a name, EmployeeID or email (or a prefix or part of one)."""
+        self._sync_shared()
+        attendees_cache = self.attendees_cache
+        records = (attendees_cache.get(unique_id) for unique_id in self.search_index.search(query, limit))
+        return [record for record in records if record is not None]
+
+    def export_snapshot(self) -> Tuple[List[str], List[AttendeeRecord]]:
+        """
+        The headers and every record at one point in time, in sheet order. Records are immutable,
+        so only the list is copied under the lock; the export itself is encoded without it.
+        """
+        self._sync_shared()
+        with self._write_lock:
+            headers = list(self.headers)
+            records = list(self.attendees_cache.values())
+        records.sort(key=lambda record: record.row_index)
+        return headers, records
+
+    def get_table_guests(self, table_number: str) -> Optional[Dict[str, List[Dict[str, str]]]]:
+        """A table's guests split into present, absent (not checked in) and checked out, or None for an unknown table."""
+        self._sync_shared()
+        with self._write_lock:
+            guests = self.breakdown.table_guests.get(table_number)
+            records = list(guests.values()) if guests else None
+        if records is None:
+            return None
+        result: Dict[str, List[Dict[str, str]]] = {"present": [], "absent": [], "checked_out": []}
+        for record in records:
+            group = "checked_out" if record.checked_out else "present" if record.checked_in else "absent"
+            result[group].append({"name": record.get(settings.COL_NAME, ""), "department": record.get(settings.COL_DEPARTMENT, "")})
+        for guests_in_group in result.values():
+            guests_in_group.sort(key=lambda guest: guest["name"])
+        return result
+
+    def _record_update(self, employee_id: str, update_type: str) -> Optional[Dict[str, Any]]:
+        status_column, _ = STATUS_COLUMNS[update_type]
+        if self.shared:
+            # The SQLite claim comes first, so waiting for another worker never holds the cache's write lock
+            with self.shared.transaction() as conn, self._write_lock:
+                # Catch up on other workers first: if one of them already recorded this update, keep theirs
+                self._sync_shared_locked(conn)
+                attendee = self.attendees_cache.get(employee_id)
+                if not attendee or _is_true(attendee.get(status_column)):
+                    return attendee
+                task = (employee_id, update_type, datetime.now(TAIPEI_TZ).isoformat())
+                self._shared_seen_id = self.shared.append(conn, task)
+                return self._apply_task(task)
+
+        with self._write_lock:
+            if employee_id not in self.attendees_cache:
                 return None
-
-            timestamp_str = datetime.now(TAIPEI_TZ).isoformat()
-
-            attendee[settings.COL_CHECK_IN_STATUS] = "TRUE"
-            attendee[settings.COL_CHECK_IN_TIME] = timestamp_str
-
-            self.update_queue.append((employee_id, "check-in", timestamp_str))
-            return attendee
-
-    def update_check_out_status(self, employee_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            attendee = self.attendees_cache.get(employee_id)
-            if not attendee:
+            task = (employee_id, update_type, datetime.now(TAIPEI_TZ).isoformat())
+            return self._apply_task(task)
+
+    def _apply_task(self, task: UpdateTask) -> Optional[AttendeeRecord]:
+        """Applies a recorded update to the cache and queues it for the sheet. Caller holds the write lock."""
+        employee_id, update_type, timestamp_str = task
+        status_column, time_column = STATUS_COLUMNS[update_type]
+        attendee = self._set_fields(employee_id, {
+            status_column: "TRUE",
+            time_column: timestamp_str,
+        })
+
+        if self.is_leader:
+            self._enqueue(task, journal=not self.shared)
+        return attendee
+
+    def _plan_scan(self, scan: Scan, done: set, now: datetime) -> Tuple[Dict[str, Any], Optional[UpdateTask]]:
+        """
+        The outcome of one scan given the cache plus the updates earlier scans of the same batch
+        will make (`done`). Caller holds the write lock.
+        """
+        scan_id, employee_id, update_type, scanned_at = scan
+        attendee = self.attendees_cache.get(employee_id)
+        result: Dict[str, Any] = {"scanId": scan_id, "employeeId": employee_id, "type": update_type}
+        if attendee is None:
+            return {**result, "status": "not_found"}, None
+        result.update(
+            name=attendee.get(settings.COL_NAME, ""),
+            department=attendee.get(settings.COL_DEPARTMENT, ""),
+            table_number=attendee.get(settings.COL_TABLE_NUMBER),
+        )
+        checked_in = attendee.checked_in or (employee_id, "check-in") in done
+        if update_type == "check-in" and checked_in:
+            return {**result, "status": "already_checked_in"}, None
+        if update_type == "check-out":
+            if not checked_in:
+                return {**result, "status": "not_checked_in"}, None
+            if attendee.checked_out or (employee_id, "check-out") in done:
+                return {**result, "status": "already_checked_out"}, None
+        # The device's scan time, unless its clock is ahead of ours
+        if scanned_at and scanned_at.tzinfo is None:
+            scanned_at = TAIPEI_TZ.localize(scanned_at)
+        timestamp = min(scanned_at, now) if scanned_at else now
+        done.add((employee_id, update_type))
+        return {**result, "status": "ok"}, (employee_id, update_type, timestamp.astimezone(TAIPEI_TZ).isoformat())
+
+    def _remember_scan(self, scan_id: str, result: Dict[str, Any]):
+        """Caller holds the write lock."""
+        self._scan_results[scan_id] = result
+        while len(self._scan_results) > settings.SCAN_IDEMPOTENCY_KEYS:
+            self._scan_results.popitem(last=False)
+
+    def apply_scans(self, scans: List[Scan]) -> List[Dict[str, Any]]:
+        """
+        Applies a scanner's queued scans in order under a single write-lock acquisition and
+        returns one result per scan. Each scan ID is remembered with its result, so a scanner
+        replaying a batch after a timeout gets the original results back instead of conflicts.
+        """
+        now = datetime.now(TAIPEI_TZ)
+        results: List[Dict[str, Any]] = []
+        tasks: List[UpdateTask] = []
+        done: set = set()
+        batch_results: Dict[str, Dict[str, Any]] = {}
+
+        def plan(scan: Scan, stored: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            stored = batch_results.get(scan[0], stored)
+            if stored is not None:
+                results.append({**stored, "replayed": True})
                 return None
+            result, task = self._plan_scan(scan, done, now)
+            results.append(result)
+            batch_results[scan[0]] = result
+            if task:
+                tasks.append(task)
+            return result
+
+        def apply():
+            for task in tasks:
+                self._apply_task(task)
+            for scan, result in zip(scans, results):
+                if not result.get("replayed"):
+                    self._remember_scan(scan[0], result)
+
+        if self.shared:
+            # As in _record_update, the SQLite claim is taken before the write lock
+            with self.shared.transaction() as conn, self._write_lock:
+                self._sync_shared_locked(conn)
+                for scan in scans:
+                    stored = self._scan_results.get(scan[0]) or self.shared.scan_result(conn, scan[0])
+                    result = plan(scan, stored)
+                    if result is not None:
+                        self.shared.save_scan_result(conn, scan[0], result)
+                for task in tasks:
+                    self._shared_seen_id = self.shared.append(conn, task)
+                apply()
+        else:
+            with self._write_lock:
+                for scan in scans:
+                    plan(scan, self._scan_results.get(scan[0]))
+                apply()
+        return results
 
-            timestamp_str = datetime.now(TAIPEI_TZ).isoformat()
-
-            attendee[settings.COL_CHECK_OUT_STATUS] = "TRUE"
-            attendee[settings.COL_CHECK_OUT_TIME] = timestamp_str
+    def update_check_in_status(self, employee_id: str) -> Optional[Dict[str, Any]]:
+        return self._record_update(employee_id, "check-in")
 
-            self.update_queue.append((employee_id, "check-out", timestamp_str))
-            return attendee
+    def update_check_out_status(self, employee_id: str) -> Optional[Dict[str, Any]]:
+        return self._record_update(employee_id, "check-out")
 
 cache_manager = CacheManager.get_instance()
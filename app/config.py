@@ -18,13 +18,40 @@ class Settings(BaseSettings):
     MAILGUN_DOMAIN: str = ""
     MAILGUN_SENDER_EMAIL: str = "QR Code System <noreply@your-mailgun-domain.com>"
     MAILGUN_API_BASE_URL: str = "https://api.mailgun.net/v3"
+    MAILGUN_CONCURRENCY: int = 8 # Messages in flight at once
+    MAILGUN_MESSAGES_PER_MINUTE: int = 100 # Your plan's sending rate; 0 = unlimited
+    MAILGUN_BATCH_SIZE: int = 500 # Recipients per batch-sending call (max 1000)
+    # URL template for hosted QR images, e.g. "https://checkin.example.com/qr/{unique_id}.png".
+    # When set, invitations go out in batches with recipient-variables instead of one inline image per message.
+    MAILGUN_QR_IMAGE_URL: str = ""
+    EMAIL_CHECKPOINT_PATH: str = "data/email_checkpoint.txt" # Guests sent to whose EmailSentStatus isn't written yet
+    EMAIL_STATUS_FLUSH_EVERY: int = 100 # Write EmailSentStatus after this many sends...
+    EMAIL_STATUS_FLUSH_SECONDS: float = 15.0 # ...or this many seconds, whichever comes first
+
+    # Roster import (scripts/1_setup_database.py)
+    IMPORT_CSV_PATH: str = "attendees.csv"
+    IMPORT_ID_COLUMN: str = "EmployeeID" # CSV column UniqueIDs are derived from; falls back to Email
+    IMPORT_ID_NAMESPACE: str = "" # Secret seed for new UniqueIDs; empty uses a random one per import
+    IMPORT_REUSE_IDS: bool = True # Guests already in the roster keep their UniqueID; turn off for a new event's roster
+    IMPORT_CHUNK_ROWS: int = 1000 # Rows per write request
+    IMPORT_CHECKPOINT_PATH: str = "data/import_checkpoint.json"
+
+    # QR codes
+    QR_CACHE_DIR: str = "data/qr_cache" # Rendered PNGs, keyed by UniqueID and render parameters
+    QR_BOX_SIZE: int = 10 # Pixels per module
+    QR_BORDER: int = 4 # Quiet zone, in modules
+    QR_ERROR_CORRECTION: str = "M" # L, M, Q or H
+    QR_RENDER_WORKERS: int = 0 # Render processes; 0 = one per CPU
 
     # Google Sheets
     SPREADSHEET_NAME: str = "尾牙報到系統"
     WORKSHEET_NAME: str = "賓客名單"
+    GOOGLE_SHEET_ID: str = "" # Opens by key when set, skipping the Drive search by name
+    GSHEET_POOL_SIZE: int = 10
 
     # --- Google Sheets Column Names ---
     COL_UNIQUE_ID: str = "UniqueID"
+    COL_EMPLOYEE_ID: str = "EmployeeID"
     COL_NAME: str = "Name"
     COL_DEPARTMENT: str = "Department"
     COL_EMAIL: str = "Email"
@@ -35,8 +62,48 @@ class Settings(BaseSettings):
     COL_CHECK_OUT_STATUS: str = "CheckOutStatus"
     COL_CHECK_OUT_TIME: str = "CheckOutTime"
 
+    # Sheets API quota (per minute, per service account); 0 = don't pace
+    SHEETS_READ_QUOTA_PER_MINUTE: int = 60
+    SHEETS_WRITE_QUOTA_PER_MINUTE: int = 60
+    SHEETS_QUOTA_RESERVE_FRACTION: float = 0.2 # Share of each bucket kept back per priority level (reloads, then scripts)
+    SHEETS_QUOTA_STATE_PATH: str = "" # e.g. data/sheets_quota.json: share the budget with other workers and the scripts
+
+    # Storage Backend
+    STORAGE_BACKEND: str = "sheets" # "sheets", "sqlite" (no per-minute write quota) or "emulator" (offline Sheets stand-in)
+    SQLITE_DATABASE_PATH: str = "data/roster.sqlite3"
+    EMULATOR_SEED_CSV: str = "" # Full sheet contents, header row first
+    EMULATOR_LATENCY_SECONDS: float = 0.0
+    EMULATOR_READ_QUOTA_PER_MINUTE: int = 0 # 0 = unlimited
+    EMULATOR_WRITE_QUOTA_PER_MINUTE: int = 0
+    EMULATOR_ERROR_RATE: float = 0.0 # Chance of a random 429 per request
+
     # Cache Settings
     CACHE_UPDATE_INTERVAL_SECONDS: int = 300
+    CACHE_RELOAD_MODE: str = "delta" # "delta" refreshes status/time columns only, "full" re-reads the whole sheet
+    CACHE_FULL_RELOAD_EVERY: int = 12 # Every Nth reload is a full one to pick up edits to static columns (0 = never)
+    CACHE_SNAPSHOT_PATH: str = "data/roster_snapshot.pickle" # Empty disables warm start
+
+    # Sheets Writer Settings
+    WRITE_FLUSH_THRESHOLD: int = 100 # Flush as soon as this many writes are queued
+    WRITE_MAX_DELAY_SECONDS: float = 2.0 # Flush once the oldest queued write is this old
+    WRITE_MIN_INTERVAL_SECONDS: float = 1.0 # Never start batches faster than this (Sheets allows ~60 writes/min/user)
+    WRITE_MAX_BATCH_TASKS: int = 1000
+    WRITE_MAX_IN_FLIGHT: int = 2
+    WRITE_JOURNAL_PATH: str = "data/write_journal.jsonl" # Empty disables the journal
+    WRITE_JOURNAL_COMMIT_INTERVAL_SECONDS: float = 0.05
+
+    # Bulk sync (/api/scans/sync)
+    SCAN_SYNC_MAX_SCANS: int = 500 # Scans per request
+    SCAN_IDEMPOTENCY_KEYS: int = 100000 # Scan IDs remembered for replays
+
+    # Dashboard push (/api/status/stream)
+    STATUS_STREAM_MIN_INTERVAL_SECONDS: float = 0.5 # At most one update per connection this often
+    STATUS_STREAM_KEEPALIVE_SECONDS: float = 15.0
+
+    # Multi-worker Settings (uvicorn --workers N on one host)
+    SHARED_STATE_PATH: str = "" # SQLite file shared by the workers; empty keeps state per process
+    SHARED_SYNC_INTERVAL_SECONDS: float = 0.05 # How stale a worker's view of other workers' check-ins may get
+    SHARED_LEADER_CHECK_SECONDS: float = 5.0
 
     @property
     def google_credentials(self) -> dict:
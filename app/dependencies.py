@@ -1,9 +1,12 @@
 from fastapi import Header, HTTPException, status, Security
-from fastapi.security import APIKeyHeader
+from fastapi.security import APIKeyHeader, APIKeyQuery
 
 from .config import settings
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=True)
+api_key_header_optional = APIKeyHeader(name="X-API-Key", auto_error=False)
+# Browsers' EventSource can't send headers, so streams also accept ?api_key=
+api_key_query = APIKeyQuery(name="api_key", auto_error=False)
 
 async def get_api_key(api_key: str = Security(api_key_header)):
     """
@@ -18,3 +21,10 @@ async def get_api_key(api_key: str = Security(api_key_header)):
             detail="Invalid or missing API Key",
         )
     return api_key
+
+async def get_stream_api_key(header_key: str = Security(api_key_header_optional), query_key: str = Security(api_key_query)):
+    """
+    Like get_api_key, for streaming endpoints: the key may come from the X-API-Key header
+    or the `api_key` query parameter.
+    """
+    return await get_api_key(header_key or query_key or "")
@@ -0,0 +1,73 @@
+# app/export.py
+import csv
+import io
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
+
+from .attendee_store import AttendeeRecord
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Which records each status filter keeps; checked_in includes guests who have since checked out, like /api/status
+STATUS_FILTERS: Dict[str, Callable[[AttendeeRecord], bool]] = {
+    "all": lambda record: True,
+    "checked_in": lambda record: record.checked_in,
+    "checked_out": lambda record: record.checked_out,
+    "absent": lambda record: not record.checked_in,
+}
+
+
+def _encode_rows(records: Iterable[AttendeeRecord], columns: Sequence[str], fmt: str, chunk_rows: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    if fmt == "csv":
+        # BOM so Excel opens the Chinese names as UTF-8
+        buffer.write("\ufeff")
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write_row = lambda record: writer.writerow([record.get(column, "") for column in columns])
+    else:
+        write_row = lambda record: buffer.write(json.dumps({column: record.get(column, "") for column in columns}, ensure_ascii=False) + "\n")
+
+    pending = 0
+    for record in records:
+        write_row(record)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_rows(records: Iterable[AttendeeRecord], columns: Sequence[str], fmt: str = "csv", status: str = "all",
+                compress: bool = False, chunk_rows: int = 500) -> Iterator[bytes]:
+    """
+    Encodes records as CSV (with a header row) or NDJSON, `chunk_rows` rows per chunk, so a
+    download of any size holds one chunk in memory at a time. With `compress`, the chunks are
+    one gzip stream.
+    """
+    keep = STATUS_FILTERS[status]
+    chunks = _encode_rows((record for record in records if keep(record)), columns, fmt, chunk_rows)
+    if not compress:
+        yield from chunks
+        return
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def parse_columns(requested: str, headers: List[str]) -> List[str]:
+    """The comma-separated columns to export, in the requested order; all headers when empty. Raises ValueError on unknown ones."""
+    if not requested:
+        return list(headers)
+    columns = [column.strip() for column in requested.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in headers]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return columns
@@ -1,12 +1,18 @@
 import gspread
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
-from typing import Dict, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable
 from datetime import datetime, timezone
+import threading
 import time
 import random
 from functools import wraps
 
 from .config import settings
+from .metrics import SHEETS_RATE_LIMITED
+from .quota import QuotaScheduler
 
 # --- Retry Logic ---
 def retry_with_backoff(retries=5, backoff_in_seconds=1):
@@ -19,6 +25,7 @@ def retry_with_backoff(retries=5, backoff_in_seconds=1):
                     return f(*args, **kwargs)
                 except gspread.exceptions.APIError as e:
                     if e.response.status_code == 429: # Rate limit exceeded
+                        SHEETS_RATE_LIMITED.inc(call=f.__name__)
                         attempts += 1
                         if attempts >= retries:
                             raise e
@@ -38,29 +45,95 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive.readonly"
 ]
 
+# Errors after which the shared client is discarded and rebuilt on next use
+RECONNECT_ERRORS = (RefreshError, TransportError, requests.exceptions.ConnectionError)
+
 class GSheetClient:
     """A client to interact with Google Sheets."""
 
-    def __init__(self, credentials: dict, spreadsheet_name: str):
+    _shared: Optional["GSheetClient"] = None
+    _shared_lock = threading.Lock()
+    # Process-wide read/write budget; it outlives reset_shared() because the quota does
+    quota = QuotaScheduler.from_settings()
+
+    def __init__(self, credentials: dict, spreadsheet_name: str, spreadsheet_key: Optional[str] = None):
         self.creds = Credentials.from_service_account_info(credentials, scopes=SCOPES)
-        self.client = gspread.authorize(self.creds)
-        self.spreadsheet = self.client.open(spreadsheet_name)
+        # AuthorizedSession refreshes the token by itself; the mounted adapter keeps connections alive between calls
+        self.session = AuthorizedSession(self.creds)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=settings.GSHEET_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.client = gspread.authorize(self.creds, session=self.session)
+        if spreadsheet_key:
+            self.spreadsheet = self.client.open_by_key(spreadsheet_key)
+        else:
+            self.spreadsheet = self.client.open(spreadsheet_name)
+
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+        self._headers: Dict[str, List[str]] = {}
+        self._cache_lock = threading.Lock()
 
     @classmethod
     def from_settings(cls) -> "GSheetClient":
         return cls(
             credentials=settings.google_credentials,
-            spreadsheet_name=settings.SPREADSHEET_NAME
+            spreadsheet_name=settings.SPREADSHEET_NAME,
+            spreadsheet_key=settings.GOOGLE_SHEET_ID or None,
         )
 
+    @classmethod
+    def get_shared(cls) -> "GSheetClient":
+        """Returns the process-wide client, creating it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_settings()
+            return cls._shared
+
+    @classmethod
+    def reset_shared(cls):
+        """Drops the process-wide client so the next get_shared() re-authenticates."""
+        with cls._shared_lock:
+            if cls._shared is not None:
+                cls._shared.session.close()
+            cls._shared = None
+
+    @classmethod
+    def handle_error(cls, error: Exception):
+        """Resets the shared client if the error means its session can't be reused."""
+        if isinstance(error, RECONNECT_ERRORS):
+            print(f"Google Sheets connection lost ({error}). The client will be rebuilt.")
+            cls.reset_shared()
+
     @retry_with_backoff()
     def get_worksheet(self, worksheet_name: str) -> gspread.Worksheet:
-        return self.spreadsheet.worksheet(worksheet_name)
+        with self._cache_lock:
+            worksheet = self._worksheets.get(worksheet_name)
+        if worksheet is None:
+            worksheet = self.spreadsheet.worksheet(worksheet_name)
+            with self._cache_lock:
+                self._worksheets[worksheet_name] = worksheet
+        return worksheet
+
+    @retry_with_backoff()
+    def get_headers(self, worksheet: gspread.Worksheet, refresh: bool = False) -> List[str]:
+        with self._cache_lock:
+            headers = None if refresh else self._headers.get(worksheet.title)
+        if headers is None:
+            headers = worksheet.row_values(1)
+            self.set_headers(worksheet, headers)
+        return headers
+
+    def set_headers(self, worksheet: gspread.Worksheet, headers: List[str]):
+        with self._cache_lock:
+            self._headers[worksheet.title] = list(headers)
+
+    def get_header_map(self, worksheet: gspread.Worksheet) -> Dict[str, int]:
+        """Maps header names to 1-based column numbers."""
+        return {header: i + 1 for i, header in enumerate(self.get_headers(worksheet))}
 
     @retry_with_backoff()
     def find_row_by_employee_id(self, worksheet: gspread.Worksheet, employee_id: str) -> Optional[Dict[str, Any]]:
         try:
-            headers = worksheet.row_values(1)
+            headers = self.get_headers(worksheet)
             uid_col_name = settings.COL_UNIQUE_ID
             if uid_col_name not in headers:
                 raise ValueError(f"Column '{uid_col_name}' not found.")
@@ -0,0 +1,176 @@
+# app/mailer.py
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+
+from .config import settings
+from .quota import Priority, TokenBucket
+from .storage import StorageBackend
+from .write_planner import plan_column_updates
+
+# Mailgun accepts up to 1,000 recipients per batch-sending call
+MAX_BATCH_RECIPIENTS = 1000
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Thread-safe messages-per-minute limit; 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self._bucket = TokenBucket(per_minute)
+        self._lock = threading.Lock()
+
+    def acquire(self, messages: int = 1):
+        """Blocks until `messages` can go out. A batch bigger than the bucket waits for a full bucket and goes into debt."""
+        if not self._bucket.per_minute:
+            return
+        while True:
+            with self._lock:
+                wait = self._bucket.wait_time(min(messages, self._bucket.per_minute) - 1)
+                if wait <= 0:
+                    self._bucket.tokens -= messages
+                    return
+            time.sleep(wait)
+
+
+class MailgunSender:
+    """
+    Sends through the Mailgun messages API on one pooled session, so concurrent senders reuse
+    keep-alive connections. Every call waits for the plan's rate limit and is retried with
+    backoff on 429 and 5xx responses.
+    """
+
+    def __init__(self, api_key: str, domain: str, base_url: str, concurrency: int = 8,
+                 messages_per_minute: int = 0, retries: int = 5):
+        self.url = f"{base_url.rstrip('/')}/{domain}/messages"
+        self.retries = retries
+        self.rate_limiter = RateLimiter(messages_per_minute)
+        self.session = requests.Session()
+        self.session.auth = ("api", api_key)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_settings(cls) -> "MailgunSender":
+        return cls(
+            api_key=settings.MAILGUN_API_KEY,
+            domain=settings.MAILGUN_DOMAIN,
+            base_url=settings.MAILGUN_API_BASE_URL,
+            concurrency=settings.MAILGUN_CONCURRENCY,
+            messages_per_minute=settings.MAILGUN_MESSAGES_PER_MINUTE,
+        )
+
+    def send(self, data: Dict[str, Any], files: Optional[List[Tuple[str, Tuple[str, bytes, str]]]] = None,
+             recipients: int = 1) -> requests.Response:
+        """Posts one message (or one batch of `recipients`); raises HTTPError when Mailgun keeps refusing."""
+        self.rate_limiter.acquire(recipients)
+        attempt = 0
+        while True:
+            response = self.session.post(self.url, data=data, files=files, timeout=30)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries - 1:
+                response.raise_for_status()
+                return response
+            attempt += 1
+            retry_after = response.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt + random.uniform(0, 1)
+            print(f"Mailgun responded {response.status_code}. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+def batch_recipients(recipients: List[Dict[str, str]], batch_size: int) -> List[List[Dict[str, str]]]:
+    """
+    Splits recipients ({"email": ..., ...}) into batches for recipient-variables sending.
+    recipient-variables are keyed by address, so an address appears at most once per batch.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_RECIPIENTS))
+    batches: List[List[Dict[str, str]]] = []
+    open_batches: List[Tuple[List[Dict[str, str]], set]] = []
+    for recipient in recipients:
+        email = recipient["email"].lower()
+        for batch, emails in open_batches:
+            if email not in emails and len(batch) < batch_size:
+                batch.append(recipient)
+                emails.add(email)
+                break
+        else:
+            batch = [recipient]
+            batches.append(batch)
+            open_batches.append((batch, {email}))
+        open_batches = [(batch, emails) for batch, emails in open_batches if len(batch) < batch_size]
+    return batches
+
+
+class SentStatusRecorder:
+    """
+    Bookkeeping for sent invitations. Each UniqueID Mailgun accepted is appended and fsynced
+    to a local checkpoint at once; EmailSentStatus is then written in batched range updates
+    every `flush_every` guests or `flush_interval` seconds. The checkpoint keeps only guests
+    whose status isn't in the sheet yet, so an interrupted run neither resends them nor
+    loses their status.
+    """
+
+    def __init__(self, storage: StorageBackend, status_column: int, row_of: Dict[str, int], checkpoint_path: str,
+                 flush_every: int = 100, flush_interval: float = 15.0):
+        self.storage = storage
+        self.status_column = status_column
+        self.row_of = row_of
+        self.path = Path(checkpoint_path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, None] = {}
+        self._flushed_at = time.monotonic()
+
+    def open(self) -> Set[str]:
+        """Returns the guests an earlier run sent to without recording it in the sheet."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as checkpoint_file:
+                for line in checkpoint_file:
+                    if line.strip():
+                        self._pending[line.strip()] = None
+        return set(self._pending)
+
+    def record(self, unique_ids: Iterable[str]):
+        """Called from sender threads right after Mailgun accepted the message."""
+        unique_ids = list(unique_ids)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+                checkpoint_file.write("".join(f"{unique_id}\n" for unique_id in unique_ids))
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            self._pending.update(dict.fromkeys(unique_ids))
+
+    def flush_due(self) -> bool:
+        return len(self._pending) >= self.flush_every or (
+            bool(self._pending) and time.monotonic() - self._flushed_at >= self.flush_interval
+        )
+
+    def flush(self) -> int:
+        """Writes EmailSentStatus for every pending guest and compacts the checkpoint. Returns the rows written."""
+        with self._lock:
+            unique_ids = list(self._pending)
+        self._flushed_at = time.monotonic()
+        rows = [self.row_of[unique_id] for unique_id in unique_ids if unique_id in self.row_of]
+        if rows:
+            self.storage.write_ranges(plan_column_updates(rows, self.status_column, "TRUE"), Priority.SCRIPT)
+        with self._lock:
+            for unique_id in unique_ids:
+                self._pending.pop(unique_id, None)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                tmp_file.write("".join(f"{unique_id}\n" for unique_id in self._pending))
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, self.path)
+        return len(rows)
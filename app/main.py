@@ -1,28 +1,50 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
+import sqlite3
+import time
 import gspread
 from pathlib import Path
 from contextlib import asynccontextmanager
 
 from .config import settings
-from .dependencies import get_api_key
+from .dependencies import get_api_key, get_stream_api_key
 from .gsheet_client import GSheetClient
-from .models import CheckInRequest, CheckInSuccessResponse, CheckOutSuccessResponse, ErrorResponse, ConflictResponse, StatusResponse
+from .models import CheckInRequest, CheckInSuccessResponse, CheckOutSuccessResponse, ErrorResponse, ConflictResponse, StatusResponse, HealthResponse, ScanSyncRequest, ScanSyncResponse, BreakdownResponse, TableGuestsResponse, SearchResponse, SearchResult
 from .cache_manager import cache_manager
+from .metrics import HTTP_REQUEST_DURATION, REGISTRY
+from .export import FORMATS, export_rows, parse_columns
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    cache_manager.start()
+    await asyncio.to_thread(cache_manager.start)
     yield
     # Shutdown
-    cache_manager.stop()
+    await asyncio.to_thread(cache_manager.stop)
 
 app = FastAPI(title="尾牙報到/簽退 API 系統", version="3.0.0", lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Label by route template so per-guest URLs don't each become a series; static files share one
+    path = route.path if route is not None and hasattr(route, "methods") else "static"
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method, path=path, status=str(response.status_code))
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(api_key: str = Depends(get_stream_api_key)):
+    # Attendance counts are guest data, so scrapes need the API key (header, or ?api_key= via the scrape config's params)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.exception_handler(gspread.exceptions.SpreadsheetNotFound)
 async def spreadsheet_not_found_handler(request, exc):
     return JSONResponse(status_code=503, content={"detail": f"Google Sheet '{settings.SPREADSHEET_NAME}' not found."})
@@ -35,8 +57,24 @@ async def worksheet_not_found_handler(request, exc):
 async def gspread_api_error_handler(request, exc):
     return JSONResponse(status_code=503, content={"detail": f"Google Sheets API error: {exc}"})
 
+@app.exception_handler(sqlite3.OperationalError)
+async def shared_state_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": f"Shared check-in state is busy: {exc}"})
+
+
+async def run_update(update, *args):
+    """
+    Runs a cache update. In shared state mode it first claims the SQLite write lock, which can
+    wait on other workers, so it runs in a thread instead of stalling the event loop.
+    """
+    if cache_manager.shared:
+        return await asyncio.to_thread(update, *args)
+    return update(*args)
+
+# The request path runs on the event loop: cache reads are lock-free and updates only take the
+# cache's write lock for O(1) work and hand the write to the background writer without blocking.
 @api_router.post("/check-in", tags=["Check-in/Out"])
-def check_in(request: CheckInRequest, api_key: str = Depends(get_api_key)):
+async def check_in(request: CheckInRequest, api_key: str = Depends(get_api_key)):
     if not cache_manager.is_initialized:
         raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
 
@@ -55,7 +93,7 @@ def check_in(request: CheckInRequest, api_key: str = Depends(get_api_key)):
             }
         )
 
-    updated_attendee = cache_manager.update_check_in_status(request.employeeId)
+    updated_attendee = await run_update(cache_manager.update_check_in_status, request.employeeId)
 
     return CheckInSuccessResponse(
         name=updated_attendee.get(settings.COL_NAME, ""),
@@ -64,7 +102,7 @@ def check_in(request: CheckInRequest, api_key: str = Depends(get_api_key)):
     )
 
 @api_router.post("/check-out", response_model=CheckOutSuccessResponse, tags=["Check-in/Out"])
-def check_out(request: CheckInRequest, api_key: str = Depends(get_api_key)):
+async def check_out(request: CheckInRequest, api_key: str = Depends(get_api_key)):
     if not cache_manager.is_initialized:
         raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
 
@@ -82,29 +120,128 @@ def check_out(request: CheckInRequest, api_key: str = Depends(get_api_key)):
             detail={"detail": "此人已簽退", "name": attendee.get(settings.COL_NAME, "")}
         )
 
-    updated_attendee = cache_manager.update_check_out_status(request.employeeId)
+    updated_attendee = await run_update(cache_manager.update_check_out_status, request.employeeId)
 
     return CheckOutSuccessResponse(
         name=updated_attendee.get(settings.COL_NAME, ""),
         department=updated_attendee.get(settings.COL_DEPARTMENT, "")
     )
 
+@api_router.post("/scans/sync", response_model=ScanSyncResponse, tags=["Check-in/Out"])
+async def sync_scans(request: ScanSyncRequest, api_key: str = Depends(get_api_key)):
+    """
+    Applies a scanner station's queued check-ins and check-outs in one request. Outcomes like
+    "already checked in" are per-scan results, not errors, and a replayed scanId returns its
+    original result, so a station can safely resend a batch whose response it never got.
+    """
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+    if len(request.scans) > settings.SCAN_SYNC_MAX_SCANS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.SCAN_SYNC_MAX_SCANS} scans per request.")
+
+    results = await run_update(cache_manager.apply_scans, [(scan.scanId, scan.employeeId, scan.type, scan.scannedAt) for scan in request.scans])
+    return ScanSyncResponse(results=results)
+
+@api_router.get("/search", response_model=SearchResponse, tags=["Check-in/Out"])
+async def search_attendees(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(20, ge=1, le=100), api_key: str = Depends(get_api_key)):
+    """Help-desk lookup by name (or part of one), EmployeeID or email prefix, from the in-memory index."""
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+
+    return SearchResponse(results=[
+        SearchResult(
+            employeeId=record.get(settings.COL_UNIQUE_ID, ""),
+            employee_number=record.get(settings.COL_EMPLOYEE_ID),
+            name=record.get(settings.COL_NAME, ""),
+            department=record.get(settings.COL_DEPARTMENT, ""),
+            email=record.get(settings.COL_EMAIL, ""),
+            table_number=record.get(settings.COL_TABLE_NUMBER),
+            checked_in=record.checked_in,
+            checked_out=record.checked_out,
+        )
+        for record in cache_manager.search_attendees(q, limit)
+    ])
+
 @api_router.get("/status", response_model=StatusResponse, tags=["Status"])
-def get_status(api_key: str = Depends(get_api_key)):
+async def get_status(api_key: str = Depends(get_api_key)):
     if not cache_manager.is_initialized:
         raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
 
-    all_attendees = cache_manager.get_all_attendees()
-    total_attendees = len(all_attendees)
-    checked_in_count = sum(1 for record in all_attendees if str(record.get(settings.COL_CHECK_IN_STATUS, 'FALSE')).upper() == 'TRUE')
-    checked_out_count = sum(1 for record in all_attendees if str(record.get(settings.COL_CHECK_OUT_STATUS, 'FALSE')).upper() == 'TRUE')
+    return StatusResponse(**cache_manager.get_status_counts())
 
-    return StatusResponse(
-        total_attendees=total_attendees,
-        checked_in_count=checked_in_count,
-        checked_out_count=checked_out_count,
+@api_router.get("/status/breakdown", response_model=BreakdownResponse, tags=["Status"])
+async def get_status_breakdown(api_key: str = Depends(get_api_key)):
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+
+    return BreakdownResponse(**cache_manager.get_breakdown())
+
+@api_router.get("/status/tables/{table_number}", response_model=TableGuestsResponse, tags=["Status"])
+async def get_table_guests(table_number: str, api_key: str = Depends(get_api_key)):
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+
+    guests = cache_manager.get_table_guests(table_number)
+    if guests is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="桌號不存在")
+    return TableGuestsResponse(table_number=table_number, **guests)
+
+@api_router.get("/status/stream", tags=["Status"])
+async def stream_status(api_key: str = Depends(get_stream_api_key)):
+    """
+    Server-Sent Events with the same counts as /api/status, pushed when they change instead of polled.
+    Updates are coalesced to at most one every STATUS_STREAM_MIN_INTERVAL_SECONDS per connection.
+    """
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+
+    events = cache_manager.status_changes.stream(
+        cache_manager.get_status_counts,
+        settings.STATUS_STREAM_MIN_INTERVAL_SECONDS,
+        settings.STATUS_STREAM_KEEPALIVE_SECONDS,
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.get("/export", tags=["Status"])
+async def export_roster(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status_filter: str = Query("all", alias="status", pattern="^(all|checked_in|checked_out|absent)$"),
+    columns: str = Query("", description="Comma-separated columns; all by default."),
+    gzip: bool = False,
+    api_key: str = Depends(get_api_key),
+):
+    """
+    Streams the roster with its current check-in state straight from the cache, which may be
+    ahead of the Google Sheet. The snapshot is taken up front; encoding runs in the threadpool
+    a chunk at a time.
+    """
+    if not cache_manager.is_initialized:
+        raise HTTPException(status_code=503, detail="Cache is not initialized yet.")
+
+    headers, records = cache_manager.export_snapshot()
+    try:
+        selected_columns = parse_columns(columns, headers)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    filename = f"attendees-{status_filter}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_rows(records, selected_columns, format, status_filter, compress=gzip),
+        media_type="application/gzip" if gzip else f"{FORMATS[format]}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
+@api_router.get("/health/live", tags=["Health"])
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready", response_model=HealthResponse, tags=["Health"])
+async def readiness():
+    health = cache_manager.get_health()
+    if not health["ready"]:
+        return JSONResponse(status_code=503, content=health)
+    return health
+
 app.include_router(api_router)
 static_files_path = Path(__file__).parent / "static"
 app.mount("/", StaticFiles(directory=static_files_path, html=True), name="static")
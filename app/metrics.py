@@ -0,0 +1,204 @@
+# app/metrics.py
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; from a lock hand-off to a slow Sheets call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Metric:
+    """A named metric with optional labels, rendered in the Prometheus text format."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, label_values, value in self.samples():
+            names = self.labelnames + (("le",) if len(label_values) > len(self.labelnames) else ())
+            lines.append(f"{self.name}{suffix}{_format_labels(names, label_values)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Exposed as `<name>_total`."""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name + "_total", documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value that is set directly or read from a callback at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], object]):
+        """`function` returns a number, or a {label values tuple: number} dict for labelled gauges."""
+        def read() -> Dict[LabelValues, float]:
+            value = function()
+            return value if isinstance(value, dict) else {(): value}
+        self._function = read
+
+    def samples(self):
+        if self._function is not None:
+            return [("", key, value) for key, value in self._function().items() if value is not None]
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(("_bucket", key + (_format_value(bound),), cumulative))
+                samples.append(("_sum", key, self._sums[key]))
+                samples.append(("_count", key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class TimedLock:
+    """threading.Lock that records how long each `with` waited to acquire it."""
+
+    def __init__(self, histogram: Histogram, **labels: str):
+        self._lock = threading.Lock()
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._histogram.observe(time.perf_counter() - started, **self._labels)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+
+REGISTRY = Registry()
+
+# --- Cache and write queue (gauges read from the CacheManager at scrape time) ---
+QUEUE_DEPTH = REGISTRY.register(Gauge("checkin_update_queue_depth", "Check-in/check-out writes waiting to be flushed."))
+QUEUE_OLDEST_AGE = REGISTRY.register(Gauge("checkin_update_queue_oldest_age_seconds", "Age of the oldest queued write."))
+IN_FLIGHT_WRITES = REGISTRY.register(Gauge("checkin_in_flight_writes", "Writes in batches currently being sent."))
+CACHE_ATTENDEES = REGISTRY.register(Gauge("checkin_cache_attendees", "Attendees by status.", ["status"]))
+CACHE_AGE = REGISTRY.register(Gauge("checkin_cache_age_seconds", "Seconds since the cache was last refreshed."))
+WRITE_LOCK_WAIT = REGISTRY.register(Histogram(
+    "checkin_cache_write_lock_wait_seconds", "Time spent waiting for the cache write lock.",
+    buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+))
+
+# --- Flushes ---
+FLUSH_BATCH_TASKS = REGISTRY.register(Histogram(
+    "checkin_flush_batch_tasks", "Queued writes per flushed batch.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+))
+FLUSH_BATCH_RANGES = REGISTRY.register(Histogram(
+    "checkin_flush_batch_ranges", "A1 ranges per batch update request.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+))
+FLUSH_DURATION = REGISTRY.register(Histogram("checkin_flush_write_seconds", "Duration of each batch update request.", ["result"]))
+FLUSH_FAILURES = REGISTRY.register(Counter("checkin_flush_failures", "Batches that failed and were re-queued."))
+WRITE_LAG = REGISTRY.register(Histogram("checkin_write_lag_seconds", "Time from the oldest write in a batch being queued to it reaching storage."))
+
+# --- Reloads ---
+RELOAD_DURATION = REGISTRY.register(Histogram("checkin_reload_seconds", "Duration of cache loads.", ["mode"]))
+RELOAD_ROWS = REGISTRY.register(Gauge("checkin_reload_rows", "Rows read by the last cache load.", ["mode"]))
+RELOAD_FAILURES = REGISTRY.register(Counter("checkin_reload_failures", "Cache loads that failed.", ["mode"]))
+
+# --- Sheets API ---
+SHEETS_RATE_LIMITED = REGISTRY.register(Counter("sheets_rate_limited_retries", "Sheets calls retried after a 429.", ["call"]))
+SHEETS_QUOTA_REMAINING = REGISTRY.register(Gauge("sheets_quota_remaining", "Tokens left in the Sheets quota buckets.", ["kind"]))
+
+# --- HTTP ---
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "API request latency.", ["method", "path", "status"],
+))
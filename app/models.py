@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
 class CheckInRequest(BaseModel):
     """Request model for the check-in endpoint."""
@@ -27,8 +28,81 @@ class ConflictResponse(BaseModel):
     detail: str
     name: str
 
+class HealthResponse(BaseModel):
+    """Response model for the readiness endpoint."""
+    ready: bool
+    source: Optional[str] = None
+    cache_age_seconds: Optional[float] = None
+    pending_writes: int
+    quota_remaining: Optional[Dict[str, int]] = None
+
 class StatusResponse(BaseModel):
     """Response model for the status endpoint."""
     total_attendees: int
     checked_in_count: int
     checked_out_count: int
+
+class GroupStatus(BaseModel):
+    """Attendance of one department or table."""
+    name: str
+    total_attendees: int
+    checked_in_count: int
+    checked_out_count: int
+
+class BreakdownResponse(BaseModel):
+    """Response model for the breakdown endpoint."""
+    departments: List[GroupStatus]
+    tables: List[GroupStatus]
+
+class TableGuest(BaseModel):
+    name: str
+    department: str
+
+class TableGuestsResponse(BaseModel):
+    """Response model for a table's guest lists."""
+    table_number: str
+    present: List[TableGuest]
+    absent: List[TableGuest]
+    checked_out: List[TableGuest]
+
+class SearchResult(BaseModel):
+    """One help-desk search match; employeeId is the UniqueID the check-in endpoints take."""
+    employeeId: str
+    employee_number: Optional[str] = None
+    name: str
+    department: str
+    email: str
+    table_number: Optional[str] = None
+    checked_in: bool
+    checked_out: bool
+
+class SearchResponse(BaseModel):
+    """Response model for the search endpoint, best match first."""
+    results: List[SearchResult]
+
+class ScanItem(BaseModel):
+    """One scan queued on a scanner station."""
+    scanId: str = Field(..., min_length=1, max_length=100, description="Client-generated ID; replaying it returns the original result.")
+    employeeId: str = Field(..., description="The unique ID of the attendee.")
+    type: Literal["check-in", "check-out"]
+    scannedAt: Optional[datetime] = Field(None, description="When the device scanned the code; defaults to the time of the sync.")
+
+class ScanSyncRequest(BaseModel):
+    """Request model for the bulk sync endpoint. Scans are applied in order."""
+    stationId: Optional[str] = None
+    scans: List[ScanItem]
+
+class ScanResult(BaseModel):
+    """Outcome of one scan: ok, already_checked_in, already_checked_out, not_checked_in or not_found."""
+    scanId: str
+    employeeId: str
+    type: str
+    status: str
+    replayed: bool = False
+    name: Optional[str] = None
+    department: Optional[str] = None
+    table_number: Optional[str] = None
+
+class ScanSyncResponse(BaseModel):
+    """Response model for the bulk sync endpoint, one result per scan in request order."""
+    results: List[ScanResult]
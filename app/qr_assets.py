@@ -0,0 +1,105 @@
+# app/qr_assets.py
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import qrcode
+
+from .config import settings
+
+# Bumped when the rendering itself changes, so old PNGs aren't served for new parameters
+RENDER_VERSION = 1
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def render_png(data: str, box_size: int = 10, border: int = 4, error_correction: str = "M") -> bytes:
+    """Renders one QR code to PNG bytes. Module-level so the process pool can pickle it."""
+    qr = qrcode.QRCode(box_size=box_size, border=border, error_correction=ERROR_CORRECTION[error_correction])
+    qr.add_data(data)
+    qr.make(fit=True)
+    image_bytes = BytesIO()
+    qr.make_image().save(image_bytes, format="PNG")
+    return image_bytes.getvalue()
+
+
+class QRCache:
+    """
+    Content-addressed directory of rendered QR PNGs. A file's name is the SHA-256 of the
+    encoded UniqueID and the render parameters, so a changed parameter never serves a stale
+    image and a cached one is never rendered twice, across runs and tools.
+    """
+
+    def __init__(self, directory: str, box_size: int = 10, border: int = 4, error_correction: str = "M"):
+        if error_correction not in ERROR_CORRECTION:
+            raise ValueError(f"Unknown QR error correction level: {error_correction}")
+        self.directory = Path(directory)
+        self.params = {"box_size": box_size, "border": border, "error_correction": error_correction}
+
+    @classmethod
+    def from_settings(cls) -> "QRCache":
+        return cls(settings.QR_CACHE_DIR, settings.QR_BOX_SIZE, settings.QR_BORDER, settings.QR_ERROR_CORRECTION)
+
+    def key(self, unique_id: str) -> str:
+        payload = json.dumps({"data": unique_id, "version": RENDER_VERSION, **self.params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, unique_id: str) -> Path:
+        key = self.key(unique_id)
+        return self.directory / key[:2] / f"{key}.png"
+
+    def get(self, unique_id: str) -> bytes:
+        """The cached PNG, rendered inline on a miss."""
+        path = self.path(unique_id)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            png = render_png(unique_id, **self.params)
+            self._store(path, png)
+            return png
+
+    def render_all(self, unique_ids: Iterable[str], workers: Optional[int] = None) -> int:
+        """Renders every UniqueID not cached yet across a process pool. Returns how many were rendered."""
+        missing: Dict[str, Path] = {}
+        for unique_id in unique_ids:
+            path = self.path(unique_id)
+            if unique_id not in missing and not path.exists():
+                missing[unique_id] = path
+        if not missing:
+            return 0
+        workers = workers or os.cpu_count() or 1
+        ids = list(missing)
+        if workers == 1 or len(ids) == 1:
+            pngs = (render_png(unique_id, **self.params) for unique_id in ids)
+            for unique_id, png in zip(ids, pngs):
+                self._store(missing[unique_id], png)
+            return len(ids)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(ids) // (workers * 4))
+            params = self.params
+            pngs = executor.map(
+                render_png, ids, [params["box_size"]] * len(ids), [params["border"]] * len(ids),
+                [params["error_correction"]] * len(ids), chunksize=chunksize,
+            )
+            for unique_id, png in zip(ids, pngs):
+                self._store(missing[unique_id], png)
+        return len(ids)
+
+    @staticmethod
+    def _store(path: Path, png: bytes):
+        # Written to a temp file and renamed, so a reader or a crash never sees a partial PNG
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(png)
+        os.replace(tmp_path, path)
@@ -0,0 +1,170 @@
+# app/quota.py
+import fcntl
+import heapq
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import gspread
+
+from .config import settings
+
+READ = "read"
+WRITE = "write"
+
+
+class Priority(IntEnum):
+    """Who gets the Sheets quota first; lower values win."""
+    CHECK_IN = 0  # flushing check-in/check-out writes
+    RELOAD = 1    # cache reloads
+    SCRIPT = 2    # script bookkeeping (roster import, EmailSentStatus)
+
+
+class TokenBucket:
+    """`per_minute` tokens that refill continuously; 0 means unlimited."""
+
+    def __init__(self, per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._clock = clock
+        self._updated = clock()
+
+    def refill(self):
+        now = self._clock()
+        self.tokens = min(self.per_minute, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, floor: float) -> float:
+        """Seconds until one token can be taken while leaving `floor` tokens behind."""
+        if not self.per_minute:
+            return 0.0
+        self.refill()
+        missing = floor + 1 - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+class QuotaScheduler:
+    """
+    Paces Sheets API calls to stay under the per-minute read and write quotas instead of
+    waiting for 429s. Callers wait in priority order, and lower priorities must leave a
+    reserve of `reserve_fraction` of the bucket per level, so a slow reload or a script
+    never spends the tokens the check-in writer needs.
+
+    With `state_path` the buckets live in a small file guarded by flock, so every worker and
+    script on the host draws from the same budget.
+    """
+
+    def __init__(self, read_per_minute: int, write_per_minute: int, reserve_fraction: float = 0.2,
+                 clock: Callable[[], float] = time.monotonic, state_path: Optional[str] = None):
+        self.reserve_fraction = reserve_fraction
+        self.state_path = Path(state_path) if state_path else None
+        if self.state_path:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            # Bucket times are compared across processes
+            clock = time.time
+        self._clock = clock
+        self._buckets = {READ: TokenBucket(read_per_minute, clock), WRITE: TokenBucket(write_per_minute, clock)}
+        self._waiters: Dict[str, List[Tuple[int, int]]] = {READ: [], WRITE: []}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_settings(cls) -> "QuotaScheduler":
+        return cls(
+            settings.SHEETS_READ_QUOTA_PER_MINUTE,
+            settings.SHEETS_WRITE_QUOTA_PER_MINUTE,
+            settings.SHEETS_QUOTA_RESERVE_FRACTION,
+            state_path=settings.SHEETS_QUOTA_STATE_PATH or None,
+        )
+
+    @contextmanager
+    def _synced(self) -> Iterator[None]:
+        """Loads the buckets from the state file and saves them back, under an exclusive lock."""
+        if self.state_path is None:
+            yield
+            return
+        with open(self.state_path, "a+", encoding="utf-8") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            state_file.seek(0)
+            try:
+                state = json.loads(state_file.read() or "{}")
+            except ValueError:
+                state = {}
+            for kind, bucket in self._buckets.items():
+                if kind in state:
+                    bucket.tokens, bucket._updated = state[kind]
+            yield
+            state_file.seek(0)
+            state_file.truncate()
+            state_file.write(json.dumps({kind: [bucket.tokens, bucket._updated] for kind, bucket in self._buckets.items()}))
+            state_file.flush()
+
+    def _floor(self, kind: str, priority: int) -> float:
+        per_minute = self._buckets[kind].per_minute
+        return min(per_minute * self.reserve_fraction * priority, per_minute - 1)
+
+    def wait_time(self, kind: str, priority: int = Priority.CHECK_IN) -> float:
+        """Seconds until a call of this priority could go out; 0 when it could go now."""
+        with self._cond, self._synced():
+            return self._buckets[kind].wait_time(self._floor(kind, priority))
+
+    def remaining(self) -> Dict[str, int]:
+        """Whole tokens left in each bucket; -1 for an unlimited bucket."""
+        with self._cond, self._synced():
+            budget = {}
+            for kind, bucket in self._buckets.items():
+                bucket.refill()
+                budget[kind] = int(bucket.tokens) if bucket.per_minute else -1
+            return budget
+
+    def acquire(self, kind: str, priority: int = Priority.CHECK_IN, timeout: Optional[float] = None) -> bool:
+        """Blocks until a token is taken; False if `timeout` passed first."""
+        bucket = self._buckets[kind]
+        if not bucket.per_minute:
+            return True
+        deadline = None if timeout is None else self._clock() + timeout
+        waiter = (int(priority), next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters[kind], waiter)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[kind][0] == waiter:
+                        with self._synced():
+                            wait = bucket.wait_time(self._floor(kind, priority))
+                            if wait <= 0:
+                                bucket.tokens -= 1
+                                return True
+                    if deadline is not None:
+                        left = deadline - self._clock()
+                        if left <= 0:
+                            return False
+                        wait = left if wait is None else min(wait, left)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters[kind].remove(waiter)
+                heapq.heapify(self._waiters[kind])
+                self._cond.notify_all()
+
+    def exhaust(self, kind: str):
+        """Empties a bucket after a 429 so every caller backs off, not just the one that hit it."""
+        with self._cond, self._synced():
+            bucket = self._buckets[kind]
+            bucket.refill()
+            bucket.tokens = min(bucket.tokens, 0.0)
+
+    @contextmanager
+    def request(self, kind: str, priority: int = Priority.CHECK_IN) -> Iterator[None]:
+        self.acquire(kind, priority)
+        try:
+            yield
+        except gspread.exceptions.APIError as e:
+            if e.response.status_code == 429:
+                self.exhaust(kind)
+            raise
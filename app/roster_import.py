@@ -0,0 +1,204 @@
+# app/roster_import.py
+import csv
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import gspread
+
+from .config import settings
+from .quota import Priority
+from .storage import StorageBackend
+
+# Columns the system adds after the CSV's own columns, with their initial values
+SYSTEM_COLUMNS = [
+    (settings.COL_UNIQUE_ID, None),
+    (settings.COL_EMAIL_SENT_STATUS, "FALSE"),
+    (settings.COL_CHECK_IN_STATUS, "FALSE"),
+    (settings.COL_CHECK_IN_TIME, ""),
+    (settings.COL_CHECK_OUT_STATUS, "FALSE"),
+    (settings.COL_CHECK_OUT_TIME, ""),
+]
+
+
+def id_namespace(secret: str) -> uuid.UUID:
+    """Namespace derived from a secret seed. UniqueIDs are QR tokens, so the seed must not be guessable."""
+    return uuid.uuid5(uuid.NAMESPACE_URL, f"checkin:{secret}")
+
+
+def keyed_rows(header: List[str], rows: Iterable[List[str]], id_column: str) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Pairs each non-blank row, padded to the header, with its guest key: the ID column (e.g.
+    EmployeeID, else Email, else the whole row). Duplicate keys get a suffix in file order.
+    """
+    key_col = next((header.index(column) for column in (id_column, settings.COL_EMAIL) if column in header), None)
+    seen: Dict[str, int] = {}
+    for cells in rows:
+        if not any(cells):
+            continue
+        cells = (list(cells) + [""] * len(header))[:len(header)]
+        key = cells[key_col].strip().lower() if key_col is not None and cells[key_col].strip() else "\x1f".join(cells)
+        yield _numbered(key, seen), cells
+
+
+def _numbered(key: str, seen: Dict[str, int]) -> str:
+    seen[key] = seen.get(key, 0) + 1
+    return key if seen[key] == 1 else f"{key}#{seen[key]}"
+
+
+class RosterCSV:
+    """
+    A roster CSV read as a stream. Each guest's UniqueID is a uuid5 of their key in a secret
+    namespace: IMPORT_ID_NAMESPACE when set, else a random one per import that the checkpoint
+    keeps, so a resumed import gives every guest the same UniqueID. Guests already in the
+    roster keep their UniqueID (`existing_ids`), so re-importing doesn't invalidate the QR
+    codes already sent. A UniqueID column in the CSV itself is kept as is.
+    """
+
+    def __init__(self, path: str, id_column: str = "EmployeeID", namespace: Optional[uuid.UUID] = None):
+        self.path = Path(path)
+        self.id_column = id_column
+        self.namespace = namespace or uuid.uuid4()
+        self.existing_ids: Dict[str, str] = {}
+
+    @classmethod
+    def from_settings(cls, path: Optional[str] = None) -> "RosterCSV":
+        namespace = id_namespace(settings.IMPORT_ID_NAMESPACE) if settings.IMPORT_ID_NAMESPACE else None
+        return cls(path or settings.IMPORT_CSV_PATH, settings.IMPORT_ID_COLUMN, namespace)
+
+    def fingerprint(self) -> str:
+        """SHA-256 of the file, read in blocks."""
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as csv_file:
+            for block in iter(lambda: csv_file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def count_rows(self) -> int:
+        """Guest rows, not counting the header or blank lines."""
+        with open(self.path, newline="", encoding="utf-8-sig") as csv_file:
+            return sum(1 for row in csv.reader(csv_file) if any(row)) - 1
+
+    def headers(self) -> List[str]:
+        with open(self.path, newline="", encoding="utf-8-sig") as csv_file:
+            original = next(csv.reader(csv_file), [])
+        return original + [column for column, _ in SYSTEM_COLUMNS if column not in original]
+
+    def rows(self) -> Iterator[List[str]]:
+        """Yields the sheet rows, header first, one at a time."""
+        with open(self.path, newline="", encoding="utf-8-sig") as csv_file:
+            reader = csv.reader(csv_file)
+            original = next(reader, None)
+            if original is None:
+                return
+            added = [(column, default) for column, default in SYSTEM_COLUMNS if column not in original]
+            yield original + [column for column, _ in added]
+
+            for key, cells in keyed_rows(original, reader, self.id_column):
+                unique_id = self.existing_ids.get(key) or str(uuid.uuid5(self.namespace, key))
+                yield cells + [unique_id if default is None else default for _, default in added]
+
+
+def existing_unique_ids(backend: StorageBackend, id_column: str, chunk_rows: int = 1000) -> Dict[str, str]:
+    """
+    The UniqueID of every guest already in the backend, by guest key. Only the key and UniqueID
+    columns are read, `chunk_rows` rows per request paced by the quota. Guests without an ID
+    column value are keyed by their whole row, which isn't read, so they get new UniqueIDs.
+    """
+    header_rows = backend.batch_get(["1:1"], Priority.SCRIPT)[0]
+    header = list(header_rows[0]) if header_rows else []
+    key_column = next((column for column in (id_column, settings.COL_EMAIL) if column in header), None)
+    if key_column is None or settings.COL_UNIQUE_ID not in header:
+        return {}
+    key_letter, uid_letter = (gspread.utils.rowcol_to_a1(1, header.index(column) + 1)[:-1] for column in (key_column, settings.COL_UNIQUE_ID))
+
+    unique_ids: Dict[str, str] = {}
+    seen: Dict[str, int] = {}
+    start = 2
+    while True:
+        end = start + chunk_rows - 1
+        keys, uids = backend.batch_get([f"{key_letter}{start}:{key_letter}{end}", f"{uid_letter}{start}:{uid_letter}{end}"], Priority.SCRIPT)
+        if not keys and not uids:
+            return unique_ids
+        for i in range(max(len(keys), len(uids))):
+            key = str(keys[i][0]).strip().lower() if i < len(keys) and keys[i] else ""
+            unique_id = str(uids[i][0]) if i < len(uids) and uids[i] else ""
+            if key:
+                key = _numbered(key, seen)
+                if unique_id:
+                    unique_ids[key] = unique_id
+        start = end + 1
+
+
+def _load_checkpoint(path: Path) -> Dict[str, object]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_checkpoint(path: Path, state: Dict[str, object]):
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def import_roster_csv(backend: StorageBackend, roster: RosterCSV, checkpoint_path: str, chunk_rows: int = 1000,
+                      reuse_ids: bool = True) -> int:
+    """
+    Streams the roster into the backend. The UniqueIDs already in the backend are read first
+    (unless `reuse_ids` is off), then the sheet is cleared and sized once and filled in
+    `chunk_rows`-row range writes paced by the backend's quota. The rows written so far are
+    checkpointed after every chunk, with the ID namespace and the reused IDs; an interrupted
+    import of the same file resumes after them. Returns the number of guest rows in the roster.
+    """
+    checkpoint = Path(checkpoint_path)
+    checkpoint.parent.mkdir(parents=True, exist_ok=True)
+    # Written once per import, apart from the checkpoint that is rewritten after every chunk
+    ids_path = checkpoint.with_suffix(checkpoint.suffix + ".ids")
+    fingerprint = roster.fingerprint()
+    state = _load_checkpoint(checkpoint)
+    guest_count = roster.count_rows()
+
+    if state.get("fingerprint") == fingerprint and state.get("backend") == backend.name and "namespace" in state:
+        written = int(state["rows_written"])
+        roster.namespace = uuid.UUID(state["namespace"])
+        roster.existing_ids = _load_checkpoint(ids_path)
+        print(f"從檢查點繼續匯入：已寫入 {written} / {guest_count + 1} 列。")
+    else:
+        written = 0
+        roster.existing_ids = existing_unique_ids(backend, roster.id_column, chunk_rows) if reuse_ids else {}
+        if roster.existing_ids:
+            print(f"沿用名單中 {len(roster.existing_ids)} 位賓客既有的 UniqueID。")
+        _save_checkpoint(ids_path, roster.existing_ids)
+        backend.prepare_import(guest_count + 1, len(roster.headers()))
+        state = {"fingerprint": fingerprint, "backend": backend.name, "rows_written": 0, "namespace": str(roster.namespace)}
+        _save_checkpoint(checkpoint, state)
+
+    chunk: List[List[str]] = []
+    chunk_start = written
+
+    def write_chunk():
+        nonlocal written
+        backend.write_ranges([{"range": f"A{chunk_start + 1}", "values": chunk}], Priority.SCRIPT)
+        written = chunk_start + len(chunk)
+        _save_checkpoint(checkpoint, {**state, "rows_written": written})
+        print(f"  -> 已寫入 {written} / {guest_count + 1} 列。")
+
+    for i, row in enumerate(roster.rows()):
+        if i < written:
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            write_chunk()
+            chunk, chunk_start = [], written
+    if chunk:
+        write_chunk()
+
+    backend.set_headers(roster.headers())
+    checkpoint.unlink()
+    ids_path.unlink(missing_ok=True)
+    return guest_count
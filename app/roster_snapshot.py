@@ -0,0 +1,42 @@
+# app/roster_snapshot.py
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+SNAPSHOT_VERSION = 2
+
+
+class RosterSnapshot(NamedTuple):
+    saved_at: float
+    headers: List[str]
+    rows: List[List[str]] # Values in header order
+    row_indexes: List[int] # Sheet row number of each entry in rows
+    event_id: int # Last shared-state event applied to the rows; 0 without shared state
+
+
+def save_snapshot(path: str, headers: List[str], rows: List[List[str]], row_indexes: List[int], event_id: int = 0):
+    """Writes the roster to a compact pickle, replacing the previous snapshot atomically."""
+    snapshot_path = Path(path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path.with_suffix(f"{snapshot_path.suffix}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as snapshot_file:
+        pickle.dump((SNAPSHOT_VERSION, time.time(), headers, rows, row_indexes, event_id), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+
+def load_snapshot(path: str) -> Optional[RosterSnapshot]:
+    """Returns the saved roster, or None if there is no usable snapshot."""
+    snapshot_path = Path(path)
+    if not snapshot_path.exists():
+        return None
+    try:
+        with open(snapshot_path, "rb") as snapshot_file:
+            version, saved_at, headers, rows, row_indexes, event_id = pickle.load(snapshot_file)
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable roster snapshot {snapshot_path}: {e}")
+        return None
+    if version != SNAPSHOT_VERSION:
+        return None
+    return RosterSnapshot(saved_at, headers, rows, row_indexes, event_id)
@@ -0,0 +1,95 @@
+# app/search_index.py
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from .attendee_store import AttendeeRecord
+from .config import settings
+
+# Bounds on the work one query may do, so a very common prefix or bigram can't stall the event loop
+_MAX_PREFIX_SCAN = 1000
+_MAX_SUBSTRING_CANDIDATES = 2000
+
+
+def normalize(text: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a name, ID or email."""
+    text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text)
+    return "".join(text.casefold().split())
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SearchIndex:
+    """
+    In-memory lookup of guests by name, EmployeeID and email for the help desk. Exact and prefix
+    matches are a bisect over one sorted key list; substrings of names (CJK names have no word
+    boundaries) go through character-bigram postings. Built from one cache load; the index
+    holds UniqueIDs only, so the records themselves are always read from the live cache.
+    """
+
+    def __init__(self, records: Iterable[AttendeeRecord]):
+        self._names: Dict[str, str] = {}
+        self._bigrams: Dict[str, List[str]] = {}
+        keyed: List[Tuple[str, str]] = []
+        columns = (settings.COL_UNIQUE_ID, settings.COL_NAME, settings.COL_EMPLOYEE_ID, settings.COL_EMAIL)
+        positions = None
+        for record in records:
+            # Static columns straight from the record's value tuple, looked up once per schema
+            if positions is None or positions[0] is not record.schema:
+                static_positions = record.schema.static_positions
+                positions = (record.schema, [static_positions.get(column) for column in columns])
+            values = record.values
+            unique_id, name, employee_id, email = ("" if i is None else values[i] for i in positions[1])
+            if not unique_id:
+                continue
+            name = normalize(name)
+            keys = {key for key in (name, normalize(employee_id), normalize(email)) if key}
+            for key in keys:
+                keyed.append((key, unique_id))
+            if name:
+                self._names[unique_id] = name
+                for bigram in _bigrams(name):
+                    self._bigrams.setdefault(bigram, []).append(unique_id)
+        keyed.sort()
+        self._keys = [key for key, _ in keyed]
+        self._key_ids = [unique_id for _, unique_id in keyed]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """
+        UniqueIDs matching the query, best first: exact name/EmployeeID/email matches, then
+        prefix matches (shortest key first), then names containing the query.
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+        results: Dict[str, None] = {}
+
+        # Exact matches sort right before the longer keys they are a prefix of
+        start = bisect_left(self._keys, query)
+        for i in range(start, min(start + _MAX_PREFIX_SCAN, len(self._keys))):
+            if len(results) >= limit or not self._keys[i].startswith(query):
+                break
+            results.setdefault(self._key_ids[i])
+        if len(results) < limit and len(query) >= 2:
+            results.update(dict.fromkeys(self._substring_matches(query, limit - len(results), results)))
+        return list(results)[:limit]
+
+    def _substring_matches(self, query: str, limit: int, exclude: Dict[str, None]) -> List[str]:
+        postings = [self._bigrams.get(bigram, ()) for bigram in _bigrams(query)]
+        if not postings or not all(postings):
+            return []
+        # Candidates from the rarest bigram, confirmed against the whole name
+        candidates = min(postings, key=len)
+        matches = [
+            unique_id for unique_id in dict.fromkeys(candidates[:_MAX_SUBSTRING_CANDIDATES])
+            if unique_id not in exclude and query in self._names[unique_id]
+        ]
+        matches.sort(key=lambda unique_id: (self._names[unique_id].index(query), len(self._names[unique_id]), self._names[unique_id]))
+        return matches[:limit]
@@ -0,0 +1,130 @@
+# app/shared_state.py
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .write_planner import UpdateTask
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id TEXT NOT NULL,
+    update_type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    flushed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_task ON events (employee_id, update_type, timestamp);
+CREATE INDEX IF NOT EXISTS events_unflushed ON events (flushed, id);
+CREATE TABLE IF NOT EXISTS scan_results (
+    scan_id TEXT PRIMARY KEY,
+    result TEXT NOT NULL
+);
+"""
+
+
+class SharedState:
+    """
+    Check-in state shared by every uvicorn worker on one host.
+
+    An SQLite database in WAL mode holds the log of check-in/check-out events; each worker
+    claims updates in an IMMEDIATE transaction, so two workers can't check the same guest in.
+    An exclusive lock on a side file elects the one worker that writes to Google Sheets and
+    reloads from it.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.leader_lock_path = self.path.with_suffix(self.path.suffix + ".leader")
+        self._local = threading.local()
+        self._leader_file: Optional[TextIO] = None
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Per-thread connection in autocommit mode; transactions are explicit."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Takes the database write lock up front so read-check-append is atomic across workers."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def append(self, conn: sqlite3.Connection, task: UpdateTask) -> int:
+        cursor = conn.execute("INSERT INTO events (employee_id, update_type, timestamp) VALUES (?, ?, ?)", task)
+        return cursor.lastrowid
+
+    def events_since(self, last_id: int, conn: Optional[sqlite3.Connection] = None) -> List[Tuple[int, UpdateTask]]:
+        rows = (conn or self.connection()).execute(
+            "SELECT id, employee_id, update_type, timestamp FROM events WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        return [(row[0], (row[1], row[2], row[3])) for row in rows]
+
+    def scan_result(self, conn: sqlite3.Connection, scan_id: str) -> Optional[Dict[str, Any]]:
+        """The result recorded for a bulk-sync scan ID by any worker."""
+        row = conn.execute("SELECT result FROM scan_results WHERE scan_id = ?", (scan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_scan_result(self, conn: sqlite3.Connection, scan_id: str, result: Dict[str, Any]):
+        conn.execute("INSERT OR REPLACE INTO scan_results (scan_id, result) VALUES (?, ?)", (scan_id, json.dumps(result, ensure_ascii=False)))
+
+    def last_event_id(self) -> int:
+        return self.connection().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def unflushed(self) -> List[Tuple[int, UpdateTask]]:
+        """Events not yet confirmed in the sheet, oldest first; read through the events_unflushed index."""
+        rows = self.connection().execute(
+            "SELECT id, employee_id, update_type, timestamp FROM events WHERE flushed = 0 ORDER BY id"
+        ).fetchall()
+        return [(row[0], (row[1], row[2], row[3])) for row in rows]
+
+    def confirm(self, tasks: Iterable[UpdateTask]):
+        """Marks tasks as written to the sheet so a new leader won't write them again."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE events SET flushed = 1 WHERE employee_id = ? AND update_type = ? AND timestamp = ?",
+                list(tasks),
+            )
+
+    def try_become_leader(self) -> bool:
+        if self._leader_file is not None:
+            return True
+        leader_file = open(self.leader_lock_path, "a+")
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        leader_file.seek(0)
+        leader_file.truncate()
+        leader_file.write(str(os.getpid()))
+        leader_file.flush()
+        self._leader_file = leader_file
+        return True
+
+    def close(self):
+        if self._leader_file is not None:
+            fcntl.flock(self._leader_file, fcntl.LOCK_UN)
+            self._leader_file.close()
+            self._leader_file = None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,204 @@
+# app/sheets_emulator.py
+import csv
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+import gspread
+import requests
+
+from .config import settings
+from .storage import Grid, pad_grid, read_range, write_range
+
+
+def quota_error(message: str = "Quota exceeded for quota metric 'Write requests' (emulated).") -> gspread.exceptions.APIError:
+    """Builds the APIError gspread raises for an HTTP 429."""
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {"code": 429, "message": message, "status": "RESOURCE_EXHAUSTED"}}).encode()
+    return gspread.exceptions.APIError(response)
+
+
+class _Quota:
+    """Sliding one-minute window of requests, like the Sheets per-minute quotas."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.calls: Deque[float] = deque()
+
+    def take(self, kind: str):
+        if not self.per_minute:
+            return
+        now = time.monotonic()
+        while self.calls and now - self.calls[0] >= 60:
+            self.calls.popleft()
+        if len(self.calls) >= self.per_minute:
+            raise quota_error(f"Quota exceeded for quota metric '{kind} requests' (emulated).")
+        self.calls.append(now)
+
+
+class EmulatedWorksheet:
+    """
+    In-process stand-in for gspread.Worksheet, for offline tests and load runs.
+
+    Covers the calls this project makes, adds `latency` seconds (plus up to `jitter`) to every
+    request and raises the same 429 APIError as Sheets once the per-minute read or write
+    quota is used up, or at random with `error_rate`.
+    """
+
+    def __init__(
+        self,
+        values: Optional[Grid] = None,
+        title: str = settings.WORKSHEET_NAME,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        read_quota_per_minute: int = 0,
+        write_quota_per_minute: int = 0,
+        error_rate: float = 0.0,
+    ):
+        self.title = title
+        self.id = 0
+        self.url = f"emulator://{title}"
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._grid: Grid = [[str(value) for value in row] for row in (values or [])]
+        self._lock = threading.Lock()
+        self._read_quota = _Quota(read_quota_per_minute)
+        self._write_quota = _Quota(write_quota_per_minute)
+        self.request_counts = {"read": 0, "write": 0}
+
+    @classmethod
+    def from_settings(cls) -> "EmulatedWorksheet":
+        values: Grid = []
+        if settings.EMULATOR_SEED_CSV:
+            with open(settings.EMULATOR_SEED_CSV, encoding="utf-8", newline="") as seed_file:
+                values = [row for row in csv.reader(seed_file)]
+        return cls(
+            values,
+            latency=settings.EMULATOR_LATENCY_SECONDS,
+            read_quota_per_minute=settings.EMULATOR_READ_QUOTA_PER_MINUTE,
+            write_quota_per_minute=settings.EMULATOR_WRITE_QUOTA_PER_MINUTE,
+            error_rate=settings.EMULATOR_ERROR_RATE,
+        )
+
+    def _request(self, kind: str):
+        self.request_counts[kind] += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            (self._read_quota if kind == "read" else self._write_quota).take(kind.capitalize())
+        if self.error_rate and random.random() < self.error_rate:
+            raise quota_error()
+
+    @property
+    def row_count(self) -> int:
+        return len(self._grid)
+
+    @property
+    def col_count(self) -> int:
+        return max((len(row) for row in self._grid), default=0)
+
+    # --- Reads ---
+    def get_all_values(self, **kwargs) -> Grid:
+        self._request("read")
+        with self._lock:
+            return pad_grid([list(row) for row in self._grid])
+
+    def get_all_records(self, **kwargs) -> List[Dict[str, Any]]:
+        values = self.get_all_values()
+        if not values:
+            return []
+        return [dict(zip(values[0], row)) for row in values[1:]]
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        self._request("read")
+        with self._lock:
+            return read_range(self._grid, f"{row}:{row}")[0] if row <= len(self._grid) else []
+
+    def col_values(self, col: int, **kwargs) -> List[str]:
+        self._request("read")
+        with self._lock:
+            return [row[col - 1] if len(row) >= col else "" for row in self._grid]
+
+    def batch_get(self, ranges: Iterable[str], **kwargs) -> List[Grid]:
+        self._request("read")
+        with self._lock:
+            return [read_range(self._grid, range_name) for range_name in ranges]
+
+    def find(self, query: str, in_row: Optional[int] = None, in_column: Optional[int] = None, **kwargs) -> Optional[gspread.Cell]:
+        self._request("read")
+        with self._lock:
+            for row_number, row in enumerate(self._grid, start=1):
+                if in_row and row_number != in_row:
+                    continue
+                for col_number, value in enumerate(row, start=1):
+                    if in_column and col_number != in_column:
+                        continue
+                    if value == str(query):
+                        return gspread.Cell(row_number, col_number, value)
+        return None
+
+    # --- Writes ---
+    def batch_update(self, data: Iterable[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        self._request("write")
+        data = list(data)
+        with self._lock:
+            for item in data:
+                write_range(self._grid, item["range"], item["values"])
+        return {"totalUpdatedRanges": len(data)}
+
+    def update(self, values: Any = None, range_name: Any = None, **kwargs) -> Dict[str, Any]:
+        # Accept both update(values, range_name) and the older update(range_name, values)
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        return self.batch_update([{"range": range_name or "A1", "values": values}])
+
+    def update_cells(self, cells: List[gspread.Cell], **kwargs) -> Dict[str, Any]:
+        return self.batch_update([
+            {"range": gspread.utils.rowcol_to_a1(cell.row, cell.col), "values": [[cell.value]]} for cell in cells
+        ])
+
+    def update_cell(self, row: int, col: int, value: Any) -> Dict[str, Any]:
+        return self.batch_update([{"range": gspread.utils.rowcol_to_a1(row, col), "values": [[value]]}])
+
+    def clear(self) -> None:
+        self._request("write")
+        with self._lock:
+            self._grid = []
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None) -> None:
+        self._request("write")
+        with self._lock:
+            if rows is not None:
+                del self._grid[rows:]
+
+    def add_rows(self, rows: int) -> None:
+        self._request("write")
+
+
+class EmulatedSpreadsheet:
+    """Stand-in for gspread.Spreadsheet holding EmulatedWorksheets."""
+
+    def __init__(self, title: str = settings.SPREADSHEET_NAME, **worksheet_options):
+        self.title = title
+        self.url = f"emulator://{title}"
+        self._worksheet_options = worksheet_options
+        self._worksheets: Dict[str, EmulatedWorksheet] = {}
+
+    def worksheet(self, title: str) -> EmulatedWorksheet:
+        if title not in self._worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, rows: Any = None, cols: Any = None, **kwargs) -> EmulatedWorksheet:
+        worksheet = EmulatedWorksheet(title=title, **self._worksheet_options)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def worksheets(self) -> List[EmulatedWorksheet]:
+        return list(self._worksheets.values())
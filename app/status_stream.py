@@ -0,0 +1,87 @@
+# app/status_stream.py
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+
+
+class StatusBroadcaster:
+    """
+    One change notification fanned out to every dashboard stream. CacheManager calls notify()
+    from whichever thread changed the counts; it only bumps a version and, at most once per
+    event-loop turn, wakes the streams. Every stream then reads the same O(1) counters, so the
+    cost of a check-in doesn't grow with the number of dashboards.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._wake_scheduled = False
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Streams run on `loop`; called from the first subscriber."""
+        with self._lock:
+            if self._loop is not loop:
+                self._loop = loop
+                self._changed = asyncio.Event()
+
+    def notify(self):
+        with self._lock:
+            self.version += 1
+            if self._loop is None or self._wake_scheduled:
+                return
+            self._wake_scheduled = True
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # The loop has been closed (shutdown)
+            with self._lock:
+                self._wake_scheduled = False
+
+    def _wake(self):
+        with self._lock:
+            self._wake_scheduled = False
+            changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        """Waits until the version moves past `version`. Returns False on timeout."""
+        self.bind(asyncio.get_running_loop())
+        deadline = time.monotonic() + timeout
+        while self.version == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def stream(self, snapshot: Callable[[], Dict[str, int]], min_interval: float, keepalive: float) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for one subscriber: the current counts right away, then the latest
+        counts after each change, no more often than every `min_interval` seconds. Bursts of
+        check-ins in between collapse into one event. A comment line goes out every `keepalive`
+        seconds so proxies keep the connection open.
+        """
+        self.bind(asyncio.get_running_loop())
+        last_sent = None
+        while True:
+            version = self.version
+            counts = snapshot()
+            if counts != last_sent:
+                yield format_event("status", counts, version)
+                last_sent = counts
+                await asyncio.sleep(min_interval)
+                continue
+            if not await self.wait_for_change(version, keepalive):
+                yield ": keep-alive\n\n"
+
+
+def format_event(event: str, data: Dict[str, int], event_id: int) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
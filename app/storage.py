@@ -0,0 +1,281 @@
+# app/storage.py
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gspread
+
+from .config import settings
+from .gsheet_client import GSheetClient, retry_with_backoff
+from .quota import READ, WRITE, Priority, QuotaScheduler
+
+Grid = List[List[str]]
+
+
+def a1_bounds(range_name: str) -> Tuple[int, Optional[int], int, Optional[int]]:
+    """0-based (start_row, end_row, start_col, end_col) of an A1 range; ends are exclusive, None = unbounded."""
+    grid_range = gspread.utils.a1_range_to_grid_range(range_name)
+    return (
+        grid_range.get("startRowIndex", 0), grid_range.get("endRowIndex"),
+        grid_range.get("startColumnIndex", 0), grid_range.get("endColumnIndex"),
+    )
+
+
+def read_range(grid: Grid, range_name: str) -> Grid:
+    """Values of an A1 range the way the Sheets API returns them: trailing empty rows and cells trimmed."""
+    start_row, end_row, start_col, end_col = a1_bounds(range_name)
+    values = []
+    for row in grid[start_row:end_row]:
+        cells = list(row[start_col:end_col])
+        while cells and cells[-1] == "":
+            cells.pop()
+        values.append(cells)
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def write_range(grid: Grid, range_name: str, values: Grid):
+    """Writes values into the grid at the range's top-left cell, growing it as needed."""
+    start_row, _, start_col, _ = a1_bounds(range_name)
+    for i, row_values in enumerate(values):
+        row_number = start_row + i
+        while len(grid) <= row_number:
+            grid.append([])
+        row = grid[row_number]
+        if len(row) < start_col + len(row_values):
+            row.extend([""] * (start_col + len(row_values) - len(row)))
+        for j, value in enumerate(row_values):
+            row[start_col + j] = "" if value is None else str(value)
+
+
+def pad_grid(grid: Grid) -> Grid:
+    """Pads every row to the same width, like Worksheet.get_all_values()."""
+    width = max((len(row) for row in grid), default=0)
+    return [row + [""] * (width - len(row)) for row in grid]
+
+
+class StorageBackend:
+    """
+    Where the roster lives. CacheManager and the scripts only talk to this interface:
+    whole-roster reads, ranged reads for delta reloads, batched range writes and roster import.
+    Ranges are A1 strings relative to the roster worksheet. `priority` ranks the call for
+    backends with an API quota (see quota.Priority); the others ignore it.
+    """
+    name = "base"
+    # The read/write budget calls are paced against, if the backend has one
+    quota: Optional[QuotaScheduler] = None
+
+    def __init__(self):
+        self._headers: Optional[List[str]] = None
+
+    def get_all_values(self, priority: int = Priority.RELOAD) -> Grid:
+        raise NotImplementedError
+
+    def batch_get(self, ranges: List[str], priority: int = Priority.RELOAD) -> List[Grid]:
+        raise NotImplementedError
+
+    def write_ranges(self, data: List[Dict[str, Any]], priority: int = Priority.CHECK_IN):
+        """Writes [{"range": "H2:I3", "values": [[...], ...]}, ...] in one batch."""
+        raise NotImplementedError
+
+    def import_roster(self, rows: Grid):
+        """Replaces the whole roster with rows, header row first."""
+        raise NotImplementedError
+
+    def prepare_import(self, row_count: int, col_count: int):
+        """Empties the roster and sizes it for a chunked import of row_count rows (header included)."""
+        raise NotImplementedError
+
+    def handle_error(self, error: Exception):
+        """Called when a read or write failed, so the backend can reset its connection."""
+
+    def get_headers(self, refresh: bool = False) -> List[str]:
+        if self._headers is None or refresh:
+            header_rows = self.batch_get(["1:1"])[0]
+            self._headers = list(header_rows[0]) if header_rows else []
+        return self._headers
+
+    def set_headers(self, headers: List[str]):
+        self._headers = list(headers)
+
+    def get_header_map(self) -> Dict[str, int]:
+        """Maps header names to 1-based column numbers."""
+        return {header: i + 1 for i, header in enumerate(self.get_headers())}
+
+    def quota_wait(self, kind: str, priority: int) -> float:
+        """Seconds until a call of this kind and priority fits the quota; 0 without one."""
+        return self.quota.wait_time(kind, priority) if self.quota else 0.0
+
+    def get_all_records(self, priority: int = Priority.RELOAD) -> List[Dict[str, str]]:
+        values = self.get_all_values(priority)
+        if not values:
+            return []
+        self.set_headers(values[0])
+        return [dict(zip(values[0], row)) for row in values[1:]]
+
+
+class SheetsBackend(StorageBackend):
+    """
+    Google Sheets through gspread, or anything that mimics its Worksheet API (see sheets_emulator).
+    Every request takes a token from `quota`, the process-wide GSheetClient.quota by default.
+    """
+    name = "sheets"
+
+    def __init__(self, get_worksheet: Optional[Callable[[], gspread.Worksheet]] = None,
+                 quota: Optional[QuotaScheduler] = None):
+        super().__init__()
+        self._get_worksheet = get_worksheet
+        self.quota = quota or GSheetClient.quota
+
+    def _request(self, kind: str, priority: int):
+        return self.quota.request(kind, priority)
+
+    @property
+    def worksheet(self) -> gspread.Worksheet:
+        if self._get_worksheet:
+            return self._get_worksheet()
+        return GSheetClient.get_shared().get_worksheet(settings.WORKSHEET_NAME)
+
+    @retry_with_backoff()
+    def get_all_values(self, priority: int = Priority.RELOAD) -> Grid:
+        worksheet = self.worksheet
+        with self._request(READ, priority):
+            values = worksheet.get_all_values()
+        if values:
+            self.set_headers(values[0])
+        return values
+
+    @retry_with_backoff()
+    def batch_get(self, ranges: List[str], priority: int = Priority.RELOAD) -> List[Grid]:
+        worksheet = self.worksheet
+        with self._request(READ, priority):
+            return [list(value_range) for value_range in worksheet.batch_get(ranges)]
+
+    @retry_with_backoff()
+    def write_ranges(self, data: List[Dict[str, Any]], priority: int = Priority.CHECK_IN):
+        worksheet = self.worksheet
+        with self._request(WRITE, priority):
+            worksheet.batch_update(data, value_input_option='USER_ENTERED')
+
+    @retry_with_backoff()
+    def import_roster(self, rows: Grid):
+        worksheet = self.worksheet
+        with self._request(WRITE, Priority.SCRIPT):
+            worksheet.clear()
+        with self._request(WRITE, Priority.SCRIPT):
+            worksheet.update(rows, 'A1', value_input_option='USER_ENTERED')
+        if rows:
+            self.set_headers(rows[0])
+
+    @retry_with_backoff()
+    def prepare_import(self, row_count: int, col_count: int):
+        # One resize up front instead of the sheet growing with every chunk
+        worksheet = self.worksheet
+        with self._request(WRITE, Priority.SCRIPT):
+            worksheet.clear()
+        with self._request(WRITE, Priority.SCRIPT):
+            worksheet.resize(rows=max(row_count, 1), cols=max(col_count, 1))
+        self._headers = None
+
+    def handle_error(self, error: Exception):
+        GSheetClient.handle_error(error)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The roster in a local SQLite file, one JSON row per sheet row. For events too large for
+    the Sheets write quota; there is no per-minute limit, so WRITE_MIN_INTERVAL_SECONDS can be 0.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS roster_rows (row_number INTEGER PRIMARY KEY, cells TEXT NOT NULL)")
+
+    def _read_grid(self, start_row: int = 0, end_row: Optional[int] = None) -> Grid:
+        query = "SELECT row_number, cells FROM roster_rows WHERE row_number >= ?"
+        params: List[int] = [start_row + 1]
+        if end_row is not None:
+            query += " AND row_number <= ?"
+            params.append(end_row)
+        grid: Grid = [[] for _ in range(start_row)]
+        for row_number, cells in self._conn.execute(query + " ORDER BY row_number", params):
+            while len(grid) < row_number - 1:
+                grid.append([])
+            grid.append(json.loads(cells))
+        return grid
+
+    def get_all_values(self, priority: int = Priority.RELOAD) -> Grid:
+        with self._lock:
+            values = pad_grid(self._read_grid())
+        if values:
+            self.set_headers(values[0])
+        return values
+
+    def batch_get(self, ranges: List[str], priority: int = Priority.RELOAD) -> List[Grid]:
+        results = []
+        with self._lock:
+            for range_name in ranges:
+                start_row, end_row, _, _ = a1_bounds(range_name)
+                results.append(read_range(self._read_grid(start_row, end_row), range_name))
+        return results
+
+    def write_ranges(self, data: List[Dict[str, Any]], priority: int = Priority.CHECK_IN):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for item in data:
+                    start_row, _, _, _ = a1_bounds(item["range"])
+                    end_row = start_row + len(item["values"])
+                    grid = self._read_grid(start_row, end_row)
+                    write_range(grid, item["range"], item["values"])
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO roster_rows (row_number, cells) VALUES (?, ?)",
+                        [(row_number + 1, json.dumps(grid[row_number], ensure_ascii=False)) for row_number in range(start_row, end_row)],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def import_roster(self, rows: Grid):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM roster_rows")
+                self._conn.executemany(
+                    "INSERT INTO roster_rows (row_number, cells) VALUES (?, ?)",
+                    [(i + 1, json.dumps([str(value) for value in row], ensure_ascii=False)) for i, row in enumerate(rows)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows:
+            self.set_headers(rows[0])
+
+    def prepare_import(self, row_count: int, col_count: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM roster_rows")
+        self._headers = None
+
+
+def create_backend(name: Optional[str] = None) -> StorageBackend:
+    """Builds the backend selected by STORAGE_BACKEND."""
+    name = name or settings.STORAGE_BACKEND
+    if name == "sheets":
+        return SheetsBackend()
+    if name == "sqlite":
+        return SQLiteBackend(settings.SQLITE_DATABASE_PATH)
+    if name == "emulator":
+        from .sheets_emulator import EmulatedWorksheet
+        worksheet = EmulatedWorksheet.from_settings()
+        return SheetsBackend(lambda: worksheet)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}'. Use 'sheets', 'sqlite' or 'emulator'.")
@@ -0,0 +1,110 @@
+# app/write_journal.py
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from .write_planner import UpdateTask
+
+
+class WriteJournal:
+    """
+    Append-only local journal of UpdateTasks that the Sheets writer hasn't confirmed yet.
+
+    Appends are buffered in memory and a background thread writes and fsyncs them every
+    `commit_interval` seconds (group commit), so the check-in path never waits on the disk.
+    Confirmed tasks are compacted away by rewriting the file with what is still pending.
+    """
+
+    def __init__(self, path: str, commit_interval: float = 0.05):
+        self.path = Path(path)
+        self.commit_interval = commit_interval
+        self._lock = threading.Lock()  # guards _pending and _buffer
+        self._io_lock = threading.Lock()  # guards the file handle
+        self._pending: Dict[UpdateTask, None] = {}
+        self._buffer: List[UpdateTask] = []
+        self._file: Optional[TextIO] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self) -> List[UpdateTask]:
+        """Reads back the unconfirmed tasks, compacts the file and starts group commit."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tasks = self._read()
+        with self._lock:
+            self._pending = dict.fromkeys(tasks)
+        self._rewrite()
+        self._thread = threading.Thread(target=self._commit_loop, daemon=True)
+        self._thread.start()
+        return tasks
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self.commit()
+        with self._io_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def append(self, task: UpdateTask):
+        with self._lock:
+            self._pending[task] = None
+            self._buffer.append(task)
+
+    def confirm(self, tasks: Iterable[UpdateTask]):
+        """Drops tasks that reached the sheet and compacts the journal."""
+        with self._lock:
+            for task in tasks:
+                self._pending.pop(task, None)
+        self._rewrite()
+
+    def commit(self):
+        """Writes and fsyncs buffered appends."""
+        with self._io_lock:
+            with self._lock:
+                tasks = [task for task in self._buffer if task in self._pending]
+                self._buffer = []
+            if not tasks or self._file is None:
+                return
+            self._file.write("".join(json.dumps(list(task), ensure_ascii=False) + "\n" for task in tasks))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _commit_loop(self):
+        while not self._stop_event.wait(self.commit_interval):
+            try:
+                self.commit()
+            except OSError as e:
+                print(f"ERROR: Failed to commit write journal: {e}")
+
+    def _read(self) -> List[UpdateTask]:
+        if not self.path.exists():
+            return []
+        tasks = []
+        with open(self.path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    employee_id, update_type, timestamp_str = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                tasks.append((employee_id, update_type, timestamp_str))
+        return tasks
+
+    def _rewrite(self):
+        with self._io_lock:
+            with self._lock:
+                tasks = list(self._pending)
+                self._buffer = []
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                tmp_file.write("".join(json.dumps(list(task), ensure_ascii=False) + "\n" for task in tasks))
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            if self._file:
+                self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
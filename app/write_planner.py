@@ -0,0 +1,85 @@
+# app/write_planner.py
+from typing import Any, Dict, Iterable, List, Tuple
+
+import gspread
+
+from .config import settings
+
+UpdateTask = Tuple[str, str, str] # (employee_id, "check-in" | "check-out", timestamp_str)
+
+# Status and time columns written for each update type
+STATUS_COLUMNS = {
+    "check-in": (settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME),
+    "check-out": (settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME),
+}
+
+
+def coalesce_tasks(tasks: Iterable[UpdateTask]) -> List[UpdateTask]:
+    """Keeps only the latest task per (employee, update type), in the order they were last queued."""
+    latest: Dict[Tuple[str, str], UpdateTask] = {}
+    for task in tasks:
+        key = (task[0], task[1])
+        latest.pop(key, None)
+        latest[key] = task
+    return list(latest.values())
+
+
+def _runs(numbers: Iterable[int]) -> List[Tuple[int, int]]:
+    """Splits numbers into sorted, contiguous (start, end) runs."""
+    runs: List[Tuple[int, int]] = []
+    for number in sorted(set(numbers)):
+        if runs and runs[-1][1] == number - 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
+
+
+def plan_column_updates(rows: Iterable[int], column: int, value: str) -> List[Dict[str, Any]]:
+    """Ranges that set one column to `value` for the given sheet rows, one range per contiguous run."""
+    letter = gspread.utils.rowcol_to_a1(1, column)[:-1]
+    return [
+        {"range": f"{letter}{start}:{letter}{end}", "values": [[value]] * (end - start + 1)}
+        for start, end in _runs(rows)
+    ]
+
+
+def plan_range_updates(
+    tasks: Iterable[UpdateTask],
+    row_index: Dict[str, int],
+    header_map: Dict[str, int],
+) -> Tuple[List[Dict[str, Any]], List[UpdateTask]]:
+    """
+    Turns queued tasks into the payload for a single values:batchUpdate call.
+
+    Repeated events are coalesced, then dirty rows of each update type are grouped into
+    contiguous A1 ranges over the status/time columns. Returns the payload and the tasks it
+    covers; tasks whose employee has no known row are dropped.
+    """
+    timestamps_by_type: Dict[str, Dict[int, str]] = {}
+    planned_tasks: List[UpdateTask] = []
+    for task in coalesce_tasks(tasks):
+        employee_id, update_type, timestamp_str = task
+        row = row_index.get(employee_id)
+        if not row:
+            print(f"Warning: Could not find row for employee {employee_id}. Skipping.")
+            continue
+        timestamps_by_type.setdefault(update_type, {})[row] = timestamp_str
+        planned_tasks.append(task)
+
+    data: List[Dict[str, Any]] = []
+    for update_type, timestamps in timestamps_by_type.items():
+        status_column, time_column = STATUS_COLUMNS[update_type]
+        status_col, time_col = header_map[status_column], header_map[time_column]
+
+        for col_start, col_end in _runs([status_col, time_col]):
+            for row_start, row_end in _runs(timestamps):
+                values = [
+                    ["TRUE" if col == status_col else timestamps[row] for col in range(col_start, col_end + 1)]
+                    for row in range(row_start, row_end + 1)
+                ]
+                start = gspread.utils.rowcol_to_a1(row_start, col_start)
+                end = gspread.utils.rowcol_to_a1(row_end, col_end)
+                data.append({"range": f"{start}:{end}", "values": values})
+
+    return data, planned_tasks
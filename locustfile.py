@@ -1,20 +1,42 @@
 # locustfile.py
+import csv
 import random
 import json
 import os
-from locust import HttpUser, task, between
+from locust import HttpUser, LoadTestShape, task, constant
 from dotenv import load_dotenv
 
+from app.config import settings
+
 # Load environment variables from .env file
 load_dotenv()
 
 
 # --- 您需要修改的區域 ---
 
-# 1. 準備一個包含所有 "假員工ID" 的列表
-# 執行測試前，請確保這些 ID 存在於您的 "壓力測試" Google Sheet 中
-# 您可以從 attendees.csv 複製 EmployeeID 欄位的內容來填充此列表
-TEST_EMPLOYEE_IDS = ["101","102","103","104","105","106","107","108","109","110","111","112","113","114","115","116","117","118","119","120","121","122","123","124","125","126","127","128","129","130","131","132","133","134","135","136","137","138","139","140","141","142","143","144","145","146","147","148","149","150","151","152","153","154","155","156","157","158","159","160","161","162","163","164","165","166","167","168","169","170","171","172","173","174","175","176","177","178","179","180","181","182","183","184","185","186","187","188","189","190","191","192","193","194","195","196","197","198","199","200","201","202","203","204","205","206","207","208","209","210","211","212","213","214","215","216","217","218","219","220","221","222","223","224","225","226","227","228","229","230","231","232","233","234","235","236","237","238","239","240","241","242","243","244","245","246","247","248","249","250","251","252","253","254","255","256","257","258","259","260","261","262","263","264","265","266","267","268","269","270","271","272","273","274","275","276","277","278","279","280","281","282","283","284","285","286","287","288","289","290","291","292","293","294","295","296","297","298","299","300","301","302","303","304","305","306","307","308","309","310","311","312","313","314","315","316","317","318","319","320","321","322","323","324","325","326","327","328","329","330","331","332","333","334","335","336","337","338","339","340","341","342","343","344","345","346","347","348","349","350","351","352","353","354","355","356","357","358","359","360","361","362","363","364","365","366","367","368","369","370","371","372","373","374","375","376","377","378","379","380","381","382","383","384","385","386","387","388","389","390","391","392","393","394","395","396","397","398","399","400","401","402","403","404","405","406","407","408","409","410","411","412","413","414","415","416","417","418","419","420","421","422","423","424","425","426","427","428","429","430","431","432","433","434","435","436","437","438","439","440","441","442","443","444","445","446","447","448","449","450","451","452","453","454","455","456","457","458","459","460","461","462","463","464","465","466","467","468","469","470","471","472","473","474","475","476","477","478","479","480","481","482","483","484","485","486","487","488","489","490","491","492","493","494","495","496","497","498","499","500","501","502","503","504","505","506","507","508","509","510","511","512","513","514","515","516","517","518","519","520","521","522","523","524","525","526","527","528","529","530","531","532","533","534","535","536","537","538","539","540","541","542","543","544","545","546","547","548","549","550","551","552","553","554","555","556","557","558","559","560","561","562","563","564","565","566","567","568","569","570","571","572","573","574","575","576","577","578","579","580","581","582","583","584","585","586","587","588","589","590","591","592","593","594","595","596","597","598","599"]
+# 1. 賓客 ID 直接從名單讀取 (UniqueID 欄位，也就是 QR Code 的內容)
+# 預設透過 STORAGE_BACKEND 設定的儲存後端讀取；也可用 LOCUST_ROSTER_CSV 指定一份從試算表匯出的 CSV
+def load_guest_ids():
+    roster_csv = os.getenv("LOCUST_ROSTER_CSV")
+    if roster_csv:
+        with open(roster_csv, encoding="utf-8", newline="") as roster_file:
+            records = list(csv.DictReader(roster_file))
+    else:
+        from app.storage import create_backend
+        records = create_backend().get_all_records()
+    ids = [str(record[settings.COL_UNIQUE_ID]) for record in records if record.get(settings.COL_UNIQUE_ID)]
+    random.shuffle(ids)
+    return ids
+
+# 所有虛擬掃描站共用同一條排隊隊伍，同一位賓客不會被兩台掃描站同時掃到
+PENDING_IDS = load_guest_ids()
+CHECKED_IN_IDS = []
+
+# 門口的掃描站數量，以及開門後湧入人潮的時間長度 (秒)
+STATIONS = int(os.getenv("LOCUST_STATIONS", "8"))
+RUSH_SECONDS = int(os.getenv("LOCUST_RUSH_SECONDS", "180"))
+TAIL_SECONDS = int(os.getenv("LOCUST_TAIL_SECONDS", "420"))
+SCAN_SECONDS = float(os.getenv("LOCUST_SCAN_SECONDS", "3"))
 
 # 2. 您的 API 端點 (Endpoint)
 CHECKIN_ENDPOINT = "/api/check-in"
@@ -31,15 +53,15 @@ if not API_KEY:
 # --- 腳本主體 ---
 
 class WebsiteUser(HttpUser):
-    # 虛擬使用者在執行任務間會隨機等待 1 到 5 秒
-    wait_time = between(1, 5)
+    # 每位虛擬使用者代表一台掃描站，每位賓客約需 SCAN_SECONDS 秒
+    wait_time = constant(SCAN_SECONDS)
 
     @task(2) # 50% 的權重：模擬報到
     def simulate_checkin(self):
-        if not self.environment.runner or not self.test_employee_ids:
+        if not self.environment.runner or not PENDING_IDS:
             return
 
-        user_id = self.test_employee_ids.pop(random.randint(0, len(self.test_employee_ids) - 1))
+        user_id = PENDING_IDS.pop()
 
         payload = json.dumps({"employeeId": user_id})
         headers = {
@@ -48,7 +70,7 @@ class WebsiteUser(HttpUser):
         }
         with self.client.post(CHECKIN_ENDPOINT, data=payload, headers=headers, catch_response=True) as response:
             if response.status_code == 200:
-                self.checked_in_ids.append(user_id)
+                CHECKED_IN_IDS.append(user_id)
                 response.success()
             elif response.status_code == 409: # Already checked in
                 response.success() # Treat as success because the API is working correctly
@@ -57,10 +79,10 @@ class WebsiteUser(HttpUser):
 
     @task(1) # 25% 的權重：模擬簽退
     def simulate_checkout(self):
-        if not self.environment.runner or not self.checked_in_ids:
+        if not self.environment.runner or not CHECKED_IN_IDS:
             return
 
-        user_id = self.checked_in_ids.pop(random.randint(0, len(self.checked_in_ids) - 1))
+        user_id = CHECKED_IN_IDS.pop(random.randint(0, len(CHECKED_IN_IDS) - 1))
 
         payload = json.dumps({"employeeId": user_id})
         headers = {
@@ -80,6 +102,17 @@ class WebsiteUser(HttpUser):
             headers={"X-API-Key": API_KEY}
         )
 
-    def on_start(self):
-        self.test_employee_ids = TEST_EMPLOYEE_IDS[:]
-        self.checked_in_ids = []
+
+class DoorRushShape(LoadTestShape):
+    """
+    開門瞬間所有掃描站同時開工，人潮過後只剩約四分之一的掃描站在處理零星抵達的賓客。
+    可搭配 --headless 執行：locust -f locustfile.py --headless --host http://localhost:8000
+    """
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if run_time < RUSH_SECONDS:
+            return (STATIONS, STATIONS)
+        if run_time < RUSH_SECONDS + TAIL_SECONDS and PENDING_IDS:
+            return (max(1, STATIONS // 4), STATIONS)
+        return None
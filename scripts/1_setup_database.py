@@ -1,6 +1,4 @@
 import sys
-import csv
-import uuid
 from pathlib import Path
 
 # Add project root to the Python path
@@ -10,6 +8,8 @@ sys.path.insert(0, str(project_root))
 import gspread
 from google.oauth2.service_account import Credentials
 from app.config import settings
+from app.roster_import import RosterCSV, import_roster_csv
+from app.storage import SheetsBackend, create_backend
 
 # Define the necessary scopes
 SCOPES = [
@@ -17,10 +17,55 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
+def open_roster():
+    """
+    The roster CSV (IMPORT_CSV_PATH, relative to the project root), or None if it is missing or empty.
+    """
+    csv_path = Path(settings.IMPORT_CSV_PATH)
+    if not csv_path.is_absolute():
+        csv_path = project_root / csv_path
+    if not csv_path.exists():
+        print(f"錯誤：找不到名單檔案於：{csv_path}")
+        return None
+
+    roster = RosterCSV.from_settings(str(csv_path))
+    if roster.count_rows() <= 0:
+        print(f"警告：'{csv_path.name}' 為空或格式不正確。")
+        return None
+    return roster
+
+
+def import_roster(backend):
+    """
+    Streams the CSV into the backend in IMPORT_CHUNK_ROWS-row writes; re-running after an interruption resumes.
+    """
+    roster = open_roster()
+    if roster is None:
+        return False
+
+    print(f"正在讀取 '{roster.path.name}' 並分批寫入，每批 {settings.IMPORT_CHUNK_ROWS} 列...")
+    guest_count = import_roster_csv(backend, roster, settings.IMPORT_CHECKPOINT_PATH, settings.IMPORT_CHUNK_ROWS, settings.IMPORT_REUSE_IDS)
+    print(f"已匯入 {guest_count} 位賓客。")
+    return True
+
+
+def setup_local_database():
+    """
+    Initializes the local SQLite roster (STORAGE_BACKEND=sqlite) from the roster CSV.
+    """
+    print(f"正在將名單寫入本機資料庫：'{settings.SQLITE_DATABASE_PATH}'...")
+    if import_roster(create_backend("sqlite")):
+        print("\n資料庫初始化完成！")
+
+
 def setup_database():
     """
     Initializes a user-created Google Sheet with attendee data from a local CSV file.
     """
+    if settings.STORAGE_BACKEND == "sqlite":
+        setup_local_database()
+        return
+
     print("正在連接 Google Sheets...")
     try:
         creds = Credentials.from_service_account_info(
@@ -34,7 +79,10 @@ def setup_database():
 
     try:
         print(f"正在開啟試算表：'{settings.SPREADSHEET_NAME}'...")
-        spreadsheet = client.open(settings.SPREADSHEET_NAME)
+        if settings.GOOGLE_SHEET_ID:
+            spreadsheet = client.open_by_key(settings.GOOGLE_SHEET_ID)
+        else:
+            spreadsheet = client.open(settings.SPREADSHEET_NAME)
     except gspread.exceptions.SpreadsheetNotFound:
         print("\n錯誤：找不到指定的試算表！")
         print("請依照以下步驟操作：")
@@ -49,43 +97,14 @@ def setup_database():
 
     try:
         worksheet = spreadsheet.worksheet(settings.WORKSHEET_NAME)
-        print(f"警告：工作表 '{settings.WORKSHEET_NAME}' 已存在，將清空並重新寫入資料。")
-        worksheet.clear()
+        print(f"警告：工作表 '{settings.WORKSHEET_NAME}' 已存在，將清空並重新寫入資料 (中斷後重新執行會從檢查點繼續)。")
     except gspread.exceptions.WorksheetNotFound:
         print(f"正在建立新的工作表：'{settings.WORKSHEET_NAME}'...")
         worksheet = spreadsheet.add_worksheet(title=settings.WORKSHEET_NAME, rows="100", cols="20")
 
-    csv_path = project_root / 'attendees.csv'
-    if not csv_path.exists():
-        print(f"錯誤：找不到 'attendees.csv' 檔案於：{csv_path}")
+    if not import_roster(SheetsBackend(lambda: worksheet)):
         return
 
-    print("正在讀取 'attendees.csv'...")
-    with open(csv_path, mode='r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        attendees = list(reader)
-
-    if not attendees:
-        print("警告：'attendees.csv' 為空或格式不正確。")
-        return
-
-    original_headers = list(attendees[0].keys())
-    headers = original_headers + [
-        settings.COL_UNIQUE_ID, settings.COL_EMAIL_SENT_STATUS,
-        settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
-        settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME
-    ]
-
-    rows_to_insert = [headers]
-    for attendee in attendees:
-        row = [attendee.get(h, '') for h in original_headers] + [
-            str(uuid.uuid4()), 'FALSE', 'FALSE', '', 'FALSE', ''
-        ]
-        rows_to_insert.append(row)
-
-    print(f"正在將 {len(attendees)} 筆資料寫入工作表...")
-    worksheet.update('A1', rows_to_insert, value_input_option='USER_ENTERED')
-
     print("\n資料庫初始化完成！")
     print(f"您現在可以前往以下連結查看您的 Google Sheet：")
     print(spreadsheet.url)
@@ -1,16 +1,32 @@
 import sys
+import time
+import json
 import argparse
 import requests
-import qrcode
-from io import BytesIO
+from functools import partial
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add project root to the Python path
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.config import settings
-from app.gsheet_client import GSheetClient
+from app.quota import Priority
+from app.mailer import MailgunSender, SentStatusRecorder, batch_recipients
+from app.qr_assets import QRCache
+from app.storage import create_backend
+
+INVITATION_SUBJECT = "【尾牙邀請函】您的專屬報到 QR Code"
+INVITATION_HTML = """
+<html><body>
+    <p>Hi {name},</p>
+    <p>這是您的尾牙報到 QR Code。</p>
+    <p>您的座位在 <strong>{table_number}</strong> 號桌。</p><br>
+    <img src="{qr_src}"><br>
+    <p>期待您的蒞臨！</p>
+</body></html>
+"""
 
 def send_qr_code_emails_mailgun(limit: int = None):
     """
@@ -21,20 +37,38 @@ def send_qr_code_emails_mailgun(limit: int = None):
         print("錯誤：尚未設定 Mailgun。請檢查 .env 檔案。")
         return
 
-    print("正在連接 Google Sheets...")
+    print(f"正在讀取賓客名單 (儲存後端：{settings.STORAGE_BACKEND})...")
     try:
-        gsheet_client = GSheetClient.from_settings()
-        worksheet = gsheet_client.get_worksheet(settings.WORKSHEET_NAME)
+        storage = create_backend()
+        all_attendees = storage.get_all_records(Priority.SCRIPT)
+        sent_status_col = storage.get_header_map()[settings.COL_EMAIL_SENT_STATUS]
     except Exception as e:
-        print(f"錯誤：無法連接 Google Sheets。 ({e})")
+        print(f"錯誤：無法讀取賓客名單。 ({e})")
         return
 
-    print("正在讀取賓客名單...")
-    all_attendees = worksheet.get_all_records()
+    # Sheet row of each guest (the header is row 1), built once for the whole run
+    row_of = {
+        str(attendee.get(settings.COL_UNIQUE_ID, '')): row_number
+        for row_number, attendee in enumerate(all_attendees, start=2) if attendee.get(settings.COL_UNIQUE_ID)
+    }
+    recorder = SentStatusRecorder(
+        storage, sent_status_col, row_of, settings.EMAIL_CHECKPOINT_PATH,
+        flush_every=settings.EMAIL_STATUS_FLUSH_EVERY, flush_interval=settings.EMAIL_STATUS_FLUSH_SECONDS,
+    )
+    already_sent = recorder.open()
+    if already_sent:
+        # An earlier run was interrupted before writing these to the sheet
+        print(f"從檢查點恢復 {len(already_sent)} 位已寄送但尚未更新狀態的賓客，正在寫回寄送狀態...")
+        try:
+            recorder.flush()
+        except Exception as e:
+            print(f"錯誤：寫回寄送狀態失敗，請稍後重新執行。 ({e})")
+            return
 
     attendees_to_email = [
         attendee for attendee in all_attendees
         if str(attendee.get(settings.COL_EMAIL_SENT_STATUS, 'FALSE')).upper() == 'FALSE'
+        and str(attendee.get(settings.COL_UNIQUE_ID, '')) not in already_sent
     ]
 
     if not attendees_to_email:
@@ -48,72 +82,146 @@ def send_qr_code_emails_mailgun(limit: int = None):
     else:
         print(f"找到 {len(attendees_to_email)} 位賓客需要寄送報到憑證...")
 
-    mailgun_api_url = f"{settings.MAILGUN_API_BASE_URL.rstrip('/')}/{settings.MAILGUN_DOMAIN}/messages"
-    sent_count = 0
-
+    # Guests with incomplete data can't get a usable invitation
+    invitations = []
     for attendee in attendees_to_email:
-        name = attendee.get(settings.COL_NAME)
-        email = attendee.get(settings.COL_EMAIL)
-        unique_id = attendee.get(settings.COL_UNIQUE_ID)
-        table_number = attendee.get(settings.COL_TABLE_NUMBER)
-
-        if not all([name, email, unique_id, table_number]):
+        if not all(attendee.get(column) for column in (settings.COL_NAME, settings.COL_EMAIL, settings.COL_UNIQUE_ID, settings.COL_TABLE_NUMBER)):
             print(f"警告：賓客資料不完整，跳過此筆記錄：{attendee}")
             continue
+        invitations.append(attendee)
 
-        print(f"正在處理 '{name}' ({email})...")
+    qr_cache = QRCache.from_settings()
+    if not settings.MAILGUN_QR_IMAGE_URL:
+        render_qr_codes(qr_cache, [str(attendee[settings.COL_UNIQUE_ID]) for attendee in invitations])
 
-        # --- Generate QR Code and send email ---
-        try:
-            qr_img = qrcode.make(unique_id)
-            img_byte_arr = BytesIO()
-            qr_img.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
-
-            html_body = f"""
-            <html><body>
-                <p>Hi {name},</p>
-                <p>這是您的尾牙報到 QR Code。</p>
-                <p>您的座位在 <strong>{table_number}</strong> 號桌。</p><br>
-                <img src="cid:qrcode.png"><br>
-                <p>期待您的蒞臨！</p>
-            </body></html>
-            """
-
-            response = requests.post(
-                mailgun_api_url,
-                auth=("api", settings.MAILGUN_API_KEY),
-                files=[("inline", ("qrcode.png", img_byte_arr.read(), "image/png"))],
-                data={
-                    "from": settings.MAILGUN_SENDER_EMAIL,
-                    "to": f"{name} <{email}>",
-                    "subject": "【尾牙邀請函】您的專屬報到 QR Code",
-                    "html": html_body
-                }
-            )
-            response.raise_for_status()
-
-            print(f"  -> Email 寄送成功。")
+    sender = MailgunSender.from_settings()
+    sent_count = 0
 
-            cell = worksheet.find(str(unique_id), in_column=worksheet.find(settings.COL_UNIQUE_ID).col)
-            worksheet.update_cell(cell.row, worksheet.find(settings.COL_EMAIL_SENT_STATUS).col, 'TRUE')
-            print(f"  -> Google Sheet 狀態更新成功。")
+    def send_and_record(send, recipients):
+        # Checkpointed as soon as Mailgun accepts, so a crash right after can't lead to a resend
+        send()
+        recorder.record(str(recipient["attendee"][settings.COL_UNIQUE_ID]) for recipient in recipients)
 
-            sent_count += 1
-        except requests.exceptions.HTTPError as e:
-            print(f"錯誤：Mailgun API 回應錯誤: {e.response.status_code} {e.response.text}")
-        except Exception as e:
-            print(f"錯誤：寄送 Email 給 {name} ({email}) 時失敗: {e}")
+    # Senders run in parallel up to MAILGUN_CONCURRENCY; the rate limiter in MailgunSender keeps them within the plan
+    executor = ThreadPoolExecutor(max_workers=settings.MAILGUN_CONCURRENCY)
+    try:
+        if settings.MAILGUN_QR_IMAGE_URL:
+            batches = batch_recipients(
+                [{"email": attendee[settings.COL_EMAIL], "attendee": attendee} for attendee in invitations],
+                settings.MAILGUN_BATCH_SIZE,
+            )
+            print(f"以批次寄送模式寄出 {len(invitations)} 封，共 {len(batches)} 批...")
+            futures = {executor.submit(send_and_record, partial(send_batch, sender, batch), batch): batch for batch in batches}
+        else:
+            futures = {
+                executor.submit(send_and_record, partial(send_invitation, sender, qr_cache, attendee), [{"attendee": attendee}]): [{"attendee": attendee}]
+                for attendee in invitations
+            }
+
+        for future in as_completed(futures):
+            recipients = futures[future]
+            names = ", ".join(f"'{recipient['attendee'][settings.COL_NAME]}'" for recipient in recipients[:3])
+            if len(recipients) > 3:
+                names += f" 等 {len(recipients)} 位"
+            try:
+                future.result()
+            except requests.exceptions.HTTPError as e:
+                print(f"錯誤：寄送給 {names} 時 Mailgun API 回應錯誤: {e.response.status_code} {e.response.text}")
+                continue
+            except Exception as e:
+                print(f"錯誤：寄送 Email 給 {names} 時失敗: {e}")
+                continue
+            print(f"  -> 已寄送給 {names}。")
+            sent_count += len(recipients)
+            if recorder.flush_due():
+                flush_sent_status(recorder)
+    except KeyboardInterrupt:
+        print("\n已中斷，等待進行中的寄送完成...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        sender.close()
+        flush_sent_status(recorder)
 
     print(f"\n任務完成。已成功寄送 {sent_count} 封報到憑證。")
 
 
+def flush_sent_status(recorder: SentStatusRecorder):
+    """Writes the batched EmailSentStatus updates; on failure they stay in the checkpoint for the next run."""
+    try:
+        written = recorder.flush()
+    except Exception as e:
+        print(f"錯誤：更新寄送狀態失敗，已保留於檢查點 {recorder.path}，下次執行時會重新寫入: {e}")
+        return
+    if written:
+        print(f"  -> 已更新 {written} 位賓客的寄送狀態。")
+
+
+def render_qr_codes(qr_cache: QRCache, unique_ids: list):
+    """Renders the QR codes missing from the cache across all cores before any mail goes out."""
+    started = time.perf_counter()
+    rendered = qr_cache.render_all(unique_ids, workers=settings.QR_RENDER_WORKERS or None)
+    if rendered:
+        print(f"已產生 {rendered} 張 QR Code ({time.perf_counter() - started:.1f} 秒)，快取於 {qr_cache.directory}。")
+
+
+def render_roster_qr_codes():
+    """Fills the QR cache for the whole roster, e.g. before on-site reprints or uploading hosted images."""
+    storage = create_backend()
+    unique_ids = [str(attendee[settings.COL_UNIQUE_ID]) for attendee in storage.get_all_records(Priority.SCRIPT) if attendee.get(settings.COL_UNIQUE_ID)]
+    qr_cache = QRCache.from_settings()
+    render_qr_codes(qr_cache, unique_ids)
+    print(f"{len(unique_ids)} 位賓客的 QR Code 皆已在快取中。")
+
+
+def send_invitation(sender: MailgunSender, qr_cache: QRCache, attendee: dict):
+    """One message with the guest's QR code as an inline image."""
+    name = attendee[settings.COL_NAME]
+    html_body = INVITATION_HTML.format(name=name, table_number=attendee[settings.COL_TABLE_NUMBER], qr_src="cid:qrcode.png")
+    sender.send(
+        data={
+            "from": settings.MAILGUN_SENDER_EMAIL,
+            "to": f"{name} <{attendee[settings.COL_EMAIL]}>",
+            "subject": INVITATION_SUBJECT,
+            "html": html_body,
+        },
+        files=[("inline", ("qrcode.png", qr_cache.get(str(attendee[settings.COL_UNIQUE_ID])), "image/png"))],
+    )
+
+
+def send_batch(sender: MailgunSender, recipients: list):
+    """One batch-sending call; Mailgun fills in each guest's details from recipient-variables."""
+    recipient_variables = {
+        recipient["email"]: {
+            "name": recipient["attendee"][settings.COL_NAME],
+            "table_number": recipient["attendee"][settings.COL_TABLE_NUMBER],
+            "qr_url": settings.MAILGUN_QR_IMAGE_URL.format(unique_id=recipient["attendee"][settings.COL_UNIQUE_ID]),
+        }
+        for recipient in recipients
+    }
+    sender.send(
+        data={
+            "from": settings.MAILGUN_SENDER_EMAIL,
+            "to": [f"{recipient['attendee'][settings.COL_NAME]} <{recipient['email']}>" for recipient in recipients],
+            "subject": INVITATION_SUBJECT,
+            "html": INVITATION_HTML.format(name="%recipient.name%", table_number="%recipient.table_number%", qr_src="%recipient.qr_url%"),
+            "recipient-variables": json.dumps(recipient_variables, ensure_ascii=False),
+        },
+        recipients=len(recipients),
+    )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Send QR code emails to attendees.")
     parser.add_argument("--limit", type=int, help="Limit the number of emails to send in this batch.")
+    parser.add_argument("--render-only", action="store_true", help="Render every guest's QR code into the cache without sending.")
     args = parser.parse_args()
 
     from dotenv import load_dotenv
     load_dotenv()
 
-    send_qr_code_emails_mailgun(limit=args.limit)
+    if args.render_only:
+        render_roster_qr_codes()
+    else:
+        send_qr_code_emails_mailgun(limit=args.limit)
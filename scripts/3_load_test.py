@@ -0,0 +1,302 @@
+import sys
+import csv
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+# Add project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.config import settings
+from app.sheets_emulator import EmulatedWorksheet
+from app.storage import SheetsBackend, a1_bounds, create_backend
+
+STATUS_HEADERS = [
+    settings.COL_UNIQUE_ID, settings.COL_EMAIL_SENT_STATUS,
+    settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+    settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME,
+]
+
+
+def build_roster(guests: int, rng: random.Random, roster_csv: Optional[str] = None) -> List[List[str]]:
+    """
+    Sheet rows (header first) for the offline run. A roster CSV exported from the sheet is used
+    as is; otherwise 'attendees.csv' is repeated up to `guests` rows, like 1_setup_database.py.
+    """
+    if roster_csv:
+        with open(roster_csv, encoding="utf-8", newline="") as roster_file:
+            return [row for row in csv.reader(roster_file)]
+
+    with open(project_root / 'attendees.csv', encoding="utf-8", newline="") as infile:
+        attendees = list(csv.DictReader(infile))
+    original_headers = list(attendees[0].keys())
+    rows = [original_headers + STATUS_HEADERS]
+    for i in range(guests):
+        attendee = attendees[i % len(attendees)]
+        rows.append([attendee.get(h, '') for h in original_headers] + [
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)), 'TRUE', 'FALSE', '', 'FALSE', ''
+        ])
+    return rows
+
+
+def roster_ids(rows: List[List[str]]) -> List[str]:
+    """The UniqueIDs scanners send, taken from the roster itself."""
+    uid_col = rows[0].index(settings.COL_UNIQUE_ID)
+    return [row[uid_col] for row in rows[1:] if len(row) > uid_col and row[uid_col]]
+
+
+def door_rush_arrivals(ids: List[str], duration: float, spike_fraction: float, spike_seconds: float,
+                       duplicate_rate: float, rng: random.Random) -> List[Tuple[float, str]]:
+    """
+    Arrival time (seconds after doors open) of every guest: `spike_fraction` of them in a
+    burst that peaks early in the first `spike_seconds`, the rest spread over `duration`.
+    `duplicate_rate` of guests scan a second time shortly after.
+    """
+    arrivals = []
+    for employee_id in ids:
+        if rng.random() < spike_fraction:
+            at = min(rng.gammavariate(2.0, spike_seconds / 6), duration)
+        else:
+            at = rng.uniform(0, duration)
+        arrivals.append((at, employee_id))
+        if rng.random() < duplicate_rate:
+            arrivals.append((min(at + rng.uniform(5, 60), duration), employee_id))
+    arrivals.sort()
+    return arrivals
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+class RecordingWorksheet(EmulatedWorksheet):
+    """Emulated sheet that notes when each row's check-in first lands, to measure write lag."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.check_in_landed_at: Dict[int, float] = {}
+
+    def batch_update(self, data, **kwargs):
+        data = list(data)
+        result = super().batch_update(data, **kwargs)
+        landed_at = time.monotonic()
+        check_in_col = self._grid[0].index(settings.COL_CHECK_IN_STATUS)
+        for item in data:
+            start_row, _, _, _ = a1_bounds(item["range"])
+            for row_number in range(start_row, start_row + len(item["values"])):
+                row = self._grid[row_number]
+                if len(row) > check_in_col and row[check_in_col] == "TRUE":
+                    self.check_in_landed_at.setdefault(row_number + 1, landed_at)
+        return result
+
+
+async def run_stations(client: httpx.AsyncClient, arrivals: List[Tuple[float, str]], args) -> Dict:
+    """Feeds guests to `args.stations` scanners from one shared line and times every request."""
+    line: asyncio.Queue = asyncio.Queue()
+    results = {"latencies_ms": [], "queue_wait_s": [], "status_codes": {}, "acked_at": {}, "errors": 0}
+    headers = {"X-API-Key": settings.API_KEY}
+    started = time.monotonic()
+
+    async def doors():
+        for at, employee_id in arrivals:
+            delay = started + at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            line.put_nowait((started + at, employee_id))
+        for _ in range(args.stations):
+            line.put_nowait(None)
+
+    async def station():
+        while True:
+            guest = await line.get()
+            if guest is None:
+                return
+            arrived_at, employee_id = guest
+            results["queue_wait_s"].append(time.monotonic() - arrived_at)
+            request_started = time.monotonic()
+            try:
+                response = await client.post("/api/check-in", json={"employeeId": employee_id}, headers=headers)
+            except httpx.HTTPError:
+                results["errors"] += 1
+                continue
+            acked_at = time.monotonic()
+            results["latencies_ms"].append((acked_at - request_started) * 1000)
+            results["status_codes"][response.status_code] = results["status_codes"].get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                results["acked_at"][employee_id] = acked_at
+            # The staff member hands over the seat card before scanning the next guest
+            await asyncio.sleep(args.scan_seconds)
+
+    async def dashboard():
+        while True:
+            await asyncio.sleep(args.dashboard_interval)
+            await client.get("/api/status", headers=headers)
+
+    dashboard_task = asyncio.create_task(dashboard()) if args.dashboard_interval > 0 else None
+    await asyncio.gather(doors(), *(station() for _ in range(args.stations)))
+    if dashboard_task:
+        dashboard_task.cancel()
+    results["elapsed_s"] = time.monotonic() - started
+    return results
+
+
+def run_offline(args, rng: random.Random) -> Dict:
+    """Runs the app in-process against an emulated sheet with latency and 429s."""
+    rows = build_roster(args.guests, rng, args.roster_csv)
+    worksheet = RecordingWorksheet(
+        rows,
+        latency=args.sheet_latency,
+        jitter=args.sheet_jitter,
+        read_quota_per_minute=args.read_quota,
+        write_quota_per_minute=args.write_quota,
+        error_rate=args.error_rate,
+    )
+
+    from app.cache_manager import CacheManager
+    from app.dependencies import get_api_key
+    from app.main import app
+
+    async def skip_api_key():
+        return "load-test"
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            patch.dict(app.dependency_overrides, {get_api_key: skip_api_key}), \
+            patch.object(settings, "CACHE_SNAPSHOT_PATH", str(Path(workdir) / "roster_snapshot.pickle")), \
+            patch.object(settings, "WRITE_JOURNAL_PATH", str(Path(workdir) / "write_journal.jsonl")), \
+            patch.object(settings, "SHARED_STATE_PATH", ""):
+        cache = CacheManager()
+        cache._storage = SheetsBackend(lambda: worksheet)
+        cache.start()
+        try:
+            async def main():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+                    return await run_stations(client, door_rush_arrivals(
+                        roster_ids(rows), args.duration, args.spike_fraction, args.spike_seconds, args.duplicate_rate, rng,
+                    ), args)
+
+            with patch("app.main.cache_manager", cache):
+                results = asyncio.run(main())
+
+            # Let the writer drain what's left before measuring write lag
+            drain_deadline = time.monotonic() + args.drain_timeout
+            while time.monotonic() < drain_deadline and cache.get_health()["pending_writes"]:
+                time.sleep(0.1)
+            results["unflushed_writes"] = cache.get_health()["pending_writes"]
+        finally:
+            cache.stop()
+
+    row_of = {employee_id: i for i, employee_id in enumerate(roster_ids(rows), start=2)}
+    results["write_lag_s"] = [
+        worksheet.check_in_landed_at[row_of[employee_id]] - acked_at
+        for employee_id, acked_at in results["acked_at"].items()
+        if row_of[employee_id] in worksheet.check_in_landed_at
+    ]
+    results["sheet_requests"] = dict(worksheet.request_counts)
+    return results
+
+
+def run_live(args, rng: random.Random) -> Dict:
+    """Drives a running server; guest IDs come from the configured storage backend."""
+    print(f"正在從儲存後端 ({settings.STORAGE_BACKEND}) 讀取賓客 ID...")
+    ids = [str(record.get(settings.COL_UNIQUE_ID)) for record in create_backend().get_all_records() if record.get(settings.COL_UNIQUE_ID)]
+    rng.shuffle(ids)
+    ids = ids[:args.guests]
+
+    async def main():
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+            return await run_stations(client, door_rush_arrivals(
+                ids, args.duration, args.spike_fraction, args.spike_seconds, args.duplicate_rate, rng,
+            ), args)
+
+    return asyncio.run(main())
+
+
+def evaluate_slos(results: Dict, args) -> List[Tuple[str, Optional[float], float, bool]]:
+    """(name, measured, limit, ok) for each SLO."""
+    p95 = percentile(results["latencies_ms"], 95)
+    p99 = percentile(results["latencies_ms"], 99)
+    failures = results["errors"] + sum(count for code, count in results["status_codes"].items() if code >= 500)
+    checks = [
+        ("p95 latency (ms)", p95, args.slo_p95_ms, p95 is not None and p95 <= args.slo_p95_ms),
+        ("p99 latency (ms)", p99, args.slo_p99_ms, p99 is not None and p99 <= args.slo_p99_ms),
+        ("request errors", float(failures), 0, failures == 0),
+    ]
+    if "write_lag_s" in results:
+        lag = percentile(results["write_lag_s"], 99)
+        all_written = results["unflushed_writes"] == 0 and len(results["write_lag_s"]) == len(results["acked_at"])
+        checks.append(("p99 write lag (s)", lag, args.slo_write_lag_s, all_written and (lag is None or lag <= args.slo_write_lag_s)))
+    return checks
+
+
+def print_report(results: Dict, checks, args):
+    codes = ", ".join(f"{code}: {count}" for code, count in sorted(results["status_codes"].items()))
+    print(f"\n{args.stations} 台掃描站，{sum(results['status_codes'].values())} 次掃描，耗時 {results['elapsed_s']:.1f} 秒 ({codes})")
+    wait = percentile(results["queue_wait_s"], 95)
+    print(f"排隊等候 p95：{wait:.1f} 秒" if wait is not None else "排隊等候：無資料")
+    if "sheet_requests" in results:
+        print(f"模擬試算表請求：{results['sheet_requests']}，未寫入：{results['unflushed_writes']}")
+    print("\nSLO:")
+    for name, measured, limit, ok in checks:
+        shown = "n/a" if measured is None else f"{measured:.2f}"
+        print(f"  [{'PASS' if ok else 'FAIL'}] {name}: {shown} (上限 {limit})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the door rush against the check-in API and check latency SLOs.")
+    parser.add_argument("--url", help="Test a running server instead of an in-process app with an emulated sheet.")
+    parser.add_argument("--roster-csv", help="Sheet export (header row first) to seed the emulated sheet with.")
+    parser.add_argument("--guests", type=int, default=2000, help="Guests to simulate.")
+    parser.add_argument("--stations", type=int, default=8, help="Scanner stations at the door.")
+    parser.add_argument("--scan-seconds", type=float, default=3.0, help="Time a station spends per guest after the API responds.")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds from doors opening to the last arrival.")
+    parser.add_argument("--spike-fraction", type=float, default=0.7, help="Share of guests arriving in the opening rush.")
+    parser.add_argument("--spike-seconds", type=float, default=180, help="Length of the opening rush.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="Share of guests who scan twice.")
+    parser.add_argument("--dashboard-interval", type=float, default=5.0, help="Seconds between dashboard polls; 0 = off.")
+    parser.add_argument("--sheet-latency", type=float, default=0.3, help="Emulated Sheets API latency (seconds).")
+    parser.add_argument("--sheet-jitter", type=float, default=0.5, help="Extra random latency (seconds).")
+    parser.add_argument("--read-quota", type=int, default=60, help="Emulated read requests per minute.")
+    parser.add_argument("--write-quota", type=int, default=60, help="Emulated write requests per minute.")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Chance of a random 429 per Sheets request.")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Seconds to wait for pending writes after the last scan.")
+    parser.add_argument("--slo-p95-ms", type=float, default=100)
+    parser.add_argument("--slo-p99-ms", type=float, default=300)
+    parser.add_argument("--slo-write-lag-s", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the raw results and SLO checks to this JSON file.")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    rng = random.Random(args.seed)
+    results = run_live(args, rng) if args.url else run_offline(args, rng)
+    checks = evaluate_slos(results, args)
+    print_report(results, checks, args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "args": vars(args),
+            "slos": [{"name": name, "measured": measured, "limit": limit, "ok": ok} for name, measured, limit, ok in checks],
+            "results": {key: value for key, value in results.items() if key != "acked_at"},
+        }, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+    sys.exit(0 if all(ok for *_, ok in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
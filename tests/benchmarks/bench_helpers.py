@@ -0,0 +1,41 @@
+from typing import List
+
+from app.config import settings
+from app.storage import StorageBackend
+
+HEADERS = [
+    "EmployeeID", settings.COL_NAME, settings.COL_DEPARTMENT, settings.COL_EMAIL, settings.COL_TABLE_NUMBER,
+    settings.COL_UNIQUE_ID, settings.COL_EMAIL_SENT_STATUS,
+    settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+    settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME,
+]
+DEPARTMENTS = ["工程部", "市場部", "人資部", "財務部", "業務部", "法務部"]
+
+def make_roster(size: int) -> List[List[str]]:
+    """A get_all_values() payload of `size` guests; every third one checked in, every tenth out."""
+    values = [list(HEADERS)]
+    for i in range(size):
+        checked_in = i % 3 == 0
+        checked_out = checked_in and i % 10 == 0
+        values.append([
+            str(100000 + i), f"賓客{i}", DEPARTMENTS[i % len(DEPARTMENTS)], f"guest{i}@example.com",
+            f"T{i % 200}", f"uuid-{i}", "TRUE",
+            "TRUE" if checked_in else "FALSE", "2024-01-01T18:00:00+08:00" if checked_in else "",
+            "TRUE" if checked_out else "FALSE", "2024-01-01T21:00:00+08:00" if checked_out else "",
+        ])
+    return values
+
+
+class StaticBackend(StorageBackend):
+    """Serves a prebuilt payload, so load benchmarks time parsing rather than I/O."""
+    name = "static"
+
+    def __init__(self, values: List[List[str]]):
+        super().__init__()
+        self.values = values
+
+    def get_all_values(self, priority: int = 0) -> List[List[str]]:
+        return self.values
+
+    def write_ranges(self, data, priority: int = 0):
+        pass
@@ -0,0 +1,106 @@
+"""
+Offline micro-benchmarks. Skipped unless RUN_BENCHMARKS=1:
+
+    RUN_BENCHMARKS=1 python -m pytest -q tests/benchmarks
+
+Each run writes its timings to BENCHMARK_OUTPUT (default data/benchmarks/<timestamp>.json).
+With BENCHMARK_BASELINE pointing at an earlier result file, a benchmark whose median is more
+than BENCHMARK_MAX_REGRESSION (default 0.25 = 25%) slower than the baseline fails.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+
+if not os.environ.get("RUN_BENCHMARKS"):
+    collect_ignore_glob = ["test_*.py"]
+
+_results: Dict[str, Dict[str, Any]] = {}
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot():
+    with patch.object(settings, "CACHE_SNAPSHOT_PATH", ""):
+        yield
+
+
+@pytest.fixture
+def bench(request):
+    """
+    bench(func, rounds=..., warmup=...) times `rounds` calls of func and records the stats
+    under the test's id. Returns the stats dict.
+    """
+    def run(func: Callable[[], Any], rounds: int = 1000, warmup: int = 10) -> Dict[str, Any]:
+        for _ in range(warmup):
+            func()
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        stats = {
+            "rounds": rounds,
+            "min_us": timings[0] * 1e6,
+            "median_us": statistics.median(timings) * 1e6,
+            "mean_us": statistics.fmean(timings) * 1e6,
+            "p95_us": timings[max(0, int(len(timings) * 0.95) - 1)] * 1e6,
+            "max_us": timings[-1] * 1e6,
+            "ops_per_sec": len(timings) / sum(timings) if sum(timings) else None,
+        }
+        name = request.node.nodeid.split("::", 1)[-1]
+        _results[name] = stats
+        _check_regression(name, stats)
+        return stats
+
+    return run
+
+
+def _baseline() -> Optional[Dict[str, Any]]:
+    path = os.environ.get("BENCHMARK_BASELINE")
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)["benchmarks"]
+
+
+def _check_regression(name: str, stats: Dict[str, Any]):
+    baseline = _baseline()
+    if not baseline or name not in baseline:
+        return
+    allowed = baseline[name]["median_us"] * (1 + float(os.environ.get("BENCHMARK_MAX_REGRESSION", "0.25")))
+    assert stats["median_us"] <= allowed, (
+        f"{name} regressed: median {stats['median_us']:.1f}us vs baseline {baseline[name]['median_us']:.1f}us"
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    output = Path(os.environ.get("BENCHMARK_OUTPUT") or f"data/benchmarks/{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created_at": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "benchmarks": _results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nBenchmark results written to {output}")
@@ -0,0 +1,57 @@
+import asyncio
+import itertools
+import os
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+os.environ.setdefault("API_KEY", "bench-api-key")
+
+from app.cache_manager import CacheManager
+from app.config import settings
+from app.main import app
+
+from bench_helpers import StaticBackend, make_roster
+
+ROSTER_SIZE = 10_000
+HEADERS = {"X-API-Key": settings.API_KEY}
+
+
+@pytest.fixture
+def manager():
+    cache = CacheManager()
+    cache._storage = StaticBackend(make_roster(ROSTER_SIZE))
+    cache.load_initial_data()
+    # Requests go straight to the app; the lifespan hook (and its background threads) never runs
+    with patch("app.main.cache_manager", cache):
+        yield cache
+
+
+@pytest.fixture
+def call():
+    """Runs one request through the ASGI app in-process and returns the response."""
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    def run(method: str, url: str, **kwargs) -> httpx.Response:
+        return loop.run_until_complete(client.request(method, url, headers=HEADERS, **kwargs))
+
+    yield run
+    loop.run_until_complete(client.aclose())
+    loop.close()
+
+
+def test_check_in_request(bench, manager, call):
+    ids = itertools.cycle(f"uuid-{i}" for i in range(ROSTER_SIZE) if i % 3)
+    bench(lambda: call("POST", "/api/check-in", json={"employeeId": next(ids)}), rounds=2000)
+    assert call("POST", "/api/check-in", json={"employeeId": "uuid-1"}).status_code == 409
+
+
+def test_check_in_unknown_guest_request(bench, manager, call):
+    bench(lambda: call("POST", "/api/check-in", json={"employeeId": "uuid-missing"}), rounds=2000)
+
+
+def test_status_request(bench, manager, call):
+    bench(lambda: call("GET", "/api/status"), rounds=2000)
+    assert call("GET", "/api/status").json()["total_attendees"] == ROSTER_SIZE
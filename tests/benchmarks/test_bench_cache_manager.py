@@ -0,0 +1,75 @@
+import itertools
+import random
+
+import pytest
+
+from app.cache_manager import CacheManager
+from app.write_planner import coalesce_tasks, plan_range_updates
+
+from bench_helpers import HEADERS, StaticBackend, make_roster
+
+ROSTER_SIZE = 10_000
+# Seed for the sampled inputs, so every run (and every -k selection) times the same work
+SEED = 42
+
+
+@pytest.fixture(scope="module")
+def roster():
+    return make_roster(ROSTER_SIZE)
+
+
+@pytest.fixture
+def manager(roster):
+    cache = CacheManager()
+    cache._storage = StaticBackend(roster)
+    cache.load_initial_data()
+    return cache
+
+
+def test_get_attendee(bench, manager):
+    rng = random.Random(SEED)
+    ids = itertools.cycle([f"uuid-{rng.randrange(ROSTER_SIZE)}" for _ in range(1000)])
+    bench(lambda: manager.get_attendee(next(ids)), rounds=20_000)
+
+
+def test_update_check_in_status(bench, manager):
+    ids = itertools.cycle(f"uuid-{i}" for i in range(ROSTER_SIZE))
+    bench(lambda: manager.update_check_in_status(next(ids)), rounds=ROSTER_SIZE - 100)
+
+
+def test_get_status_counts(bench, manager):
+    bench(manager.get_status_counts, rounds=20_000)
+
+
+@pytest.fixture(scope="module")
+def manager_100k():
+    cache = CacheManager()
+    cache._storage = StaticBackend(make_roster(100_000))
+    cache.load_initial_data()
+    return cache
+
+
+# Exact name, email prefix, EmployeeID prefix and a name substring
+@pytest.mark.parametrize("query", ["賓客4242", "guest12", "1000", "客42"])
+def test_search_attendees_100k(bench, manager_100k, query):
+    bench(lambda: manager_100k.search_attendees(query), rounds=2000)
+
+
+@pytest.mark.parametrize("size", [10_000, 50_000, 200_000])
+def test_load_initial_data(bench, size):
+    cache = CacheManager()
+    cache._storage = StaticBackend(make_roster(size))
+    bench(cache.load_initial_data, rounds=5 if size > 50_000 else 20, warmup=1)
+    assert cache.total_count == size
+
+
+@pytest.mark.parametrize("batch_size", [100, 1000])
+def test_plan_range_updates(bench, manager, batch_size):
+    rng = random.Random(SEED)
+    tasks = [
+        (f"uuid-{rng.randrange(ROSTER_SIZE)}", rng.choice(["check-in", "check-out"]), "2024-01-01T18:00:00+08:00")
+        for _ in range(batch_size)
+    ]
+    header_map = {header: i + 1 for i, header in enumerate(HEADERS)}
+    row_index = manager.employee_id_to_row_index
+    bench(lambda: plan_range_updates(coalesce_tasks(tasks), row_index, header_map), rounds=200)
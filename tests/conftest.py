@@ -0,0 +1,12 @@
+import pytest
+from unittest.mock import patch
+
+from app.gsheet_client import GSheetClient
+from app.quota import QuotaScheduler
+
+
+@pytest.fixture(autouse=True)
+def unlimited_sheets_quota():
+    """Tests share one process; don't let them spend each other's Sheets budget."""
+    with patch.object(GSheetClient, "quota", QuotaScheduler(read_per_minute=0, write_per_minute=0)):
+        yield
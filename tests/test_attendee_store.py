@@ -0,0 +1,47 @@
+from app.attendee_store import AttendeeRecord, RosterSchema, RowIndexView
+from app.config import settings
+
+HEADERS = [
+    "EmployeeID", settings.COL_NAME, settings.COL_DEPARTMENT, settings.COL_UNIQUE_ID,
+    settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+    settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME,
+]
+SCHEMA = RosterSchema(HEADERS)
+
+
+def test_record_reads_back_like_the_sheet_row():
+    row = ["101", "王大明", "工程部", "uuid-1", "TRUE", "2024-01-01T18:00:00.123456+08:00", "FALSE", ""]
+    record = AttendeeRecord.from_row(SCHEMA, row, 2)
+
+    assert dict(record) == dict(zip(HEADERS, row))
+    assert record.row_values() == row
+    assert record.checked_in and not record.checked_out
+    assert isinstance(record.check_in_time, int)
+
+
+def test_unparseable_or_foreign_timestamps_are_kept_verbatim():
+    row = ["102", "陳小美", "市場部", "uuid-2", "TRUE", "2024/1/1 18:00", "TRUE", "2024-01-01T10:00:00+00:00"]
+    record = AttendeeRecord.from_row(SCHEMA, row, 3)
+
+    assert record[settings.COL_CHECK_IN_TIME] == "2024/1/1 18:00"
+    assert record[settings.COL_CHECK_OUT_TIME] == "2024-01-01T10:00:00+00:00"
+
+
+def test_replace_returns_updated_copy():
+    record = AttendeeRecord.from_row(SCHEMA, ["103", "李中天", "人資部", "uuid-3", "", "", "", ""], 4)
+    updated = record.replace({settings.COL_CHECK_IN_STATUS: "TRUE", settings.COL_CHECK_IN_TIME: "2024-01-01T18:00:00+08:00"})
+
+    assert record[settings.COL_CHECK_IN_STATUS] == "FALSE"
+    assert updated[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert updated[settings.COL_CHECK_IN_TIME] == "2024-01-01T18:00:00+08:00"
+    assert updated.get(settings.COL_NAME) == "李中天"
+    assert updated.get("Missing", "default") == "default"
+
+
+def test_row_index_view_reads_inline_row_numbers():
+    records = {"uuid-1": AttendeeRecord.from_row(SCHEMA, ["101", "", "", "uuid-1", "", "", "", ""], 7)}
+    view = RowIndexView(records)
+
+    assert view["uuid-1"] == 7
+    assert view.get("uuid-missing") is None
+    assert dict(view) == {"uuid-1": 7}
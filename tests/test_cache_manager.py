@@ -0,0 +1,463 @@
+import threading
+import time
+
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from app import metrics
+from app.cache_manager import TAIPEI_TZ, CacheManager
+from app.quota import QuotaScheduler
+from app.shared_state import SharedState
+from app.config import settings
+
+HEADERS = [
+    "EmployeeID", settings.COL_NAME, settings.COL_DEPARTMENT, settings.COL_EMAIL, settings.COL_TABLE_NUMBER,
+    settings.COL_UNIQUE_ID, settings.COL_EMAIL_SENT_STATUS,
+    settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+    settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME,
+]
+
+SHEET_VALUES = [
+    HEADERS,
+    ["101", "王大明", "工程部", "test1@example.com", "A1", "uuid-1", "TRUE", "TRUE", "2024-01-01T18:00:00+08:00", "FALSE", ""],
+    ["102", "陳小美", "市場部", "test2@example.com", "B2", "uuid-2", "TRUE", "TRUE", "2024-01-01T18:05:00+08:00", "TRUE", "2024-01-01T21:00:00+08:00"],
+    ["103", "李中天", "人資部", "test3@example.com", "C3", "uuid-3", "TRUE", "FALSE", "", "FALSE", ""],
+]
+
+
+@pytest.fixture
+def worksheet():
+    worksheet = MagicMock()
+    worksheet.get_all_values.return_value = [list(row) for row in SHEET_VALUES]
+    return worksheet
+
+
+@pytest.fixture(autouse=True)
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "roster_snapshot.pickle")
+    with patch.object(settings, "CACHE_SNAPSHOT_PATH", path):
+        yield path
+
+
+@pytest.fixture
+def manager(worksheet):
+    gsheet_client = MagicMock()
+    gsheet_client.get_worksheet.return_value = worksheet
+    gsheet_client.get_headers.return_value = HEADERS
+
+    with patch("app.storage.GSheetClient.get_shared", return_value=gsheet_client):
+        cache = CacheManager()
+        cache.load_initial_data()
+        yield cache
+
+
+def column(values, name):
+    index = HEADERS.index(name)
+    return [[row[index]] if row[index] else [] for row in values[1:]]
+
+
+def batch_get_result(values, new_rows=()):
+    """Builds what worksheet.batch_get returns for the ranges requested by load_delta."""
+    return [
+        [HEADERS],
+        column(values, settings.COL_UNIQUE_ID),
+        column(values, settings.COL_CHECK_IN_STATUS),
+        column(values, settings.COL_CHECK_IN_TIME),
+        column(values, settings.COL_CHECK_OUT_STATUS),
+        column(values, settings.COL_CHECK_OUT_TIME),
+        [list(row) for row in new_rows],
+    ]
+
+
+def test_load_initial_data_builds_status_counts(manager):
+    assert manager.is_initialized
+    assert manager.get_status_counts() == {"total_attendees": 3, "checked_in_count": 2, "checked_out_count": 1}
+
+
+def test_check_in_and_out_update_status_counts(manager):
+    manager.update_check_in_status("uuid-3")
+    assert manager.get_status_counts()["checked_in_count"] == 3
+
+    manager.update_check_out_status("uuid-3")
+    assert manager.get_status_counts()["checked_out_count"] == 2
+    assert len(manager.update_queue) == 2
+
+
+def test_repeated_check_in_does_not_double_count(manager):
+    manager.update_check_in_status("uuid-1")
+    assert manager.get_status_counts()["checked_in_count"] == 2
+
+
+def test_status_changes_notify_dashboard_streams(manager):
+    version = manager.status_changes.version
+    manager.update_check_in_status("uuid-3")
+    manager.update_check_in_status("uuid-3")
+    assert manager.status_changes.version == version + 1
+
+    manager.load_initial_data()
+    assert manager.status_changes.version > version + 1
+
+
+def test_unknown_attendee_leaves_counts_unchanged(manager):
+    assert manager.update_check_in_status("uuid-missing") is None
+    assert manager.get_status_counts() == {"total_attendees": 3, "checked_in_count": 2, "checked_out_count": 1}
+
+
+def test_delta_reload_keeps_pending_local_check_in(manager, worksheet):
+    manager.update_check_in_status("uuid-3")
+    worksheet.batch_get.return_value = batch_get_result(SHEET_VALUES)
+
+    assert manager.load_delta()
+
+    assert manager.get_attendee("uuid-3")[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert manager.get_status_counts()["checked_in_count"] == 3
+
+
+def test_delta_reload_applies_sheet_changes_and_new_rows(manager, worksheet):
+    values = [list(row) for row in SHEET_VALUES]
+    values[3][HEADERS.index(settings.COL_CHECK_IN_STATUS)] = "TRUE"
+    new_row = ["104", "林小華", "財務部", "test4@example.com", "D4", "uuid-4", "FALSE", "FALSE", "", "FALSE", ""]
+    worksheet.batch_get.return_value = batch_get_result(values, new_rows=[new_row])
+
+    assert manager.load_delta()
+
+    assert manager.get_attendee("uuid-3")[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert manager.get_attendee("uuid-4")[settings.COL_NAME] == "林小華"
+    assert manager.employee_id_to_row_index["uuid-4"] == 5
+    assert manager.get_status_counts() == {"total_attendees": 4, "checked_in_count": 3, "checked_out_count": 1}
+
+
+def test_delta_reload_requests_full_reload_when_rows_move(manager, worksheet):
+    values = [SHEET_VALUES[0], SHEET_VALUES[2], SHEET_VALUES[1], SHEET_VALUES[3]]
+    worksheet.batch_get.return_value = batch_get_result(values)
+
+    assert not manager.load_delta()
+
+
+def test_full_reload_keeps_pending_local_check_in(manager):
+    manager.update_check_in_status("uuid-3")
+    manager.load_initial_data()
+
+    assert manager.get_attendee("uuid-3")[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert manager.get_status_counts()["checked_in_count"] == 3
+
+
+def test_flush_is_due_immediately_once_threshold_reached(manager):
+    with patch.object(settings, "WRITE_FLUSH_THRESHOLD", 2), patch.object(settings, "WRITE_MIN_INTERVAL_SECONDS", 0):
+        manager.update_check_in_status("uuid-3")
+        assert manager._next_flush_delay() > 0
+
+        manager.update_check_out_status("uuid-1")
+        assert manager._next_flush_delay() <= 0
+
+
+def test_flush_waits_for_write_quota(manager):
+    manager.storage.quota = QuotaScheduler(read_per_minute=60, write_per_minute=60)
+    manager.storage.quota.exhaust("write")
+    with patch.object(settings, "WRITE_FLUSH_THRESHOLD", 1), patch.object(settings, "WRITE_MIN_INTERVAL_SECONDS", 0):
+        manager.update_check_in_status("uuid-3")
+        assert manager._next_flush_delay() > 0.5
+
+
+def test_quota_is_read_off_the_request_path(manager):
+    manager.storage.quota = QuotaScheduler(read_per_minute=60, write_per_minute=60)
+    quota = manager.storage.quota
+    lock_held = []
+    for name in ("wait_time", "remaining"):
+        call = getattr(quota, name)
+        setattr(quota, name, lambda *args, call=call: lock_held.append(manager._write_lock.locked()) or call(*args))
+    manager.update_check_in_status("uuid-3")
+
+    # The writer thread queries the quota without the write lock and caches what's left ...
+    manager._next_flush_delay()
+    manager._refresh_quota_remaining()
+    assert lock_held == [False, False]
+    # ... which health checks and /metrics serve without touching the quota state
+    assert manager.get_health()["quota_remaining"] == {"read": 60, "write": 60}
+    manager._register_metrics()
+    assert 'sheets_quota_remaining{kind="write"} 60' in metrics.SHEETS_QUOTA_REMAINING.render()
+    assert len(lock_held) == 2
+
+
+def test_take_batch_caps_size_and_failed_batch_is_requeued(manager):
+    manager.update_check_in_status("uuid-3")
+    manager.update_check_out_status("uuid-1")
+
+    with patch.object(settings, "WRITE_MAX_BATCH_TASKS", 1):
+        batch_id, tasks, oldest_at = manager._take_batch()
+    assert len(tasks) == 1
+    assert len(manager.update_queue) == 1
+    assert batch_id in manager.in_flight_tasks
+
+    with patch("app.storage.GSheetClient.get_shared", side_effect=RuntimeError("offline")):
+        manager._flush_batch(batch_id, tasks, oldest_at)
+    assert list(manager.update_queue)[0] == tasks[0]
+    assert manager.in_flight_tasks == {}
+
+
+def test_flush_records_batch_metrics(manager):
+    flushes = metrics.FLUSH_DURATION.count(result="ok")
+    manager.update_check_in_status("uuid-3")
+    manager._flush_batch(*manager._take_batch())
+
+    assert metrics.FLUSH_DURATION.count(result="ok") == flushes + 1
+    assert metrics.WRITE_LAG.count() >= 1
+
+
+def test_journaled_writes_are_replayed_into_cache_and_queue(manager):
+    manager._replay_journal([("uuid-3", "check-in", "2024-01-01T18:30:00+08:00")])
+
+    assert manager.get_attendee("uuid-3")[settings.COL_CHECK_IN_TIME] == "2024-01-01T18:30:00+08:00"
+    assert manager.get_status_counts()["checked_in_count"] == 3
+    assert list(manager.update_queue) == [("uuid-3", "check-in", "2024-01-01T18:30:00+08:00")]
+
+
+def test_warm_start_serves_saved_snapshot(manager):
+    manager.update_check_in_status("uuid-3")
+    manager.save_snapshot()
+
+    warm = CacheManager()
+    assert warm.load_from_snapshot()
+    assert warm.is_initialized
+    assert warm.data_source == "snapshot"
+    assert warm.get_attendee("uuid-3")[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert warm.employee_id_to_row_index == manager.employee_id_to_row_index
+    assert warm.get_status_counts() == manager.get_status_counts()
+
+
+def test_warm_start_holds_writes_until_the_sheet_loads(manager, worksheet):
+    manager.save_snapshot()
+    warm = CacheManager()
+    warm._storage = manager.storage
+    assert warm.load_from_snapshot()
+
+    with patch.object(settings, "WRITE_FLUSH_THRESHOLD", 1), patch.object(settings, "WRITE_MIN_INTERVAL_SECONDS", 0):
+        warm.update_check_in_status("uuid-3")
+        assert warm._next_flush_delay() == settings.WRITE_MAX_DELAY_SECONDS
+        warm.load_initial_data()
+        assert warm._next_flush_delay() <= 0
+    assert [task[:2] for task in warm.update_queue] == [("uuid-3", "check-in")]
+
+
+def test_failed_refresh_keeps_serving_warm_cache(manager):
+    with patch("app.storage.GSheetClient.get_shared", side_effect=RuntimeError("offline")):
+        manager.load_initial_data()
+    assert manager.is_initialized
+    assert manager.get_health()["ready"]
+
+
+def test_updates_publish_a_new_record_instead_of_mutating(manager):
+    before = manager.get_attendee("uuid-3")
+    after = manager.update_check_in_status("uuid-3")
+
+    assert before[settings.COL_CHECK_IN_STATUS] == "FALSE"
+    assert after[settings.COL_CHECK_IN_STATUS] == "TRUE"
+    assert manager.get_attendee("uuid-3") is after
+
+
+def test_reads_do_not_wait_for_the_write_lock(manager):
+    with manager._write_lock:
+        assert manager.get_attendee("uuid-1")[settings.COL_NAME] == "王大明"
+        assert len(manager.get_all_attendees()) == 3
+        assert manager.get_status_counts()["total_attendees"] == 3
+
+
+def test_shared_state_keeps_workers_consistent(worksheet, tmp_path):
+    gsheet_client = MagicMock()
+    gsheet_client.get_worksheet.return_value = worksheet
+    workers = []
+    with patch.object(settings, "SHARED_STATE_PATH", str(tmp_path / "shared.sqlite3")), \
+            patch.object(settings, "SHARED_SYNC_INTERVAL_SECONDS", 0), \
+            patch("app.storage.GSheetClient.get_shared", return_value=gsheet_client):
+        for _ in range(2):
+            worker = CacheManager()
+            worker.shared = SharedState(settings.SHARED_STATE_PATH)
+            worker.is_leader = worker.shared.try_become_leader()
+            worker.load_initial_data()
+            workers.append(worker)
+        leader, follower = workers
+        assert leader.is_leader and not follower.is_leader
+
+        follower.update_check_in_status("uuid-3")
+        assert len(follower.update_queue) == 0
+
+        assert leader.get_attendee("uuid-3")[settings.COL_CHECK_IN_STATUS] == "TRUE"
+        assert leader.get_status_counts()["checked_in_count"] == 3
+        assert [task[:2] for task in leader.update_queue] == [("uuid-3", "check-in")]
+
+        # The second worker sees the first one's check-in and doesn't record another
+        leader.update_check_in_status("uuid-3")
+        assert len(leader.shared.events_since(0)) == 1
+
+        leader._confirm_written(list(leader.update_queue))
+        assert leader.shared.unflushed() == []
+
+        for worker in workers:
+            worker.shared.close()
+
+
+def test_leader_queues_follower_writes_across_a_reload(worksheet, tmp_path):
+    gsheet_client = MagicMock()
+    gsheet_client.get_worksheet.return_value = worksheet
+    with patch.object(settings, "SHARED_STATE_PATH", str(tmp_path / "shared.sqlite3")), \
+            patch("app.storage.GSheetClient.get_shared", return_value=gsheet_client):
+        workers = []
+        for _ in range(2):
+            worker = CacheManager()
+            worker.shared = SharedState(settings.SHARED_STATE_PATH)
+            worker.is_leader = worker.shared.try_become_leader()
+            worker.load_initial_data()
+            workers.append(worker)
+        leader, follower = workers
+
+        # A reload between the follower's write and the leader's next sync must still queue it
+        follower.update_check_in_status("uuid-3")
+        leader.load_initial_data()
+        leader.get_attendee("uuid-3")
+        assert [task[:2] for task in leader.update_queue] == [("uuid-3", "check-in")]
+        assert leader.get_attendee("uuid-3").checked_in
+
+        # A follower taking over queues what it has seen and what it hasn't, each once
+        follower.update_check_out_status("uuid-3")
+        leader.update_check_out_status("uuid-1")
+        follower.shared.close()
+        follower.shared = SharedState(settings.SHARED_STATE_PATH)
+        leader.shared.close()
+        assert follower.shared.try_become_leader()
+        follower._take_over_writes()
+        assert sorted(task[:2] for task in follower.update_queue) == [("uuid-1", "check-out"), ("uuid-3", "check-in"), ("uuid-3", "check-out")]
+
+        follower.shared.close()
+
+
+def test_follower_keeps_check_ins_flushed_after_the_snapshot(worksheet, tmp_path):
+    gsheet_client = MagicMock()
+    gsheet_client.get_worksheet.return_value = worksheet
+    gsheet_client.get_headers.return_value = HEADERS
+    with patch.object(settings, "SHARED_STATE_PATH", str(tmp_path / "shared.sqlite3")), \
+            patch.object(settings, "SHARED_SYNC_INTERVAL_SECONDS", 0), \
+            patch("app.storage.GSheetClient.get_shared", return_value=gsheet_client):
+        workers = []
+        for _ in range(2):
+            worker = CacheManager()
+            worker.shared = SharedState(settings.SHARED_STATE_PATH)
+            worker.is_leader = worker.shared.try_become_leader()
+            worker.load_initial_data()
+            workers.append(worker)
+        leader, follower = workers
+
+        # The leader saved its snapshot above; the follower's check-in is flushed and confirmed after it
+        follower.update_check_in_status("uuid-3")
+        leader.get_attendee("uuid-3")
+        leader._flush_batch(*leader._take_batch())
+        assert leader.shared.unflushed() == []
+
+        follower._follow_snapshot()
+        assert follower.data_source == "snapshot"
+        assert follower.get_attendee("uuid-3").checked_in
+        assert follower.get_status_counts()["checked_in_count"] == 3
+        follower.update_check_in_status("uuid-3")
+        assert len(follower.shared.events_since(0)) == 1
+
+        for worker in workers:
+            worker.shared.close()
+
+
+def test_shared_update_waits_for_other_workers_outside_the_write_lock(manager, tmp_path):
+    manager.shared = SharedState(str(tmp_path / "shared.sqlite3"))
+    other_worker = SharedState(manager.shared.path)
+    other_worker.connection().execute("BEGIN IMMEDIATE")
+    updater = threading.Thread(target=manager.update_check_in_status, args=("uuid-3",))
+    updater.start()
+    time.sleep(0.2)
+
+    assert updater.is_alive() and not manager._write_lock.locked()
+    other_worker.connection().execute("COMMIT")
+    updater.join()
+    assert manager.get_attendee("uuid-3").checked_in
+    manager.shared.close()
+    other_worker.close()
+
+
+def test_bulk_scans_apply_in_order_with_device_times(manager):
+    scanned_at = TAIPEI_TZ.localize(datetime(2024, 1, 1, 18, 30))
+    results = manager.apply_scans([
+        ("s1", "uuid-3", "check-out", None),
+        ("s2", "uuid-3", "check-in", scanned_at),
+        ("s3", "uuid-3", "check-out", None),
+        ("s4", "uuid-1", "check-in", None),
+        ("s5", "uuid-missing", "check-in", None),
+    ])
+
+    assert [result["status"] for result in results] == ["not_checked_in", "ok", "ok", "already_checked_in", "not_found"]
+    assert results[1]["name"] == "李中天" and results[1]["table_number"] == "C3"
+    assert manager.get_attendee("uuid-3")[settings.COL_CHECK_IN_TIME] == scanned_at.isoformat()
+    assert manager.get_status_counts() == {"total_attendees": 3, "checked_in_count": 3, "checked_out_count": 2}
+    assert [task[:2] for task in manager.update_queue] == [("uuid-3", "check-in"), ("uuid-3", "check-out")]
+
+
+def test_replayed_scans_return_their_original_results(manager):
+    first = manager.apply_scans([("s1", "uuid-3", "check-in", None)])
+    replay = manager.apply_scans([("s1", "uuid-3", "check-in", None), ("s2", "uuid-3", "check-in", None)])
+
+    assert replay[0] == {**first[0], "replayed": True}
+    assert replay[1]["status"] == "already_checked_in"
+    assert len(manager.update_queue) == 1
+
+
+def test_bulk_scan_ids_are_shared_between_workers(worksheet, tmp_path):
+    gsheet_client = MagicMock()
+    gsheet_client.get_worksheet.return_value = worksheet
+    with patch.object(settings, "SHARED_STATE_PATH", str(tmp_path / "shared.sqlite3")), \
+            patch("app.storage.GSheetClient.get_shared", return_value=gsheet_client):
+        workers = []
+        for _ in range(2):
+            worker = CacheManager()
+            worker.shared = SharedState(settings.SHARED_STATE_PATH)
+            worker.is_leader = worker.shared.try_become_leader()
+            worker.load_initial_data()
+            workers.append(worker)
+
+        assert workers[1].apply_scans([("s1", "uuid-3", "check-in", None)])[0]["status"] == "ok"
+        assert workers[0].apply_scans([("s1", "uuid-3", "check-in", None)])[0]["replayed"]
+        assert len(workers[0].shared.events_since(0)) == 1
+
+        for worker in workers:
+            worker.shared.close()
+
+
+def test_breakdown_follows_check_ins_and_reloads(manager):
+    assert manager.get_breakdown()["departments"][0] == {"name": "人資部", "total_attendees": 1, "checked_in_count": 0, "checked_out_count": 0}
+    assert manager.get_table_guests("C3") == {"present": [], "absent": [{"name": "李中天", "department": "人資部"}], "checked_out": []}
+
+    manager.update_check_in_status("uuid-3")
+    assert manager.get_breakdown()["tables"] == [
+        {"name": "A1", "total_attendees": 1, "checked_in_count": 1, "checked_out_count": 0},
+        {"name": "B2", "total_attendees": 1, "checked_in_count": 1, "checked_out_count": 1},
+        {"name": "C3", "total_attendees": 1, "checked_in_count": 1, "checked_out_count": 0},
+    ]
+    assert manager.get_table_guests("C3")["present"] == [{"name": "李中天", "department": "人資部"}]
+    assert manager.get_table_guests("B2")["checked_out"] == [{"name": "陳小美", "department": "市場部"}]
+    assert manager.get_table_guests("Z9") is None
+
+    # A full reload rebuilds the breakdown and keeps the pending local check-in
+    manager.load_initial_data()
+    assert manager.get_breakdown()["departments"][0]["checked_in_count"] == 1
+
+
+def test_search_reads_live_records(manager):
+    assert [record[settings.COL_UNIQUE_ID] for record in manager.search_attendees("test3@")] == ["uuid-3"]
+
+    manager.update_check_in_status("uuid-3")
+    assert manager.search_attendees("李中天")[0].checked_in
+
+
+def test_export_snapshot_is_unaffected_by_later_check_ins(manager):
+    headers, records = manager.export_snapshot()
+    manager.update_check_in_status("uuid-3")
+
+    assert headers == HEADERS
+    assert [record[settings.COL_UNIQUE_ID] for record in records] == ["uuid-1", "uuid-2", "uuid-3"]
+    assert not records[2].checked_in
+    assert manager.export_snapshot()[1][2].checked_in
@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app.attendee_store import AttendeeRecord, RosterSchema
+from app.config import settings
+from app.export import export_rows, parse_columns
+
+HEADERS = [settings.COL_NAME, settings.COL_TABLE_NUMBER, settings.COL_UNIQUE_ID,
+           settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME, settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME]
+
+
+@pytest.fixture
+def records():
+    schema = RosterSchema(HEADERS)
+    rows = [
+        ["王大明", "A1", "uuid-1", "TRUE", "2024-01-01T18:00:00+08:00", "FALSE", ""],
+        ["陳小美", "B2", "uuid-2", "TRUE", "2024-01-01T18:05:00+08:00", "TRUE", "2024-01-01T21:00:00+08:00"],
+        ["李中天", "C3", "uuid-3", "FALSE", "", "FALSE", ""],
+    ]
+    return [AttendeeRecord.from_row(schema, row, i + 2) for i, row in enumerate(rows)]
+
+
+def test_csv_export_projects_columns_and_filters_status(records):
+    body = b"".join(export_rows(records, [settings.COL_UNIQUE_ID, settings.COL_NAME], "csv", "checked_in", chunk_rows=1))
+
+    assert list(csv.reader(io.StringIO(body.decode("utf-8-sig")))) == [
+        [settings.COL_UNIQUE_ID, settings.COL_NAME], ["uuid-1", "王大明"], ["uuid-2", "陳小美"],
+    ]
+
+
+def test_ndjson_export_streams_one_object_per_line(records):
+    chunks = list(export_rows(records, [settings.COL_NAME, settings.COL_CHECK_OUT_TIME], "ndjson", "all", chunk_rows=2))
+
+    assert len(chunks) == 2
+    lines = [json.loads(line) for line in b"".join(chunks).decode("utf-8").splitlines()]
+    assert lines[1] == {settings.COL_NAME: "陳小美", settings.COL_CHECK_OUT_TIME: "2024-01-01T21:00:00+08:00"}
+    absent = b"".join(export_rows(records, [settings.COL_NAME], "ndjson", "absent"))
+    assert absent.decode("utf-8") == '{"%s": "李中天"}\n' % settings.COL_NAME
+
+
+def test_gzip_export_is_a_single_stream(records):
+    plain = b"".join(export_rows(records, HEADERS, "csv", "checked_out"))
+    compressed = b"".join(export_rows(records, HEADERS, "csv", "checked_out", compress=True, chunk_rows=1))
+
+    assert gzip.decompress(compressed) == plain
+
+
+def test_parse_columns_rejects_unknown_columns():
+    assert parse_columns("", HEADERS) == HEADERS
+    assert parse_columns(f" {settings.COL_UNIQUE_ID} ,{settings.COL_NAME}", HEADERS) == [settings.COL_UNIQUE_ID, settings.COL_NAME]
+    with pytest.raises(ValueError, match="Salary"):
+        parse_columns("Salary", HEADERS)
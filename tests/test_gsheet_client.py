@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from google.auth.exceptions import RefreshError
+
+from app.gsheet_client import GSheetClient
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_client():
+    GSheetClient._shared = None
+    yield
+    GSheetClient._shared = None
+
+
+def test_get_shared_reuses_one_client():
+    with patch.object(GSheetClient, "from_settings", side_effect=lambda: MagicMock()) as from_settings:
+        first = GSheetClient.get_shared()
+        second = GSheetClient.get_shared()
+
+    assert first is second
+    from_settings.assert_called_once()
+
+
+def test_auth_error_rebuilds_shared_client():
+    with patch.object(GSheetClient, "from_settings", side_effect=lambda: MagicMock()) as from_settings:
+        first = GSheetClient.get_shared()
+        GSheetClient.handle_error(RefreshError("token expired"))
+        second = GSheetClient.get_shared()
+
+    assert first is not second
+    first.session.close.assert_called_once()
+    assert from_settings.call_count == 2
+
+
+def test_other_errors_keep_shared_client():
+    with patch.object(GSheetClient, "from_settings", side_effect=lambda: MagicMock()):
+        first = GSheetClient.get_shared()
+        GSheetClient.handle_error(ValueError("bad row"))
+        assert GSheetClient.get_shared() is first
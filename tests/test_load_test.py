@@ -0,0 +1,51 @@
+import importlib.util
+import random
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from app.config import settings
+
+spec = importlib.util.spec_from_file_location("load_test", Path(__file__).resolve().parent.parent / "scripts" / "3_load_test.py")
+load_test = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(load_test)
+
+
+def test_door_rush_front_loads_arrivals():
+    ids = [f"uuid-{i}" for i in range(2000)]
+    arrivals = load_test.door_rush_arrivals(ids, duration=600, spike_fraction=0.7, spike_seconds=180,
+                                            duplicate_rate=0, rng=random.Random(1))
+
+    assert sorted(employee_id for _, employee_id in arrivals) == sorted(ids)
+    in_rush = sum(1 for at, _ in arrivals if at < 180)
+    assert in_rush > 0.7 * len(ids)
+    assert max(at for at, _ in arrivals) <= 600
+
+
+def test_roster_ids_are_unique_ids():
+    rows = load_test.build_roster(10, random.Random(1))
+    ids = load_test.roster_ids(rows)
+    uid_col = rows[0].index(settings.COL_UNIQUE_ID)
+
+    assert ids == [row[uid_col] for row in rows[1:]]
+    assert len(set(ids)) == 10
+
+
+def test_offline_run_measures_latency_and_write_lag():
+    args = Namespace(
+        guests=30, roster_csv=None, stations=3, scan_seconds=0, duration=0.5, spike_fraction=0.7, spike_seconds=0.2,
+        duplicate_rate=0.1, dashboard_interval=0.1, sheet_latency=0, sheet_jitter=0, read_quota=60, write_quota=60,
+        error_rate=0, drain_timeout=10, slo_p95_ms=1000, slo_p99_ms=1000, slo_write_lag_s=10,
+    )
+    results = load_test.run_offline(args, random.Random(1))
+
+    assert results["status_codes"][200] == 30
+    assert results["unflushed_writes"] == 0
+    assert len(results["write_lag_s"]) == 30
+    assert all(ok for *_, ok in load_test.evaluate_slos(results, args))
+
+
+@pytest.mark.parametrize("values, expected", [([], None), ([5.0], 5.0), (list(range(1, 101)), 95)])
+def test_percentile(values, expected):
+    assert load_test.percentile(values, 95) == expected
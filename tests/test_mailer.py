@@ -0,0 +1,79 @@
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+
+from app.mailer import MailgunSender, RateLimiter, SentStatusRecorder, batch_recipients
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    return result
+
+
+@pytest.fixture
+def sender():
+    sender = MailgunSender("key", "mg.example.com", "https://api.mailgun.net/v3", concurrency=4)
+    sender.session = MagicMock()
+    return sender
+
+
+def test_batches_keep_each_address_once():
+    recipients = [{"email": email} for email in ["a@x.com", "b@x.com", "A@x.com", "c@x.com", "a@x.com"]]
+    batches = batch_recipients(recipients, batch_size=3)
+
+    assert sum(len(batch) for batch in batches) == 5
+    for batch in batches:
+        emails = [recipient["email"].lower() for recipient in batch]
+        assert len(emails) == len(set(emails)) and len(batch) <= 3
+
+
+def test_send_retries_rate_limited_calls(sender):
+    sender.session.post.side_effect = [response(429, {"Retry-After": "0"}), response(200)]
+
+    assert sender.send({"to": "a@x.com"}).status_code == 200
+    assert sender.session.post.call_count == 2
+    assert sender.session.post.call_args.args[0] == "https://api.mailgun.net/v3/mg.example.com/messages"
+
+
+def test_send_raises_on_client_errors(sender):
+    sender.session.post.return_value = response(400)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        sender.send({"to": "bad"})
+    assert sender.session.post.call_count == 1
+
+
+def test_rate_limiter_waits_once_the_minute_is_spent():
+    limiter = RateLimiter(per_minute=60)
+    with patch("app.mailer.time.sleep", side_effect=lambda seconds: limiter._bucket.__setattr__("tokens", 60)) as sleep:
+        limiter.acquire(60)
+        sleep.assert_not_called()
+        limiter.acquire(1)
+    assert sleep.call_count == 1
+    assert sleep.call_args.args[0] == pytest.approx(1.0, abs=0.1)
+
+
+def test_recorder_batches_status_writes_and_resumes_from_checkpoint(tmp_path):
+    storage = MagicMock()
+    row_of = {f"uuid-{i}": i + 2 for i in range(6)}
+    checkpoint = tmp_path / "checkpoint.txt"
+
+    recorder = SentStatusRecorder(storage, 12, row_of, str(checkpoint), flush_every=3, flush_interval=60)
+    assert recorder.open() == set()
+    recorder.record(["uuid-0", "uuid-1"])
+    assert not recorder.flush_due()
+    recorder.record(["uuid-4"])
+    assert recorder.flush_due()
+    assert recorder.flush() == 3
+    storage.write_ranges.assert_called_once()
+    assert [update["range"] for update in storage.write_ranges.call_args.args[0]] == ["L2:L3", "L6:L6"]
+    assert checkpoint.read_text() == ""
+
+    # Interrupted before the next flush: the next run finds the guest in the checkpoint
+    recorder.record(["uuid-5"])
+    resumed = SentStatusRecorder(storage, 12, row_of, str(checkpoint))
+    assert resumed.open() == {"uuid-5"}
+    resumed.flush()
+    assert storage.write_ranges.call_args.args[0] == [{"range": "L7:L7", "values": [["TRUE"]]}]
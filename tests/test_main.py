@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, patch
 import os
+import sqlite3
 
 os.environ['API_KEY'] = 'test-api-key'
 
@@ -105,12 +106,98 @@ def test_checkout_already_checked_out(client):
     assert response.status_code == 409
 
 def test_get_status(client):
-    status_data = [
-        {settings.COL_CHECK_IN_STATUS: "TRUE", settings.COL_CHECK_OUT_STATUS: "FALSE"},
-        {settings.COL_CHECK_IN_STATUS: "TRUE", settings.COL_CHECK_OUT_STATUS: "TRUE"},
-        {settings.COL_CHECK_IN_STATUS: "FALSE", settings.COL_CHECK_OUT_STATUS: "FALSE"},
-    ]
-    mock_cache_manager.get_all_attendees.return_value = status_data
+    status_data = {"total_attendees": 3, "checked_in_count": 2, "checked_out_count": 1}
+    mock_cache_manager.get_status_counts.return_value = status_data
     response = client.get("/api/status")
     assert response.status_code == 200
     assert response.json() == {"total_attendees": 3, "checked_in_count": 2, "checked_out_count": 1}
+    mock_cache_manager.get_all_attendees.assert_not_called()
+
+
+def test_readiness_reports_cache_state(client):
+    mock_cache_manager.get_health.return_value = {"ready": True, "source": "snapshot", "cache_age_seconds": 12.5, "pending_writes": 0}
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.json()["source"] == "snapshot"
+
+
+def test_readiness_is_unavailable_before_first_load(client):
+    mock_cache_manager.get_health.return_value = {"ready": False, "source": None, "cache_age_seconds": None, "pending_writes": 0}
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert client.get("/api/health/live").status_code == 200
+
+
+def test_metrics_endpoint_reports_request_latency(client):
+    mock_cache_manager.get_status_counts.return_value = {"total_attendees": 1, "checked_in_count": 0, "checked_out_count": 0}
+    client.get("/api/status")
+
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"X-API-Key": settings.API_KEY})
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",path="/api/status",status="200"}' in response.text
+
+
+def test_status_stream_accepts_the_key_as_a_query_parameter(client):
+    mock_cache_manager.status_changes.stream.return_value = iter(['id: 1\nevent: status\ndata: {"checked_in_count": 1}\n\n'])
+
+    assert client.get("/api/status/stream", params={"api_key": "wrong"}).status_code == 401
+    response = client.get("/api/status/stream", params={"api_key": settings.API_KEY})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: status" in response.text
+
+
+def test_scan_sync_returns_per_scan_results(client):
+    mock_cache_manager.apply_scans.return_value = [
+        {"scanId": "s1", "employeeId": "uuid-1", "type": "check-in", "status": "ok", "name": "王大明", "department": "工程部", "table_number": "A1"},
+        {"scanId": "s2", "employeeId": "uuid-x", "type": "check-in", "status": "not_found"},
+    ]
+    response = client.post("/api/scans/sync", json={"scans": [
+        {"scanId": "s1", "employeeId": "uuid-1", "type": "check-in", "scannedAt": "2024-01-01T18:30:00+08:00"},
+        {"scanId": "s2", "employeeId": "uuid-x", "type": "check-in"},
+    ]})
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["ok", "not_found"]
+    scans = mock_cache_manager.apply_scans.call_args.args[0]
+    assert [scan[:3] for scan in scans] == [("s1", "uuid-1", "check-in"), ("s2", "uuid-x", "check-in")]
+    assert scans[0][3].isoformat() == "2024-01-01T18:30:00+08:00" and scans[1][3] is None
+
+
+def test_scan_sync_rejects_oversized_batches(client):
+    scans = [{"scanId": f"s{i}", "employeeId": "uuid-1", "type": "check-in"} for i in range(settings.SCAN_SYNC_MAX_SCANS + 1)]
+    assert client.post("/api/scans/sync", json={"scans": scans}).status_code == 413
+
+
+def test_table_guests_unknown_table(client):
+    mock_cache_manager.get_table_guests.return_value = None
+    assert client.get("/api/status/tables/Z9").status_code == 404
+
+    mock_cache_manager.get_table_guests.return_value = {"present": [{"name": "王大明", "department": "工程部"}], "absent": [], "checked_out": []}
+    response = client.get("/api/status/tables/A1")
+    assert response.status_code == 200
+    assert response.json()["present"][0]["name"] == "王大明"
+
+
+def test_export_streams_the_cached_roster(client):
+    mock_cache_manager.export_snapshot.return_value = ([settings.COL_NAME, settings.COL_UNIQUE_ID], [{settings.COL_NAME: "王大明", settings.COL_UNIQUE_ID: "uuid-1"}])
+    with patch("app.main.export_rows", return_value=iter([b'{"Name": "x"}\n'])) as export_rows:
+        response = client.get("/api/export", params={"format": "ndjson", "columns": settings.COL_UNIQUE_ID, "status": "absent"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="attendees-absent.ndjson"' in response.headers["content-disposition"]
+    assert export_rows.call_args.args[1:4] == ([settings.COL_UNIQUE_ID], "ndjson", "absent")
+
+    assert client.get("/api/export", params={"columns": "Salary"}).status_code == 400
+    assert client.get("/api/export", params={"status": "late"}).status_code == 422
+
+
+def test_busy_shared_state_returns_503(client):
+    mock_cache_manager.get_attendee.return_value = {settings.COL_NAME: "王大明", settings.COL_CHECK_IN_STATUS: "FALSE"}
+    mock_cache_manager.update_check_in_status.side_effect = sqlite3.OperationalError("database is locked")
+
+    response = client.post("/api/check-in", json={"employeeId": "uuid-1"})
+    assert response.status_code == 503
+    assert "database is locked" in response.json()["detail"]
@@ -0,0 +1,44 @@
+import threading
+
+from app.metrics import Counter, Gauge, Histogram, Registry, TimedLock
+
+
+def test_counter_and_gauge_render_in_prometheus_text_format():
+    registry = Registry()
+    retries = registry.register(Counter("sheets_rate_limited_retries", "Retries.", ["call"]))
+    depth = registry.register(Gauge("queue_depth", "Queue depth."))
+    retries.inc(call="write_ranges")
+    retries.inc(2, call="write_ranges")
+    depth.set_function(lambda: 7)
+
+    text = registry.render()
+    assert "# TYPE sheets_rate_limited_retries_total counter" in text
+    assert 'sheets_rate_limited_retries_total{call="write_ranges"} 3' in text
+    assert "queue_depth 7" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("flush_seconds", "Flush time.", ["result"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, result="ok")
+
+    lines = histogram.render().splitlines()
+    assert 'flush_seconds_bucket{result="ok",le="0.1"} 1' in lines
+    assert 'flush_seconds_bucket{result="ok",le="1"} 2' in lines
+    assert 'flush_seconds_bucket{result="ok",le="+Inf"} 3' in lines
+    assert 'flush_seconds_count{result="ok"} 3' in lines
+    assert histogram.count(result="ok") == 3
+
+
+def test_timed_lock_records_wait_time():
+    waits = Histogram("lock_wait_seconds", "Lock wait.", buckets=(0.01, 1))
+    lock = TimedLock(waits)
+    lock._lock.acquire()
+    releaser = threading.Timer(0.05, lock._lock.release)
+    releaser.start()
+    with lock:
+        pass
+    releaser.join()
+
+    assert waits.count() == 1
+    assert waits._sums[()] >= 0.04
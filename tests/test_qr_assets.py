@@ -0,0 +1,39 @@
+from unittest.mock import patch
+
+import pytest
+
+from app import qr_assets
+from app.qr_assets import QRCache, render_png
+
+
+def test_key_depends_on_unique_id_and_render_params(tmp_path):
+    cache = QRCache(str(tmp_path))
+
+    assert cache.key("uuid-1") == QRCache(str(tmp_path / "other")).key("uuid-1")
+    assert cache.key("uuid-1") != cache.key("uuid-2")
+    assert cache.key("uuid-1") != QRCache(str(tmp_path), box_size=8).key("uuid-1")
+    assert cache.key("uuid-1") != QRCache(str(tmp_path), error_correction="H").key("uuid-1")
+
+
+def test_render_all_renders_only_missing_codes(tmp_path):
+    cache = QRCache(str(tmp_path))
+    cache.get("uuid-0")
+
+    assert cache.render_all(["uuid-0", "uuid-1", "uuid-2", "uuid-1"], workers=2) == 2
+    assert cache.path("uuid-2").read_bytes() == render_png("uuid-2")
+    assert cache.render_all(["uuid-0", "uuid-1", "uuid-2"], workers=2) == 0
+
+
+def test_get_reads_the_cache_without_rendering(tmp_path):
+    cache = QRCache(str(tmp_path))
+    png = cache.get("uuid-1")
+
+    assert png.startswith(b"\x89PNG")
+    with patch.object(qr_assets, "render_png") as render:
+        assert cache.get("uuid-1") == png
+    render.assert_not_called()
+
+
+def test_unknown_error_correction_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        QRCache(str(tmp_path), error_correction="X")
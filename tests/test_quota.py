@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from app.quota import READ, WRITE, Priority, QuotaScheduler
+from app.sheets_emulator import EmulatedWorksheet, quota_error
+from app.storage import SheetsBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_lower_priorities_leave_a_reserve(clock):
+    quota = QuotaScheduler(read_per_minute=10, write_per_minute=10, reserve_fraction=0.2, clock=clock)
+    for _ in range(6):
+        assert quota.acquire(WRITE, Priority.SCRIPT, timeout=0)
+    # 4 tokens left: scripts must leave 4, reloads 2, check-in writes nothing
+    assert not quota.acquire(WRITE, Priority.SCRIPT, timeout=0)
+    assert quota.acquire(WRITE, Priority.RELOAD, timeout=0)
+    assert quota.acquire(WRITE, Priority.RELOAD, timeout=0)
+    assert quota.wait_time(WRITE, Priority.RELOAD) > 0
+    assert quota.wait_time(WRITE, Priority.CHECK_IN) == 0
+    assert quota.remaining() == {READ: 10, WRITE: 2}
+
+
+def test_tokens_refill_over_the_minute(clock):
+    quota = QuotaScheduler(read_per_minute=60, write_per_minute=60, clock=clock)
+    quota.exhaust(WRITE)
+    assert quota.wait_time(WRITE) == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert quota.acquire(WRITE, timeout=0)
+    assert quota.remaining()[WRITE] == 0
+
+
+def test_unlimited_buckets_never_wait(clock):
+    quota = QuotaScheduler(read_per_minute=0, write_per_minute=0, clock=clock)
+    assert all(quota.acquire(READ, Priority.SCRIPT, timeout=0) for _ in range(1000))
+    assert quota.remaining() == {READ: -1, WRITE: -1}
+
+
+def test_state_file_shares_the_budget_between_processes(tmp_path):
+    path = str(tmp_path / "sheets_quota.json")
+    server = QuotaScheduler(read_per_minute=10, write_per_minute=10, state_path=path)
+    script = QuotaScheduler(read_per_minute=10, write_per_minute=10, state_path=path)
+
+    for _ in range(5):
+        assert server.acquire(WRITE, timeout=0)
+    assert script.remaining()[WRITE] == 5
+
+
+def test_waiters_are_served_by_priority(clock):
+    quota = QuotaScheduler(read_per_minute=60, write_per_minute=60, reserve_fraction=0, clock=clock)
+    quota.exhaust(WRITE)
+    served = []
+
+    def call(priority):
+        quota.acquire(WRITE, priority)
+        served.append(priority)
+
+    threads = [threading.Thread(target=call, args=(priority,)) for priority in (Priority.SCRIPT, Priority.CHECK_IN)]
+    for thread in threads:
+        thread.start()
+    while len(quota._waiters[WRITE]) < 2:
+        pass
+    with quota._cond:
+        clock.now += 2.0
+        quota._cond.notify_all()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert served == [Priority.CHECK_IN, Priority.SCRIPT]
+
+
+def test_429_empties_the_bucket_for_every_caller(clock):
+    quota = QuotaScheduler(read_per_minute=60, write_per_minute=60, clock=clock)
+    worksheet = EmulatedWorksheet([["Name"], ["王大明"]])
+    backend = SheetsBackend(lambda: worksheet, quota=quota)
+    worksheet.batch_update = lambda *args, **kwargs: (_ for _ in ()).throw(quota_error())
+
+    with pytest.raises(Exception):
+        backend.write_ranges.__wrapped__(backend, [{"range": "A2", "values": [["陳小美"]]}])
+    assert quota.remaining()[WRITE] == 0
+    assert quota.wait_time(WRITE) > 0
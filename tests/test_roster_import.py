@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+from app.roster_import import RosterCSV, existing_unique_ids, id_namespace, import_roster_csv
+from app.sheets_emulator import EmulatedWorksheet
+from app.storage import SheetsBackend, SQLiteBackend
+
+CSV_HEADER = "EmployeeID,Name,Department,Email,TableNumber\n"
+
+
+def write_csv(path, guests):
+    path.write_text(CSV_HEADER + "".join(f"{100 + i},Guest {i},工程部,g{i}@example.com,A{i % 5}\n" for i in range(guests)), encoding="utf-8")
+    return path
+
+
+def test_unique_ids_are_stable_and_distinct(tmp_path):
+    csv_path = write_csv(tmp_path / "attendees.csv", 5)
+    with open(csv_path, "a", encoding="utf-8") as csv_file:
+        csv_file.write("100,Guest 0 again,工程部,g0@example.com,A0\n")
+
+    roster = RosterCSV(str(csv_path), namespace=id_namespace("secret"))
+    rows = list(roster.rows())
+    uid_col = rows[0].index(settings.COL_UNIQUE_ID)
+    ids = [row[uid_col] for row in rows[1:]]
+
+    assert rows[0][:5] == CSV_HEADER.strip().split(",")
+    assert rows[1][5:] == [ids[0], "FALSE", "FALSE", "", "FALSE", ""]
+    assert len(set(ids)) == 6
+    assert ids == [row[uid_col] for row in list(RosterCSV(str(csv_path), namespace=id_namespace("secret")).rows())[1:]]
+    # Without a configured secret, every import draws its own namespace
+    for other in (RosterCSV(str(csv_path)), RosterCSV(str(csv_path))):
+        assert set(ids).isdisjoint(row[uid_col] for row in list(other.rows())[1:])
+
+
+def test_import_writes_in_chunks_after_one_resize(tmp_path):
+    csv_path = write_csv(tmp_path / "attendees.csv", 25)
+    worksheet = EmulatedWorksheet([["old"]] * 40)
+    backend = SheetsBackend(lambda: worksheet)
+
+    roster = RosterCSV(str(csv_path))
+    assert import_roster_csv(backend, roster, str(tmp_path / "checkpoint.json"), chunk_rows=10) == 25
+    values = worksheet.get_all_values()
+    assert len(values) == 26
+    assert values == list(roster.rows())
+    # clear + resize, then 3 chunks of at most 10 rows
+    assert worksheet.request_counts["write"] == 5
+    assert list(tmp_path.glob("checkpoint.json*")) == []
+
+
+def test_interrupted_import_resumes_with_the_same_ids(tmp_path):
+    csv_path = write_csv(tmp_path / "attendees.csv", 25)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    backend = SQLiteBackend(str(tmp_path / "roster.sqlite3"))
+    original_write = backend.write_ranges
+    calls = []
+
+    def failing_write(data, priority):
+        calls.append(data[0]["range"])
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        original_write(data, priority)
+
+    with patch.object(backend, "write_ranges", side_effect=failing_write), pytest.raises(KeyboardInterrupt):
+        import_roster_csv(backend, RosterCSV(str(csv_path)), checkpoint, chunk_rows=10)
+    resumed = RosterCSV(str(csv_path))
+    with patch.object(backend, "prepare_import") as prepare:
+        import_roster_csv(backend, resumed, checkpoint, chunk_rows=10)
+
+    prepare.assert_not_called()
+    # The resumed import picked up the first run's namespace
+    assert backend.get_all_values() == list(resumed.rows())
+    assert len({row[5] for row in backend.get_all_values()[1:]}) == 25
+
+
+def test_reimport_keeps_existing_unique_ids(tmp_path):
+    csv_path = write_csv(tmp_path / "attendees.csv", 5)
+    backend = SQLiteBackend(str(tmp_path / "roster.sqlite3"))
+    import_roster_csv(backend, RosterCSV(str(csv_path)), str(tmp_path / "checkpoint.json"))
+    first = {row[0]: row[5] for row in backend.get_all_values()[1:]}
+
+    # An updated roster: one guest gone, one added
+    write_csv(csv_path, 7)
+    lines = csv_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    csv_path.write_text("".join(lines[:1] + lines[2:]), encoding="utf-8")
+    import_roster_csv(backend, RosterCSV(str(csv_path)), str(tmp_path / "checkpoint.json"))
+    second = {row[0]: row[5] for row in backend.get_all_values()[1:]}
+
+    assert all(second[employee_id] == first[employee_id] for employee_id in ["101", "102", "103", "104"])
+    assert "100" not in second and second["105"] not in first.values()
+
+    import_roster_csv(backend, RosterCSV(str(csv_path)), str(tmp_path / "checkpoint.json"), reuse_ids=False)
+    assert set(first.values()).isdisjoint(row[5] for row in backend.get_all_values()[1:])
+
+
+def test_existing_ids_are_read_column_by_column_in_chunks(tmp_path):
+    csv_path = write_csv(tmp_path / "attendees.csv", 25)
+    with open(csv_path, "a", encoding="utf-8") as csv_file:
+        csv_file.write("100,Guest 0 again,工程部,g0@example.com,A0\n")
+    roster = RosterCSV(str(csv_path))
+    worksheet = EmulatedWorksheet(list(roster.rows()))
+    backend = SheetsBackend(lambda: worksheet)
+
+    with patch.object(backend, "batch_get", wraps=backend.batch_get) as batch_get, \
+            patch.object(backend, "get_all_values") as get_all_values:
+        unique_ids = existing_unique_ids(backend, "EmployeeID", chunk_rows=10)
+
+    get_all_values.assert_not_called()
+    assert [call.args[0] for call in batch_get.call_args_list[:2]] == [["1:1"], ["A2:A11", "F2:F11"]]
+    assert batch_get.call_count == 5
+    assert unique_ids == {key: row[5] for key, row in zip([str(100 + i) for i in range(25)] + ["100#2"], worksheet.get_all_values()[1:])}
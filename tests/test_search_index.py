@@ -0,0 +1,43 @@
+import pytest
+
+from app.attendee_store import AttendeeRecord, RosterSchema
+from app.config import settings
+from app.search_index import SearchIndex
+
+HEADERS = [settings.COL_EMPLOYEE_ID, settings.COL_NAME, settings.COL_EMAIL, settings.COL_UNIQUE_ID]
+GUESTS = [
+    ["101", "王大明", "daming.wang@example.com", "uuid-1"],
+    ["102", "王小明", "xiaoming@example.com", "uuid-2"],
+    ["1015", "陳大文", "dawen.chen@example.com", "uuid-3"],
+    ["201", "Amy Lee", "amy@example.com", "uuid-4"],
+    ["202", "李大明", "li@example.com", "uuid-5"],
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    schema = RosterSchema(HEADERS)
+    return SearchIndex(AttendeeRecord.from_row(schema, row, i + 2) for i, row in enumerate(GUESTS))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("101", ["uuid-1", "uuid-3"]),  # exact EmployeeID before prefix
+    ("王", ["uuid-1", "uuid-2"]),  # surname prefix
+    ("大明", ["uuid-5", "uuid-1"]),  # CJK substring
+    ("Daming.W", ["uuid-1"]),  # case-insensitive email prefix
+    ("amy lee", ["uuid-4"]),  # whitespace-insensitive name
+    ("ＡＭＹ", ["uuid-4"]),  # full-width input
+    ("nobody", []),
+])
+def test_search_ranks_exact_prefix_then_substring(index, query, expected):
+    assert index.search(query) == expected
+
+
+def test_single_characters_only_match_prefixes(index):
+    # Every name containing one common character would be noise at the help desk
+    assert index.search("明") == []
+
+
+def test_limit_caps_results(index):
+    assert index.search("1", limit=2) == ["uuid-1", "uuid-3"]
+    assert index.search("大明", limit=1) == ["uuid-5"]
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from app.status_stream import StatusBroadcaster
+
+
+def collect(broadcaster, counts, events, min_interval=0.05, keepalive=5.0, changes=()):
+    """Runs one stream until `events` events arrived, applying `changes` from another thread."""
+    async def run():
+        stream = broadcaster.stream(lambda: dict(counts), min_interval, keepalive)
+        received = [await stream.__anext__()]
+
+        def change():
+            for key, value in changes:
+                counts[key] = value
+                broadcaster.notify()
+        threading.Thread(target=change).start()
+        while len(received) < events:
+            received.append(await asyncio.wait_for(stream.__anext__(), 2))
+        await stream.aclose()
+        return received
+    return asyncio.run(run())
+
+
+def test_stream_sends_current_counts_then_changes():
+    counts = {"total_attendees": 3, "checked_in_count": 0, "checked_out_count": 0}
+    events = collect(StatusBroadcaster(), counts, 2, changes=[("checked_in_count", 1)])
+
+    assert events[0].startswith("id: 0\nevent: status\n")
+    assert '"checked_in_count": 0' in events[0]
+    assert '"checked_in_count": 1' in events[1]
+
+
+def test_bursts_are_coalesced_into_one_event():
+    broadcaster = StatusBroadcaster()
+    counts = {"total_attendees": 100, "checked_in_count": 0, "checked_out_count": 0}
+    events = collect(broadcaster, counts, 2, min_interval=0.2, changes=[("checked_in_count", n) for n in range(1, 51)])
+
+    assert '"checked_in_count": 50' in events[1]
+    assert broadcaster.version == 50
+
+
+def test_idle_stream_sends_keepalives():
+    counts = {"total_attendees": 1, "checked_in_count": 0, "checked_out_count": 0}
+    events = collect(StatusBroadcaster(), counts, 2, keepalive=0.05)
+
+    assert events[1] == ": keep-alive\n\n"
+
+
+def test_notify_without_subscribers_only_bumps_the_version():
+    broadcaster = StatusBroadcaster()
+    broadcaster.notify()
+    assert broadcaster.version == 1
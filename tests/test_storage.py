@@ -0,0 +1,70 @@
+import gspread
+import pytest
+
+from app.cache_manager import CacheManager
+from app.config import settings
+from app.sheets_emulator import EmulatedWorksheet
+from app.storage import SheetsBackend, SQLiteBackend, read_range, write_range
+
+ROWS = [
+    ["Name", settings.COL_UNIQUE_ID, settings.COL_CHECK_IN_STATUS, settings.COL_CHECK_IN_TIME,
+     settings.COL_CHECK_OUT_STATUS, settings.COL_CHECK_OUT_TIME],
+    ["王大明", "uuid-1", "FALSE", "", "FALSE", ""],
+    ["陳小美", "uuid-2", "TRUE", "2024-01-01T18:05:00+08:00", "FALSE", ""],
+]
+
+
+def test_ranges_read_like_the_sheets_api():
+    grid = [list(row) for row in ROWS]
+    assert read_range(grid, "B2:B") == [["uuid-1"], ["uuid-2"]]
+    assert read_range(grid, "D2:D") == [[], ["2024-01-01T18:05:00+08:00"]]
+    assert read_range(grid, "A4:F") == []
+
+    write_range(grid, "C4:D4", [["TRUE", "t"]])
+    assert grid[3] == ["", "", "TRUE", "t"]
+
+
+def test_sqlite_backend_round_trips_ranges(tmp_path):
+    path = str(tmp_path / "roster.sqlite3")
+    backend = SQLiteBackend(path)
+    backend.import_roster(ROWS)
+    backend.write_ranges([{"range": "C2:D2", "values": [["TRUE", "2024-01-01T18:00:00+08:00"]]}])
+
+    reopened = SQLiteBackend(path)
+    assert reopened.get_headers() == ROWS[0]
+    assert reopened.get_all_values()[1] == ["王大明", "uuid-1", "TRUE", "2024-01-01T18:00:00+08:00", "FALSE", ""]
+    assert reopened.batch_get(["B2:B", "3:3"]) == [[["uuid-1"], ["uuid-2"]], [ROWS[2][:-1]]]
+
+
+def test_emulator_raises_429_once_write_quota_is_used_up():
+    worksheet = EmulatedWorksheet(ROWS, write_quota_per_minute=1)
+    worksheet.update_cell(2, 3, "TRUE")
+
+    with pytest.raises(gspread.exceptions.APIError) as error:
+        worksheet.update_cell(3, 3, "TRUE")
+    assert error.value.response.status_code == 429
+    assert worksheet.get_all_values()[1][2] == "TRUE"
+    assert worksheet.request_counts == {"read": 1, "write": 2}
+
+
+@pytest.mark.parametrize("backend_name", ["emulator", "sqlite"])
+def test_cache_manager_flushes_to_backend(backend_name, tmp_path, monkeypatch):
+    # Keep the snapshot of this test roster out of the working tree's data/
+    monkeypatch.setattr(settings, "CACHE_SNAPSHOT_PATH", str(tmp_path / "roster_snapshot.pickle"))
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "roster.sqlite3"))
+        backend.import_roster(ROWS)
+    else:
+        worksheet = EmulatedWorksheet(ROWS)
+        backend = SheetsBackend(lambda: worksheet)
+
+    manager = CacheManager()
+    manager._storage = backend
+    manager.load_initial_data()
+    manager.update_check_in_status("uuid-1")
+    manager._flush_batch(*manager._take_batch())
+
+    row = backend.get_all_values()[1]
+    assert row[2] == "TRUE"
+    assert row[3] == manager.get_attendee("uuid-1")[settings.COL_CHECK_IN_TIME]
+    assert manager.in_flight_tasks == {}
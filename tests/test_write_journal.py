@@ -0,0 +1,26 @@
+from app.write_journal import WriteJournal
+
+
+def test_unconfirmed_tasks_survive_restart(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = WriteJournal(str(path))
+    assert journal.open() == []
+    journal.append(("uuid-1", "check-in", "t1"))
+    journal.append(("uuid-2", "check-in", "t2"))
+    journal.confirm([("uuid-1", "check-in", "t1")])
+    journal.append(("uuid-2", "check-out", "t3"))
+    journal.close()
+
+    reopened = WriteJournal(str(path))
+    assert reopened.open() == [("uuid-2", "check-in", "t2"), ("uuid-2", "check-out", "t3")]
+    reopened.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('["uuid-1", "check-in", "t1"]\n["uuid-2", "check-', encoding="utf-8")
+
+    journal = WriteJournal(str(path))
+    assert journal.open() == [("uuid-1", "check-in", "t1")]
+    journal.close()
+    assert path.read_text(encoding="utf-8") == '["uuid-1", "check-in", "t1"]\n'
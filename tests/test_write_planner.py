@@ -0,0 +1,60 @@
+from app.config import settings
+from app.write_planner import coalesce_tasks, plan_column_updates, plan_range_updates
+
+HEADER_MAP = {
+    settings.COL_UNIQUE_ID: 6,
+    settings.COL_CHECK_IN_STATUS: 8,
+    settings.COL_CHECK_IN_TIME: 9,
+    settings.COL_CHECK_OUT_STATUS: 10,
+    settings.COL_CHECK_OUT_TIME: 11,
+}
+ROW_INDEX = {"uuid-1": 2, "uuid-2": 3, "uuid-3": 4, "uuid-5": 6}
+
+
+def test_coalesce_keeps_latest_task_per_employee_and_type():
+    tasks = [
+        ("uuid-1", "check-in", "t1"),
+        ("uuid-2", "check-in", "t2"),
+        ("uuid-1", "check-in", "t3"),
+        ("uuid-1", "check-out", "t4"),
+    ]
+    assert coalesce_tasks(tasks) == [
+        ("uuid-2", "check-in", "t2"),
+        ("uuid-1", "check-in", "t3"),
+        ("uuid-1", "check-out", "t4"),
+    ]
+
+
+def test_contiguous_rows_become_one_range():
+    tasks = [("uuid-2", "check-in", "t2"), ("uuid-1", "check-in", "t1"), ("uuid-5", "check-in", "t5")]
+    data, planned = plan_range_updates(tasks, ROW_INDEX, HEADER_MAP)
+
+    assert data == [
+        {"range": "H2:I3", "values": [["TRUE", "t1"], ["TRUE", "t2"]]},
+        {"range": "H6:I6", "values": [["TRUE", "t5"]]},
+    ]
+    assert len(planned) == 3
+
+
+def test_non_adjacent_columns_are_written_separately():
+    header_map = {**HEADER_MAP, settings.COL_CHECK_OUT_TIME: 13}
+    data, _ = plan_range_updates([("uuid-3", "check-out", "t9")], ROW_INDEX, header_map)
+
+    assert data == [
+        {"range": "J4:J4", "values": [["TRUE"]]},
+        {"range": "M4:M4", "values": [["t9"]]},
+    ]
+
+
+def test_unknown_rows_are_dropped():
+    data, planned = plan_range_updates([("uuid-missing", "check-in", "t1")], ROW_INDEX, HEADER_MAP)
+    assert data == []
+    assert planned == []
+
+
+def test_column_updates_cover_each_run_once():
+    assert plan_column_updates([5, 2, 3, 9], 12, "TRUE") == [
+        {"range": "L2:L3", "values": [["TRUE"], ["TRUE"]]},
+        {"range": "L5:L5", "values": [["TRUE"]]},
+        {"range": "L9:L9", "values": [["TRUE"]]},
+    ]